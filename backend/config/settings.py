@@ -1,3 +1,5 @@
+from datetime import timedelta
+from celery.schedules import crontab
 from pathlib import Path
 import os
 
@@ -38,6 +40,7 @@ TEMPLATES = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'reports.middleware.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,6 +84,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'reports.renderers.ReportJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
@@ -105,15 +112,136 @@ CORS_ALLOW_METHODS = [
 ]
 
 # Настройки кеширования
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django_redis.cache.RedisCache',
-#         'LOCATION': 'redis://127.0.0.1:6379/1',
-#         'OPTIONS': {
-#             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-#         }
-#     }
-# }
+# Кеш результатов отчетов: Redis, если задан REPORT_CACHE_URL, иначе память процесса.
+# Оба бэкенда вытесняют записи по LRU: LocMemCache по MAX_ENTRIES,
+# Redis по maxmemory-policy volatile-lru (см. docker-compose.yml)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        }
+    }
+}
+
+if os.environ.get('REPORT_CACHE_URL'):
+    CACHES['reports'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REPORT_CACHE_URL'],
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        }
+    }
+
+REPORT_CACHE_ALIAS = 'reports'
+REPORT_CACHE_ENABLED = True
+REPORT_CACHE_TIMEOUT = 6 * 60 * 60
+
+# Одновременные одинаковые расчеты отчетов и дашборда схлопываются в один
+# (блокировка в кеше отчетов). Ведущий продлевает блокировку, пока считает, поэтому
+# LOCK_TTL - лишь время, за которое освобождается блокировка упавшего процесса.
+# Ожидающие ждут не дольше TIMEOUT (больше самых долгих отчетов, включая
+# REPORT_SHARD_TIMEOUT) и потом считают сами; ошибка ведущего видна ERROR_TTL
+REPORT_COALESCE_ENABLED = True
+REPORT_COALESCE_TIMEOUT = 300
+REPORT_COALESCE_LOCK_TTL = 30
+REPORT_COALESCE_ERROR_TTL = 10
+
+# Отчеты по денежным потокам и убыточности читают дневной rollup
+# вместо сырых PaymentFlow (см. reports.utils.rollup)
+REPORTS_USE_ROLLUP = True
+
+# Максимальное число периодов развития в треугольниках chain ladder
+REPORT_CHAIN_LADDER_MAX_DEV = 120
+
+# Месяцы платежей старше окна закрытия закрываются (задача close_payment_periods):
+# денежный поток и убыточность за них читаются из снимков. 1 - открыты текущий и прошлый месяц
+REPORT_CLOSE_WINDOW_MONTHS = 1
+
+# PaymentFlow в PostgreSQL секционирована по месяцам; секции заводятся на столько месяцев вперед
+PAYMENT_PARTITIONS_AHEAD = 3
+
+# Пакетная загрузка платежей: максимум строк в запросе, отказов в ответе
+# и срок хранения ключей идемпотентности (повтор позже загрузит событие заново)
+PAYMENT_INGEST_MAX_ROWS = 100000
+PAYMENT_INGEST_MAX_REJECTS = 1000
+PAYMENT_INGEST_KEY_RETENTION = timedelta(days=30)
+
+# Замеры запросов к API: Server-Timing, журнал reports.requests и /api/metrics/,
+# который отдается только адресам из REPORT_METRICS_ALLOWED_NETWORKS
+REPORT_METRICS_ENABLED = True
+REPORT_METRICS_ALLOWED_NETWORKS = ['127.0.0.1/32', '::1/128']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        # Строки reports.requests уже в JSON
+        'message': {'format': '%(message)s'},
+        'verbose': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'requests': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+    },
+    'loggers': {
+        'reports.requests': {'handlers': ['requests'], 'level': 'INFO', 'propagate': False},
+        'reports': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Базовая линия бенчмарка генераторов отчетов (manage.py benchmark_reports)
+REPORT_BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+
+# Стресс-тест Монте-Карло: число сценариев по умолчанию и верхняя граница,
+# размер пачки сценариев и число процессов: 1 - в процессе запроса (NumPy и так
+# векторизован), больше - общий пул процессов, для CLI и выделенных серверов
+STRESS_SIMULATIONS = 100000
+STRESS_MAX_SIMULATIONS = 1000000
+STRESS_CHUNK_SIZE = 10000
+STRESS_WORKERS = 1
+STRESS_DEFAULT_SEED = 20240101
+
+# JSON ответов API: orjson или стандартный кодировщик DRF ('drf');
+# клиент может выбрать его сам заголовком Accept: application/json; encoder=drf
+REPORT_JSON_ENCODER = 'orjson'
+
+# Постраничная выдача /api/reports/ (?page_size=, ?cursor=): размер страницы по умолчанию и максимум
+REPORT_PAGE_SIZE = 100
+REPORT_MAX_PAGE_SIZE = 5000
+
+# Шардированный расчет денежного потока и убыточности: периоды от REPORT_SHARD_MIN_MONTHS
+# месяцев делятся на REPORT_SHARDS отрезков по датам (?shards= задает число явно),
+# отрезки считаются потоками в процессе запроса ('threads') или задачами Celery ('celery');
+# если брокер недоступен или воркеры не успели за REPORT_SHARD_TIMEOUT секунд - потоками
+REPORT_SHARDS = 4
+REPORT_MAX_SHARDS = 16
+REPORT_SHARD_MIN_MONTHS = 24
+REPORT_SHARD_EXECUTOR = 'threads'
+REPORT_SHARD_TIMEOUT = 30
+# Общий пул потоков шардов на процесс: не больше стольких соединений с БД сразу
+REPORT_SHARD_THREADS = 4
+
+# Размер пачки строк, которую выгрузки читают серверным курсором
+REPORT_EXPORT_CHUNK_SIZE = 2000
+# Размер блока, после которого потоковые выгрузки (csv, ndjson) сбрасывают gzip
+REPORT_STREAM_BLOCK_SIZE = 64 * 1024
+# Число строк в группе строк Parquet
+REPORT_PARQUET_ROW_GROUP_SIZE = 50000
+
+# PDF больше этого числа строк формируется фоновым заданием, а не в запросе
+EXPORT_PDF_SYNC_MAX_ROWS = 2000
+# Фоновые выгрузки: файлы хранятся локально и удаляются после EXPORT_RETENTION
+EXPORT_STORAGE_DIR = os.path.join(BASE_DIR, 'media', 'exports')
+EXPORT_RETENTION = timedelta(hours=24)
+EXPORT_JOB_PROGRESS_EVERY = 5000
+EXPORT_EMAIL_MAX_BYTES = 10 * 1024 * 1024
+# Адрес API для ссылок в письмах (файл больше EXPORT_EMAIL_MAX_BYTES не вкладывается)
+EXPORT_PUBLIC_BASE_URL = os.environ.get('EXPORT_PUBLIC_BASE_URL', 'http://localhost:8000')
 
 # Настройки Celery
 CELERY_BROKER_URL = 'redis://redis:6379/0'
@@ -121,3 +249,59 @@ CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+
+# Прогноз платежей: считается ночью для всех рядов продукт × регион × тип платежа
+FORECAST_HORIZON = 6
+FORECAST_HISTORY_MONTHS = 36
+
+# Прогрев кеша отчетов: после ночных загрузок заранее считаются REPORT_WARMING_TOP_N
+# самых частых и дорогих наборов параметров за LOOKBACK, пока не исчерпан бюджет
+# времени или CPU воркера (секунды)
+REPORT_WARMING_ENABLED = True
+REPORT_WARMING_SCHEDULE = crontab(hour=5, minute=0)
+REPORT_WARMING_TOP_N = 20
+REPORT_WARMING_LOOKBACK = timedelta(days=7)
+REPORT_WARMING_TIME_BUDGET = 600
+REPORT_WARMING_CPU_BUDGET = 300
+# Как часто счетчики запросов из кеша переносятся в ReportRequestStat
+REPORT_REQUEST_FLUSH_INTERVAL = timedelta(minutes=10)
+
+# Снимки дашборда: обновляются по расписанию, старше MAX_AGE пересчитываются по запросу
+DASHBOARD_SNAPSHOT_INTERVAL = timedelta(minutes=5)
+DASHBOARD_SNAPSHOT_MAX_AGE = timedelta(minutes=15)
+DASHBOARD_SNAPSHOT_RETENTION = timedelta(days=1)
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-dashboard-snapshot': {
+        'task': 'reports.tasks.refresh_dashboard_snapshot',
+        'schedule': DASHBOARD_SNAPSHOT_INTERVAL,
+    },
+    'purge-expired-exports': {
+        'task': 'reports.tasks.purge_expired_exports',
+        'schedule': timedelta(hours=1),
+    },
+    'refresh-payment-forecasts': {
+        'task': 'reports.tasks.refresh_payment_forecasts',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'ensure-payment-partitions': {
+        'task': 'reports.tasks.ensure_payment_partitions',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'prune-payment-ingest-keys': {
+        'task': 'reports.tasks.prune_payment_ingest_keys',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'close-payment-periods': {
+        'task': 'reports.tasks.close_payment_periods',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'flush-report-requests': {
+        'task': 'reports.tasks.flush_report_requests',
+        'schedule': REPORT_REQUEST_FLUSH_INTERVAL,
+    },
+    'warm-report-cache': {
+        'task': 'reports.tasks.warm_report_cache',
+        'schedule': REPORT_WARMING_SCHEDULE,
+    },
+}
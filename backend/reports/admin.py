@@ -35,3 +35,45 @@ class ReserveCalculationAdmin(admin.ModelAdmin):
     list_filter = ('product',)
     date_hierarchy = 'calculation_date'
     
+
+@admin.register(DailyPaymentRollup)
+class DailyPaymentRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'region', 'payment_type', 'expected_amount', 'actual_amount', 'row_count')
+    list_filter = ('payment_type', 'product')
+    date_hierarchy = 'date'
+
+@admin.register(DashboardSnapshot)
+class DashboardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('as_of', 'compute_ms')
+    date_hierarchy = 'as_of'
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report_type', 'format', 'status', 'progress', 'created_at', 'expires_at')
+    list_filter = ('status', 'format', 'report_type')
+
+@admin.register(PaymentForecast)
+class PaymentForecastAdmin(admin.ModelAdmin):
+    list_display = ('month', 'product', 'region', 'payment_type', 'amount', 'generated_at')
+    list_filter = ('payment_type', 'product')
+    date_hierarchy = 'month'
+
+@admin.register(PaymentIngestKey)
+class PaymentIngestKeyAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'date', 'created_at')
+    search_fields = ('event_id',)
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('month', 'closed_at')
+
+@admin.register(PeriodSnapshot)
+class PeriodSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('report_type', 'month', 'params', 'created_at')
+    list_filter = ('report_type',)
+    date_hierarchy = 'month'
+
+@admin.register(ReportRequestStat)
+class ReportRequestStatAdmin(admin.ModelAdmin):
+    list_display = ('report_type', 'params', 'requests', 'computes', 'compute_ms', 'last_requested_at', 'last_warmed_at')
+    list_filter = ('report_type',)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from reports.utils import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compares the standard DRF JSON renderer with the orjson renderer on a synthetic report payload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Rows in the rendered payload')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per renderer; the median is reported')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive')
+
+        self.stdout.write(f"Rendering {options['rows']} rows, {options['repeat']} runs")
+        results = benchmarks.run_renderer_benchmark(options['rows'], options['repeat'])
+        for name, metrics in results.items():
+            self.stdout.write(f"{name:<8} {metrics['time_ms']:>10.1f} ms {metrics['bytes']:>12} bytes")
+        speedup = results['drf']['time_ms'] / results['orjson']['time_ms']
+        self.stdout.write(self.style.SUCCESS(f"orjson is {speedup:.1f}x faster"))
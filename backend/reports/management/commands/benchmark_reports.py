@@ -0,0 +1,144 @@
+import json
+import os
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.test.utils import override_settings
+from django.utils import timezone
+from reports.models import PaymentFlow
+from reports.utils import benchmarks
+from reports.utils.report_generators import REPORT_GENERATORS
+
+
+# Параметры отдельных отчетов: прогноз требует тип платежа, остальные
+# меряются по всем типам (убыточности нужны и премии, и выплаты)
+REPORT_PARAMS = {
+    'forecast': {'payment_type': 'premium'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every report generator and compares the results with a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-data', action='store_true',
+                            help='Recreate the dataset with create_test_data first (deletes existing data)')
+        parser.add_argument('--policies', type=int, default=10000, help='--seed-data: number of policies')
+        parser.add_argument('--years', type=int, default=3, help='--seed-data: years of history')
+        parser.add_argument('--seed', type=int, default=42, help='--seed-data: random seed')
+        parser.add_argument('--as-of', default='2025-12-31', help='--seed-data: last date of generated history')
+        parser.add_argument('--start-date', help='Report period start YYYY-MM-DD (default: a year before the end)')
+        parser.add_argument('--end-date', help='Report period end YYYY-MM-DD (default: last payment date)')
+        parser.add_argument('--reports', help=f"Comma-separated report types (default: {','.join(REPORT_GENERATORS)})")
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per report; the median is reported')
+        parser.add_argument('--simulations', type=int, default=10000, help='Monte Carlo scenarios for the stress report')
+        parser.add_argument('--raw', action='store_true', help='Read raw PaymentFlow instead of the daily rollup')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', default=getattr(settings, 'REPORT_BENCHMARK_BASELINE', None),
+                            help='Baseline JSON to compare with')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative growth of time, rows or memory counted as a regression')
+        parser.add_argument('--min-time-ms', type=float, default=10.0,
+                            help='Ignore time regressions smaller than this many milliseconds')
+
+    def handle(self, *args, **options):
+        report_types = options['reports'].split(',') if options['reports'] else list(REPORT_GENERATORS)
+        unknown = [report_type for report_type in report_types if report_type not in REPORT_GENERATORS]
+        if unknown:
+            raise CommandError(f"Unknown report types: {', '.join(unknown)}")
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+
+        if options['seed_data']:
+            call_command(
+                'create_test_data',
+                policies=options['policies'],
+                years=options['years'],
+                seed=options['seed'],
+                as_of=options['as_of'],
+                stdout=self.stdout
+            )
+
+        params = self.report_params(options)
+        with override_settings(REPORTS_USE_ROLLUP=not options['raw']):
+            results = {
+                'created_at': timezone.now().isoformat(),
+                'params': params,
+                'report_params': REPORT_PARAMS,
+                'repeat': options['repeat'],
+                'dataset': benchmarks.dataset_fingerprint(),
+                'results': {},
+            }
+            self.stdout.write(f"Benchmarking {params['start_date']} - {params['end_date']}, {options['repeat']} runs")
+            for report_type in report_types:
+                metrics = benchmarks.run_benchmark(
+                    report_type, {**params, **REPORT_PARAMS.get(report_type, {})}, repeat=options['repeat']
+                )
+                results['results'][report_type] = metrics
+                self.stdout.write(
+                    f"{report_type:<14} {metrics['time_ms']:>10.1f} ms {metrics['queries']:>5} queries "
+                    f"{metrics['rows']:>9} rows {metrics['peak_memory_kb']:>10.0f} KiB"
+                )
+
+        if options['output']:
+            self.write_json(options['output'], results)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        baseline_path = options['baseline']
+        if options['save_baseline']:
+            if not baseline_path:
+                raise CommandError('Specify --baseline to save the results to')
+            self.write_json(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+            return
+
+        if not baseline_path or not os.path.exists(baseline_path):
+            self.stdout.write('No baseline to compare with; run with --save-baseline to store one')
+            return
+
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('dataset') != results['dataset'] or baseline.get('params') != results['params']:
+            self.stdout.write(self.style.WARNING(
+                'Baseline was recorded on a different dataset or period; comparison may be meaningless'
+            ))
+
+        regressions = benchmarks.compare(results, baseline, options['threshold'], options['min_time_ms'])
+        for regression in regressions:
+            change = f" (+{regression['change']:.0%})" if regression['change'] is not None else ''
+            self.stdout.write(self.style.ERROR(
+                f"{regression['report_type']}: {regression['metric']} "
+                f"{regression['baseline']:.1f} -> {regression['current']:.1f}{change}"
+            ))
+        if regressions:
+            raise CommandError(f"{len(regressions)} performance regressions against {baseline_path}")
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def report_params(self, options):
+        end_date = options['end_date']
+        if not end_date:
+            last = PaymentFlow.objects.aggregate(last=Max('date'))['last']
+            if last is None:
+                raise CommandError('No payment data; run with --seed-data or create_test_data first')
+            end_date = last.isoformat()
+        start_date = options['start_date'] or (
+            datetime.strptime(end_date, '%Y-%m-%d').date() - relativedelta(years=1)
+        ).isoformat()
+        # Стресс-тест - с фиксированным seed для сравнимых замеров
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'simulations': options['simulations'],
+            'seed': getattr(settings, 'STRESS_DEFAULT_SEED', 0),
+        }
+
+    def write_json(self, path, data):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
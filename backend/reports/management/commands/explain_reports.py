@@ -0,0 +1,82 @@
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from reports.utils import partitions, sql_inspection
+from reports.utils.report_generators import EXPORT_GENERATORS
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on every report generator query and fails on sequential scans of large tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='Report period start YYYY-MM-DD (default: three months ago)')
+        parser.add_argument('--end-date', help='Report period end YYYY-MM-DD (default: today)')
+        parser.add_argument('--product-id', help='Also filter reports by product')
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='Ignore sequential scans of tables with fewer estimated rows')
+        parser.add_argument('--raw', action='store_true', help='Read raw PaymentFlow instead of the daily rollup')
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE (executes the queries)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query with its scans')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_reports requires PostgreSQL')
+
+        today = timezone.localdate()
+        end_date = options['end_date'] or today.isoformat()
+        start_date = options['start_date'] or (
+            datetime.strptime(end_date, '%Y-%m-%d').date() - relativedelta(months=3)
+        ).isoformat()
+        params = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'product_id': options['product_id'],
+            'payment_type': 'premium'
+        }
+        table_rows = self.table_sizes()
+
+        failures = []
+        with override_settings(REPORTS_USE_ROLLUP=not options['raw']):
+            for report_type, generator_class in EXPORT_GENERATORS.items():
+                _, queries = sql_inspection.capture_queries(generator_class(params).generate)
+                for sql in filter(sql_inspection.is_select, queries):
+                    plan = sql_inspection.explain(sql, analyze=options['analyze'])
+                    large = [
+                        table for table in sql_inspection.seq_scans(plan)
+                        if table_rows.get(table, 0) >= options['min_rows']
+                        and not self.fully_covered(table, start_date, end_date)
+                    ]
+                    if options['verbose_plans'] or large:
+                        self.stdout.write(f"\n[{report_type}] {sql}")
+                        for node in sql_inspection.plan_nodes(plan):
+                            if 'Relation Name' in node:
+                                self.stdout.write(f"    {node['Node Type']} on {node['Relation Name']}")
+                    if large:
+                        failures.append((report_type, large))
+
+        if failures:
+            for report_type, tables in failures:
+                self.stdout.write(self.style.ERROR(f"{report_type}: sequential scan of {', '.join(tables)}"))
+            raise CommandError(f"{len(failures)} report queries use sequential scans on large tables")
+        self.stdout.write(self.style.SUCCESS(
+            f"No sequential scans on tables with {options['min_rows']}+ rows for {start_date}..{end_date}"
+        ))
+
+    def fully_covered(self, table, start_date, end_date):
+        """Секция PaymentFlow целиком внутри периода: ее полное чтение и есть оптимальный план"""
+        month = partitions.partition_month(table)
+        if month is None:
+            return False
+        last_day = month + relativedelta(months=1, days=-1)
+        return month.isoformat() >= start_date and last_day.isoformat() <= end_date
+
+    def table_sizes(self):
+        """Оценка числа строк по статистике планировщика (после ANALYZE)"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p') AND relname LIKE 'reports_%%'"
+            )
+            return {name: int(rows) for name, rows in cursor.fetchall()}
@@ -0,0 +1,100 @@
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from reports.utils import partitions, sql_inspection
+from reports.utils.report_cache import months_between
+from reports.utils.report_generators import EXPORT_GENERATORS
+
+# Отчеты, читающие PaymentFlow (при выключенном rollup), и глубина истории до начала периода
+PRUNING_REPORTS = {
+    'cashflow': relativedelta(),
+    'loss_ratio': relativedelta(),
+    'payment_flows': relativedelta(),
+    'forecast': relativedelta(years=2),
+    'stress': relativedelta(),
+}
+
+
+class Command(BaseCommand):
+    help = 'Manages monthly PaymentFlow partitions (PostgreSQL) and checks partition pruning'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['ensure', 'list', 'detach', 'check-pruning'])
+        parser.add_argument('--months-ahead', type=int, help='ensure: create partitions this many months ahead')
+        parser.add_argument('--before', help='detach: detach partitions for months before YYYY-MM-DD')
+        parser.add_argument('--drop', action='store_true', help='detach: drop detached partitions')
+        parser.add_argument('--start-date', help='check-pruning: report period start YYYY-MM-DD')
+        parser.add_argument('--end-date', help='check-pruning: report period end YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError('PaymentFlow partitioning requires PostgreSQL')
+        with connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                raise CommandError('PaymentFlow is not partitioned; run migrations first')
+
+        getattr(self, f"handle_{options['action'].replace('-', '_')}")(options)
+
+    def handle_ensure(self, options):
+        created = partitions.ensure_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created"))
+
+    def handle_list(self, options):
+        with connection.cursor() as cursor:
+            for partition in partitions.list_partitions(cursor):
+                self.stdout.write(f"{partition['name']:<40} {partition['bound']:<60} ~{partition['rows']} rows")
+
+    def handle_detach(self, options):
+        if not options['before']:
+            raise CommandError('Specify --before YYYY-MM-DD')
+        before = datetime.strptime(options['before'], '%Y-%m-%d').date()
+        detached = partitions.detach_partitions(before, drop=options['drop'])
+        for name in detached:
+            self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(detached)} partitions detached"))
+
+    def handle_check_pruning(self, options):
+        if not options['start_date'] or not options['end_date']:
+            raise CommandError('Specify --start-date and --end-date')
+        start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+
+        failures = []
+        # Проверяем запросы к сырым PaymentFlow, а не к rollup
+        with override_settings(REPORTS_USE_ROLLUP=False):
+            for report_type, history in PRUNING_REPORTS.items():
+                params = {
+                    'start_date': options['start_date'],
+                    'end_date': options['end_date'],
+                    'payment_type': 'premium' if report_type == 'forecast' else None
+                }
+                # Секции за месяцы периода и DEFAULT; прогноз без сохраненных
+                # результатов дополнительно читает FORECAST_HISTORY_MONTHS месяцев
+                allowed = len(months_between(start_date - history, options['end_date']))
+                if report_type == 'forecast':
+                    allowed = max(allowed, getattr(settings, 'FORECAST_HISTORY_MONTHS', 36))
+                allowed += 1
+                generator = EXPORT_GENERATORS[report_type](params)
+                _, queries = sql_inspection.capture_queries(generator.generate)
+
+                for sql in filter(sql_inspection.is_select, queries):
+                    scanned = partitions.scanned_partitions(sql_inspection.explain(sql))
+                    if not scanned:
+                        continue
+                    ok = len(scanned) <= allowed
+                    self.stdout.write(
+                        f"{report_type:<14} {len(scanned):>4} partitions (allowed {allowed}) "
+                        f"{'OK' if ok else 'NOT PRUNED'}"
+                    )
+                    if not ok:
+                        failures.append((report_type, sql))
+
+        for report_type, sql in failures:
+            self.stdout.write(f"\n{report_type}: {sql}")
+        if failures:
+            raise CommandError(f"{len(failures)} queries are not partition-pruned")
+        self.stdout.write(self.style.SUCCESS('All PaymentFlow queries are partition-pruned'))
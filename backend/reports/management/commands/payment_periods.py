@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from reports.models import ClosedPeriod, PeriodSnapshot
+from reports.utils import periods
+from reports.utils.report_generators import SNAPSHOT_GENERATORS
+
+
+class Command(BaseCommand):
+    help = 'Closes payment months into report snapshots and reopens them for late adjustments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['close', 'reopen', 'list'])
+        parser.add_argument('--through', help='close: close all open months up to YYYY-MM-DD (default: close window)')
+        parser.add_argument('--month', help='close/reopen: a single month YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['action']}")(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def handle_close(self, options):
+        if options['month']:
+            closed = [periods.month_start(options['month'])] if periods.close_month(options['month'], SNAPSHOT_GENERATORS) else []
+        else:
+            closed = periods.close_through(SNAPSHOT_GENERATORS, options['through'])
+        for month in closed:
+            self.stdout.write(f"Closed {month:%Y-%m}")
+        self.stdout.write(self.style.SUCCESS(f"{len(closed)} months closed"))
+
+    def handle_reopen(self, options):
+        if not options['month']:
+            raise CommandError('Specify --month YYYY-MM-DD')
+        if not periods.reopen(options['month']):
+            raise CommandError(f"{periods.month_start(options['month']):%Y-%m} is not closed")
+        self.stdout.write(self.style.SUCCESS(f"Reopened {periods.month_start(options['month']):%Y-%m}"))
+
+    def handle_list(self, options):
+        for period in ClosedPeriod.objects.all():
+            snapshots = PeriodSnapshot.objects.filter(month=period.month).count()
+            self.stdout.write(f"{period.month:%Y-%m}  closed {period.closed_at:%Y-%m-%d %H:%M}  {snapshots} snapshots")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from reports.utils import rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily PaymentFlow rollup from raw rows and verifies it against them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the rollup from scratch')
+        parser.add_argument('--verify', action='store_true', help='Compare the rollup with raw PaymentFlow rows')
+        parser.add_argument('--start-date', help='Limit to dates on or after YYYY-MM-DD')
+        parser.add_argument('--end-date', help='Limit to dates on or before YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not options['rebuild'] and not options['verify']:
+            raise CommandError('Specify --rebuild, --verify or both')
+
+        start_date = options['start_date']
+        end_date = options['end_date']
+
+        if options['rebuild']:
+            self.stdout.write("Rebuilding payment rollup...")
+            created = rollup.rebuild(start_date, end_date, batch_size=options['batch_size'])
+            self.stdout.write(f"Created {created} rollup rows")
+
+        if options['verify']:
+            self.stdout.write("Verifying payment rollup...")
+            mismatches = rollup.verify(start_date, end_date)
+            for mismatch in mismatches[:20]:
+                self.stdout.write(
+                    f"{mismatch['key']}: raw={mismatch['raw']} rollup={mismatch['rollup']}"
+                )
+            if mismatches:
+                raise CommandError(f"Rollup differs from raw data in {len(mismatches)} groups")
+
+        self.stdout.write(self.style.SUCCESS('Payment rollup is consistent with raw data'
+                                             if options['verify'] else 'Payment rollup rebuilt'))
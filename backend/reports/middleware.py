@@ -0,0 +1,37 @@
+from reports.utils import instrumentation
+from reports.utils.report_generators import EXPORT_GENERATORS
+
+# Сам эндпоинт метрик не замеряется
+EXCLUDED_ENDPOINTS = {'metrics'}
+REPORT_TYPES = [*EXPORT_GENERATORS, 'other']
+
+
+class RequestTimingMiddleware:
+    """Замеры запросов к /api/: Server-Timing, строка журнала и агрегаты для /api/metrics/
+
+    У потоковых выгрузок заголовки уходят до тела, поэтому время записи файла в них не попадает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not instrumentation.is_enabled() or not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        with instrumentation.track_request() as metrics:
+            response = self.get_response(request)
+        total = metrics.elapsed()
+
+        response['Server-Timing'] = instrumentation.server_timing(metrics, total)
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match else None
+        if endpoint and endpoint not in EXCLUDED_ENDPOINTS:
+            report_type = request.GET.get('type', '').lower()
+            if report_type and report_type not in EXPORT_GENERATORS:
+                # Произвольные значения ?type= не должны плодить серии
+                report_type = 'other'
+            instrumentation.log_request(request, response, endpoint, report_type, total, metrics)
+            instrumentation.record(endpoint, report_type, response.status_code, total, metrics)
+        return response
@@ -0,0 +1,88 @@
+# Generated by Django 4.2 on 2026-10-18 10:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyPaymentRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "payment_type",
+                    models.CharField(
+                        choices=[
+                            ("premium", "Premium"),
+                            ("claim", "Claim"),
+                            ("commission", "Commission"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "expected_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+                (
+                    "actual_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+                ("actual_count", models.IntegerField(default=0)),
+                ("row_count", models.IntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="reports.insuranceproduct",
+                    ),
+                ),
+                (
+                    "region",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="reports.region",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="dailypaymentrollup",
+            index=models.Index(
+                fields=["date", "product"], name="reports_dai_date_1aa315_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailypaymentrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("region__isnull", False)),
+                fields=("date", "product", "region", "payment_type"),
+                name="uniq_rollup_bucket",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailypaymentrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("region__isnull", True)),
+                fields=("date", "product", "payment_type"),
+                name="uniq_rollup_bucket_no_region",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0004_export_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="insuranceclaim",
+            name="paid_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2 on 2026-10-18 10:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0005_claim_paid_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentForecast",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "payment_type",
+                    models.CharField(
+                        choices=[
+                            ("premium", "Premium"),
+                            ("claim", "Claim"),
+                            ("commission", "Commission"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=18)),
+                ("alpha", models.FloatField()),
+                ("beta", models.FloatField()),
+                ("gamma", models.FloatField()),
+                (
+                    "generated_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="reports.insuranceproduct",
+                    ),
+                ),
+                (
+                    "region",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="reports.region",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="paymentforecast",
+            index=models.Index(
+                fields=["payment_type", "product", "month"],
+                name="reports_pay_payment_9781b6_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="paymentforecast",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("region__isnull", False)),
+                fields=("product", "region", "payment_type", "month"),
+                name="uniq_forecast_series_month",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="paymentforecast",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("region__isnull", True)),
+                fields=("product", "payment_type", "month"),
+                name="uniq_forecast_series_month_no_region",
+            ),
+        ),
+    ]
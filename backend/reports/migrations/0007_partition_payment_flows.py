@@ -0,0 +1,97 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations
+
+from reports.utils import partitions
+
+TABLE = "reports_paymentflow"
+LEGACY = "reports_paymentflow_legacy"
+FOREIGN_KEYS = (
+    ("policy_id", "reports_policy"),
+    ("product_id", "reports_insuranceproduct"),
+    ("region_id", "reports_region"),
+)
+
+
+def partition_payment_flows(apps, schema_editor):
+    """Переводит PaymentFlow на секционирование RANGE (date) по месяцам
+
+    Старая таблица переименовывается, новая создается по ее образцу,
+    строки переносятся одним INSERT ... SELECT (PostgreSQL сам раскладывает
+    их по секциям), затем старая таблица удаляется.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        if partitions.is_partitioned(cursor, TABLE):
+            return
+
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f"{TABLE}_pkey"],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+        cursor.execute(
+            f"ALTER TABLE {LEGACY} RENAME CONSTRAINT {TABLE}_pkey TO {LEGACY}_pkey"
+        )
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [LEGACY])
+        legacy_sequence = cursor.fetchone()[0]
+        if legacy_sequence:
+            cursor.execute(f"ALTER SEQUENCE {legacy_sequence} RENAME TO {LEGACY}_id_seq")
+
+        # Identity-колонки в секционированных таблицах (до PostgreSQL 17) не
+        # поддерживаются, поэтому id получает обычную последовательность
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS) PARTITION BY RANGE (date)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(
+            f"SELECT setval('{TABLE}_id_seq', COALESCE((SELECT MAX(id) FROM {LEGACY}), 0) + 1, false)"
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')"
+        )
+        # Первичный ключ секционированной таблицы обязан включать ключ секционирования
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date)"
+        )
+
+        partitions.create_default_partition(cursor)
+        cursor.execute(f"SELECT MIN(date), MAX(date) FROM {LEGACY}")
+        first, last = cursor.fetchone()
+        today = date.today()
+        month = partitions.month_start(first or today)
+        end = partitions.month_start(max(last or today, today)) + relativedelta(months=3)
+        while month <= end:
+            partitions.create_partition(cursor, month)
+            month += relativedelta(months=1)
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY}")
+        cursor.execute(f"DROP TABLE {LEGACY}")
+
+        # Индексы на родительской таблице создаются во всех секциях.
+        # Внешние ключи добавляются после переноса строк: отложенные проверки
+        # от INSERT иначе не дали бы создать индексы в той же транзакции
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for column, target in FOREIGN_KEYS:
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{column}_fk "
+                f"FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reports", "0006_payment_forecast"),
+    ]
+
+    operations = [
+        # Обратная операция не нужна: секционированная таблица
+        # для Django ничем не отличается от обычной
+        migrations.RunPython(partition_payment_flows, migrations.RunPython.noop),
+    ]
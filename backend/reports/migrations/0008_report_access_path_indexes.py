@@ -0,0 +1,105 @@
+# Generated by Django 4.2 on 2026-10-18 10:54
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0007_partition_payment_flows"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="dailypaymentrollup",
+            name="reports_dai_date_1aa315_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="paymentflow",
+            name="reports_pay_date_2232c1_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="paymentflow",
+            name="reports_pay_product_1374de_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="paymentflow",
+            name="reports_pay_payment_a853c3_idx",
+        ),
+        migrations.AddIndex(
+            model_name="dailypaymentrollup",
+            index=models.Index(
+                fields=["date", "product"],
+                include=(
+                    "payment_type",
+                    "region",
+                    "expected_amount",
+                    "actual_amount",
+                    "actual_count",
+                ),
+                name="rollup_date_product_cov",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dailypaymentrollup",
+            index=models.Index(
+                fields=["payment_type", "date", "product"],
+                include=("region", "expected_amount", "actual_amount"),
+                name="rollup_type_date_cov",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="insuranceclaim",
+            index=models.Index(
+                condition=models.Q(("status__in", ["open", "processing"])),
+                fields=["policy"],
+                include=("reserve", "estimated_amount"),
+                name="claim_open_policy_cov",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="insuranceclaim",
+            index=models.Index(
+                fields=["event_date", "status"],
+                include=(
+                    "policy",
+                    "report_date",
+                    "paid_date",
+                    "estimated_amount",
+                    "paid_amount",
+                ),
+                name="claim_event_date_cov",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentflow",
+            index=models.Index(
+                fields=["date", "product"],
+                include=("payment_type", "region", "expected_amount", "actual_amount"),
+                name="paymentflow_date_product_cov",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentflow",
+            index=models.Index(
+                fields=["payment_type", "date", "product"],
+                include=("region", "expected_amount", "actual_amount"),
+                name="paymentflow_type_date_cov",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentflow",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["date"], name="paymentflow_date_brin", pages_per_range=32
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservecalculation",
+            index=models.Index(
+                fields=["calculation_date", "product"],
+                include=("available_reserves",),
+                name="reservecalc_date_product_idx",
+            ),
+        ),
+    ]
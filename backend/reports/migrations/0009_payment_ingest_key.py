@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0008_report_access_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentIngestKey",
+            fields=[
+                (
+                    "event_id",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("date", models.DateField()),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0009_payment_ingest_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClosedPeriod",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(unique=True)),
+                ("closed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["month"],
+            },
+        ),
+        migrations.CreateModel(
+            name="PeriodSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("report_type", models.CharField(max_length=50)),
+                ("month", models.DateField()),
+                ("params_key", models.CharField(max_length=40)),
+                ("params", models.JSONField(default=dict)),
+                ("data", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="periodsnapshot",
+            index=models.Index(fields=["month"], name="reports_per_month_5d5c29_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="periodsnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("report_type", "params_key", "month"),
+                name="uniq_period_snapshot",
+            ),
+        ),
+    ]
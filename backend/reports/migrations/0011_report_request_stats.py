@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0010_period_snapshots"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportRequestStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("report_type", models.CharField(max_length=50)),
+                ("params_key", models.CharField(max_length=40)),
+                ("params", models.JSONField(default=dict)),
+                ("requests", models.PositiveIntegerField(default=0)),
+                ("computes", models.PositiveIntegerField(default=0)),
+                ("compute_ms", models.FloatField(default=0)),
+                ("last_requested_at", models.DateTimeField()),
+                ("last_warmed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="reportrequeststat",
+            index=models.Index(
+                fields=["last_requested_at"], name="reports_rep_last_re_8e28b0_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="reportrequeststat",
+            constraint=models.UniqueConstraint(
+                fields=("report_type", "params_key"), name="uniq_report_request_stat"
+            ),
+        ),
+    ]
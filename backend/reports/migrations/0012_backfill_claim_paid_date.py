@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_paid_date(apps, schema_editor):
+    """Дата выплаты для оплаченных убытков, загруженных до появления поля
+
+    Точная дата неизвестна, берется дата заявления: иначе chain ladder
+    не видит эти выплаты (paid_date__lte=valuation_date отсекает NULL).
+    """
+    InsuranceClaim = apps.get_model("reports", "InsuranceClaim")
+    InsuranceClaim.objects.filter(paid_date__isnull=True, paid_amount__gt=0).update(
+        paid_date=F("report_date")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0011_report_request_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_paid_date, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,10 @@
+import uuid
+from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import JSONField
+from django.utils import timezone
 
 class InsuranceProduct(models.Model):
     name = models.CharField(max_length=100)
@@ -60,10 +65,22 @@ class PaymentFlow(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        # В PostgreSQL таблица секционирована по месяцам date (см. reports.utils.partitions)
         indexes = [
-            models.Index(fields=['date']),
-            models.Index(fields=['product']),
-            models.Index(fields=['payment_type']),
+            # Отчеты за период (cashflow, loss ratio, выгрузка): index-only scan по диапазону дат
+            models.Index(
+                fields=['date', 'product'],
+                include=['payment_type', 'region', 'expected_amount', 'actual_amount'],
+                name='paymentflow_date_product_cov'
+            ),
+            # Запросы по типу платежа за период (дашборд, история прогноза, премии стресс-теста)
+            models.Index(
+                fields=['payment_type', 'date', 'product'],
+                include=['region', 'expected_amount', 'actual_amount'],
+                name='paymentflow_type_date_cov'
+            ),
+            # Строки добавляются почти по порядку дат - BRIN занимает единицы страниц
+            BrinIndex(fields=['date'], pages_per_range=32, name='paymentflow_date_brin'),
         ]
 
     def __str__(self):
@@ -84,12 +101,31 @@ class InsuranceClaim(models.Model):
     status = models.CharField(max_length=10, choices=CLAIM_STATUS, default='open')
     estimated_amount = models.DecimalField(max_digits=12, decimal_places=2)
     paid_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    # Дата выплаты нужна для треугольника оплаченных убытков (chain ladder)
+    paid_date = models.DateField(null=True, blank=True)
     description = models.TextField()
     reserve = models.DecimalField(max_digits=12, decimal_places=2)
     is_catastrophic = models.BooleanField(default=False)
     metadata = JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Резервы по открытым убыткам (дашборд) читаются только из этого индекса
+            models.Index(
+                fields=['policy'],
+                include=['reserve', 'estimated_amount'],
+                condition=models.Q(status__in=['open', 'processing']),
+                name='claim_open_policy_cov'
+            ),
+            # Треугольники chain ladder и стресс-тест отбирают убытки по дате события
+            models.Index(
+                fields=['event_date', 'status'],
+                include=['policy', 'report_date', 'paid_date', 'estimated_amount', 'paid_amount'],
+                name='claim_event_date_cov'
+            ),
+        ]
+
     def __str__(self):
         return self.claim_number
 
@@ -103,5 +139,219 @@ class ReserveCalculation(models.Model):
     metadata = JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Отчет по резервам за период и последний расчет для дашборда
+            models.Index(
+                fields=['calculation_date', 'product'],
+                include=['available_reserves'],
+                name='reservecalc_date_product_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Reserves for {self.product} on {self.calculation_date}"
+
+class DailyPaymentRollup(models.Model):
+    """Дневные агрегаты PaymentFlow, поддерживаются сигналами из reports.signals"""
+    date = models.DateField()
+    product = models.ForeignKey(InsuranceProduct, on_delete=models.CASCADE)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True)
+    payment_type = models.CharField(max_length=10, choices=PaymentFlow.PAYMENT_TYPES)
+    # Суммы по группе; имена совпадают с PaymentFlow, чтобы генераторы
+    # могли агрегировать оба источника одними и теми же выражениями
+    expected_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    actual_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    actual_count = models.IntegerField(default=0)
+    row_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product', 'region', 'payment_type'],
+                condition=models.Q(region__isnull=False),
+                name='uniq_rollup_bucket'
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'product', 'payment_type'],
+                condition=models.Q(region__isnull=True),
+                name='uniq_rollup_bucket_no_region'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['date', 'product'],
+                include=['payment_type', 'region', 'expected_amount', 'actual_amount', 'actual_count'],
+                name='rollup_date_product_cov'
+            ),
+            models.Index(
+                fields=['payment_type', 'date', 'product'],
+                include=['region', 'expected_amount', 'actual_amount'],
+                name='rollup_type_date_cov'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.payment_type} - {self.date} ({self.row_count})"
+
+
+class DashboardSnapshot(models.Model):
+    """Предрасчитанные метрики дашборда, обновляются задачей refresh_dashboard_snapshot"""
+    as_of = models.DateTimeField(default=timezone.now, db_index=True)
+    metrics = JSONField(default=dict, encoder=DjangoJSONEncoder)
+    compute_ms = models.FloatField(default=0)
+
+    class Meta:
+        get_latest_by = 'as_of'
+
+    def __str__(self):
+        return f"Dashboard snapshot as of {self.as_of}"
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка отчета в файл, выполняется задачей run_export_job"""
+    JOB_STATUS = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('failed', 'Failed')
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    report_type = models.CharField(max_length=50)
+    format = models.CharField(max_length=10)
+    params = JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=JOB_STATUS, default='pending')
+    progress = models.FloatField(default=0)
+    rows_written = models.IntegerField(default=0)
+    total_rows = models.IntegerField(null=True, blank=True)
+    file_path = models.CharField(max_length=255, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    notify_email = models.EmailField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.report_type} {self.format} export ({self.status})"
+
+
+class PaymentForecast(models.Model):
+    """Помесячный прогноз по ряду продукт × регион × тип платежа, обновляется задачей refresh_payment_forecasts"""
+    product = models.ForeignKey(InsuranceProduct, on_delete=models.CASCADE)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True)
+    payment_type = models.CharField(max_length=10, choices=PaymentFlow.PAYMENT_TYPES)
+    month = models.DateField()
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    # Параметры сглаживания, выбранные для ряда
+    alpha = models.FloatField()
+    beta = models.FloatField()
+    gamma = models.FloatField()
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'region', 'payment_type', 'month'],
+                condition=models.Q(region__isnull=False),
+                name='uniq_forecast_series_month'
+            ),
+            models.UniqueConstraint(
+                fields=['product', 'payment_type', 'month'],
+                condition=models.Q(region__isnull=True),
+                name='uniq_forecast_series_month_no_region'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['payment_type', 'product', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.payment_type} forecast - {self.month}"
+
+
+class PaymentIngestKey(models.Model):
+    """Внешний идентификатор загруженного события платежа, защищает от повторной загрузки
+
+    Внешнего ключа на PaymentFlow нет: у секционированной таблицы составной первичный ключ.
+    Ключи старше PAYMENT_INGEST_KEY_RETENTION удаляются задачей prune_payment_ingest_keys.
+    """
+    event_id = models.CharField(max_length=100, primary_key=True)
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.event_id
+
+
+class ClosedPeriod(models.Model):
+    """Закрытый месяц платежей: отчеты берут его из PeriodSnapshot, а не считают заново
+
+    Закрывает задача close_payment_periods (или manage.py payment_periods close),
+    поздние корректировки требуют переоткрытия: payment_periods reopen.
+    """
+    month = models.DateField(unique=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return self.month.strftime('%Y-%m')
+
+
+class PeriodSnapshot(models.Model):
+    """Строки отчета за закрытый месяц при заданных фильтрах; не изменяется, удаляется при переоткрытии"""
+    report_type = models.CharField(max_length=50)
+    month = models.DateField()
+    params_key = models.CharField(max_length=40)
+    params = JSONField(default=dict)
+    data = JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['report_type', 'params_key', 'month'],
+                name='uniq_period_snapshot'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type} snapshot - {self.month:%Y-%m}"
+
+
+class ReportRequestStat(models.Model):
+    """Частота и стоимость запросов отчета с одним набором параметров; по ним прогревается кеш"""
+    report_type = models.CharField(max_length=50)
+    params_key = models.CharField(max_length=40)
+    params = JSONField(default=dict)
+    requests = models.PositiveIntegerField(default=0)
+    # Число расчетов (промахи кеша и прогрев) и их суммарное время
+    computes = models.PositiveIntegerField(default=0)
+    compute_ms = models.FloatField(default=0)
+    last_requested_at = models.DateTimeField()
+    last_warmed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['report_type', 'params_key'],
+                name='uniq_report_request_stat'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['last_requested_at']),
+        ]
+
     def __str__(self):
-        return f"Reserves for {self.product} on {self.calculation_date}"
\ No newline at end of file
+        return f"{self.report_type} {self.params} - {self.requests} requests"
@@ -0,0 +1,61 @@
+from decimal import Decimal
+import orjson
+import pandas as pd
+from django.conf import settings
+from django.utils.http import parse_header_parameters
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from reports.utils import instrumentation
+
+# Кодировщик по умолчанию и тот, что клиент запросил параметром Accept:
+# "application/json; encoder=drf" - стандартный JSONEncoder DRF
+ENCODERS = ('orjson', 'drf')
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    """Типы, которых orjson не знает: Decimal, метки времени pandas и все, что умеет DRF"""
+    # Decimal - самый частый случай (суммы отчетов), как и в DRF отдается числом
+    if type(obj) is Decimal:
+        return float(obj)
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    return _encoder.default(obj)
+
+
+def dumps(data, indent=False):
+    option = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+    return orjson.dumps(data, default=_default, option=option)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, время которого попадает в фазу render запроса"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with instrumentation.phase('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ReportJSONRenderer(TimedJSONRenderer):
+    """JSON за один проход orjson: Decimal, даты, скаляры NumPy и метки pandas без обхода в Python"""
+
+    def get_encoder(self, accepted_media_type):
+        if accepted_media_type:
+            base_media_type, params = parse_header_parameters(accepted_media_type)
+            if params.get('encoder') in ENCODERS:
+                return params['encoder']
+        return getattr(settings, 'REPORT_JSON_ENCODER', 'orjson')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if self.get_encoder(accepted_media_type) == 'drf':
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        with instrumentation.phase('render'):
+            # Отступ, как и в JSONRenderer, - из Accept или контекста Browsable API; orjson умеет только 2
+            return dumps(data, indent=bool(self.get_indent(accepted_media_type, renderer_context or {})))
@@ -1,3 +1,4 @@
+from django.urls import reverse
 from rest_framework import serializers
 from reports.models import *
 from django.db.models import Sum, Avg, F, ExpressionWrapper, FloatField
@@ -71,4 +72,25 @@ class LossRatioReportSerializer(serializers.Serializer):
             data['loss_ratio'] = (data['incurred_losses'] / data['earned_premium']) * 100
         else:
             data['loss_ratio'] = 0.0
-        return data
\ No newline at end of file
+        return data
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = (
+            'id', 'report_type', 'format', 'params', 'status', 'progress',
+            'rows_written', 'total_rows', 'file_size', 'error',
+            'created_at', 'started_at', 'finished_at', 'expires_at',
+            'status_url', 'download_url'
+        )
+
+    def get_status_url(self, obj):
+        return reverse('export-job-detail', args=[obj.pk])
+
+    def get_download_url(self, obj):
+        if obj.status != 'success':
+            return None
+        return reverse('export-job-download', args=[obj.pk])
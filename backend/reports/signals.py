@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from reports.models import InsuranceClaim, PaymentFlow, ReserveCalculation
+from reports.utils import periods, report_cache, rollup
+
+
+def invalidate_reports(domain, states):
+    """После коммита сбрасывает версии данных для затронутых продуктов и месяцев"""
+    states = [state for state in states if state is not None]
+
+    def bump():
+        for product_id in {product_id for product_id, _ in states}:
+            report_cache.bump_versions(
+                domain,
+                product_id,
+                [value for state_product, value in states if state_product == product_id]
+            )
+
+    transaction.on_commit(bump)
+
+
+def claim_state(claim):
+    policy = claim.policy if claim.policy_id else None
+    return (policy.product_id if policy else None, claim.event_date)
+
+
+@receiver(pre_save, sender=PaymentFlow)
+def remember_payment_state(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние значения строки, чтобы при обновлении вычесть их из rollup"""
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).only(
+        'date', 'product', 'region', 'payment_type', 'expected_amount', 'actual_amount'
+    ).first()
+    if previous is not None:
+        instance._previous_state = rollup.flow_state(previous)
+
+
+@receiver(post_save, sender=PaymentFlow)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_state', None)
+    current = rollup.flow_state(instance)
+    if previous == current:
+        return
+
+    if previous is not None:
+        rollup.apply_flow(previous, sign=-1)
+    rollup.apply_flow(current)
+
+    periods.reopen_months(state['date'] for state in (previous, current) if state)
+    invalidate_reports('payments', [
+        (state['product_id'], state['date']) for state in (previous, current) if state
+    ])
+
+
+@receiver(post_delete, sender=PaymentFlow)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    rollup.apply_flow(rollup.flow_state(instance), sign=-1)
+    periods.reopen_months([instance.date])
+    invalidate_reports('payments', [(instance.product_id, instance.date)])
+
+
+@receiver(pre_save, sender=InsuranceClaim)
+def remember_claim_state(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).select_related('policy').first()
+    if previous is not None:
+        instance._previous_state = claim_state(previous)
+
+
+@receiver(post_save, sender=InsuranceClaim)
+def invalidate_on_claim_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_reports('claims', [getattr(instance, '_previous_state', None), claim_state(instance)])
+
+
+@receiver(post_delete, sender=InsuranceClaim)
+def invalidate_on_claim_delete(sender, instance, **kwargs):
+    invalidate_reports('claims', [claim_state(instance)])
+
+
+@receiver(pre_save, sender=ReserveCalculation)
+def remember_reserve_state(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        'product_id', 'calculation_date'
+    ).first()
+    instance._previous_state = previous
+
+
+@receiver(post_save, sender=ReserveCalculation)
+def invalidate_on_reserve_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_reports('reserves', [
+            getattr(instance, '_previous_state', None),
+            (instance.product_id, instance.calculation_date)
+        ])
+
+
+@receiver(post_delete, sender=ReserveCalculation)
+def invalidate_on_reserve_delete(sender, instance, **kwargs):
+    invalidate_reports('reserves', [(instance.product_id, instance.calculation_date)])
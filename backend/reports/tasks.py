@@ -1,43 +1,92 @@
 from celery import shared_task
-from reports.utils.report_generators import *
-from django.core.mail import EmailMessage
-from django.conf import settings
-import time
-from io import BytesIO
+from reports.models import ExportJob
+from reports.utils import dashboard, export_jobs, forecasting, partitions, payment_ingest, periods, sharding, warming
+from reports.utils.report_generators import SNAPSHOT_GENERATORS
 
 @shared_task
 def generate_async_report(report_type, params, email):
+    """Совместимость: выгрузка в Excel с отправкой файла на email"""
     try:
-        if report_type == 'cashflow':
-            generator = CashFlowReportGenerator(params)
-        elif report_type == 'reserves':
-            generator = ReserveReportGenerator(params)
-        # ... другие отчеты
-        
-        data = generator.generate()
-        
-        # Генерация файла
-        if params.get('format') == 'excel':
-            output = BytesIO()
-            df = pd.DataFrame(data)
-            df.to_excel(output, index=False)
-            output.seek(0)
-            
-            # Отправка по email
-            email = EmailMessage(
-                f"Your {report_type} report",
-                "Please find attached the requested report.",
-                settings.DEFAULT_FROM_EMAIL,
-                [email]
-            )
-            email.attach(
-                f"{report_type}_report.xlsx",
-                output.getvalue(),
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            email.send()
-            
-        return {'status': 'success', 'email': email}
+        format = params.get('format', 'excel')
+        export_jobs.validate_job(report_type, format, params)
+        job = ExportJob.objects.create(
+            report_type=report_type,
+            format=format,
+            params=params,
+            notify_email=email
+        )
+        job = export_jobs.run_job(job)
+        if job.status != 'success':
+            return {'status': 'error', 'message': job.error}
+        return {'status': 'success', 'email': email, 'job_id': str(job.pk)}
         
     except Exception as e:
-        return {'status': 'error', 'message': str(e)}
\ No newline at end of file
+        return {'status': 'error', 'message': str(e)}
+
+
+@shared_task
+def run_export_job(job_id):
+    job = ExportJob.objects.get(pk=job_id)
+    if job.status != 'pending':
+        return {'status': job.status, 'job_id': job_id}
+    job = export_jobs.run_job(job)
+    return {'status': job.status, 'job_id': job_id}
+
+
+@shared_task
+def send_export_email(job_id):
+    """Письмо с готовым файлом задания, которое завершилось без задачи (reuse_artifact)"""
+    export_jobs.notify(ExportJob.objects.get(pk=job_id))
+    return {'status': 'success', 'job_id': job_id}
+
+
+@shared_task
+def purge_expired_exports():
+    return {'status': 'success', 'purged': export_jobs.purge_expired()}
+
+
+@shared_task
+def run_report_shard(report_type, params):
+    """Один шард отчета (см. reports.utils.sharding); результат уходит обратно в JSON"""
+    return sharding.serialize_shard(sharding.compute_shard(report_type, params))
+
+
+@shared_task
+def refresh_dashboard_snapshot():
+    snapshot = dashboard.refresh_snapshot()
+    return {'status': 'success', 'as_of': snapshot.as_of.isoformat(), 'compute_ms': snapshot.compute_ms}
+
+
+@shared_task
+def refresh_payment_forecasts():
+    return {'status': 'success', 'forecasts': forecasting.refresh()}
+
+
+@shared_task
+def ensure_payment_partitions():
+    return {'status': 'success', 'created': partitions.ensure_partitions()}
+
+
+@shared_task
+def prune_payment_ingest_keys():
+    return {'status': 'success', 'deleted': payment_ingest.prune_keys()}
+
+
+@shared_task
+def close_payment_periods():
+    closed = periods.close_through(SNAPSHOT_GENERATORS)
+    return {'status': 'success', 'closed': [month.isoformat() for month in closed]}
+
+
+@shared_task
+def flush_report_requests():
+    return {'status': 'success', 'flushed': warming.flush_requests()}
+
+
+@shared_task
+def warm_report_cache():
+    # Прогрев выбирает наборы по статистике - сначала переносим накопленные запросы
+    warming.flush_requests()
+    summary = warming.warm()
+    summary['decayed_deleted'] = warming.decay()
+    return {'status': 'success', **summary}
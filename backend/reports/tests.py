@@ -0,0 +1,157 @@
+import gzip
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from reports.models import ClosedPeriod, DailyPaymentRollup, InsuranceProduct, PaymentFlow, PeriodSnapshot, Region
+from reports.utils import payment_ingest, periods, rollup
+from reports.utils.report_generators import SNAPSHOT_GENERATORS, CashFlowReportGenerator
+
+
+@override_settings(REPORTS_USE_ROLLUP=True, REPORT_CLOSE_WINDOW_MONTHS=0)
+class ClosedPeriodWriteTests(TestCase):
+    """Запись в закрытый месяц переоткрывает его: отчет не отдает устаревший снимок"""
+
+    PARAMS = {'start_date': '2024-01-01', 'end_date': '2024-01-31'}
+
+    def setUp(self):
+        self.product = InsuranceProduct.objects.create(name='Auto', base_premium=Decimal('100.00'))
+        self.region = Region.objects.create(name='North', code='N')
+        self.flow(date(2024, 1, 10), Decimal('100.00'))
+        periods.close_month(date(2024, 1, 1), SNAPSHOT_GENERATORS)
+
+    def flow(self, day, amount):
+        return PaymentFlow.objects.create(
+            product=self.product,
+            region=self.region,
+            payment_type='premium',
+            date=day,
+            expected_amount=amount,
+            actual_amount=amount
+        )
+
+    def test_write_to_closed_month_changes_report(self):
+        before = CashFlowReportGenerator(self.PARAMS).generate()
+        self.assertEqual(len(before), 1)
+
+        self.flow(date(2024, 1, 20), Decimal('50.00'))
+
+        after = CashFlowReportGenerator(self.PARAMS).generate()
+        self.assertEqual([row['date'] for row in after], [date(2024, 1, 10), date(2024, 1, 20)])
+        self.assertFalse(ClosedPeriod.objects.exists())
+        self.assertFalse(PeriodSnapshot.objects.exists())
+
+    def test_delete_in_closed_month_changes_report(self):
+        PaymentFlow.objects.get().delete()
+
+        self.assertEqual(CashFlowReportGenerator(self.PARAMS).generate(), [])
+        self.assertFalse(ClosedPeriod.objects.exists())
+
+
+class StreamingExportTests(TestCase):
+    """CSV и NDJSON отдаются потоком, но ошибка параметров - это 400, а не оборванный файл"""
+
+    URL = '/api/reports/export/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('analyst'))
+
+    def test_invalid_params_return_400_before_streaming(self):
+        for format in ('csv', 'ndjson'):
+            response = self.client.get(self.URL, {
+                'type': 'forecast',
+                'format': format,
+                'start_date': '2024-01-01',
+                'end_date': '2024-03-31'
+            })
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], 'Payment type is required')
+
+    def test_empty_report_streams_header(self):
+        response = self.client.get(self.URL, {
+            'type': 'cashflow',
+            'format': 'csv',
+            'start_date': '2024-01-01',
+            'end_date': '2024-03-31'
+        })
+        self.assertEqual(response.status_code, 200)
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(content.splitlines(), ['Date,Product,Expected,Actual,Difference,Accuracy'])
+
+
+@override_settings(REPORTS_USE_ROLLUP=True, REPORT_CLOSE_WINDOW_MONTHS=0)
+class PaymentIngestTests(TestCase):
+    """Пакетная загрузка: отказы по строкам, идемпотентность по event_id, rollup и закрытые месяцы"""
+
+    def setUp(self):
+        self.product = InsuranceProduct.objects.create(name='Auto', base_premium=Decimal('100.00'))
+        self.region = Region.objects.create(name='North', code='N')
+
+    def record(self, event_id, day='2024-01-10', **fields):
+        return {
+            'event_id': event_id,
+            'product_id': self.product.pk,
+            'region_id': self.region.pk,
+            'payment_type': 'premium',
+            'date': day,
+            'expected_amount': '100.00',
+            'actual_amount': '90.50',
+            **fields
+        }
+
+    def ingest(self, *lines):
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        return payment_ingest.ingest(io.BytesIO(body.encode()), 'application/x-ndjson')
+
+    def test_invalid_rows_are_rejected_individually(self):
+        result = self.ingest(
+            self.record('ok-1'),
+            '{not json',
+            self.record('bad-product', product_id=999999),
+            self.record('bad-date', date='10.01.2024'),
+        )
+
+        self.assertEqual((result['received'], result['inserted'], result['rejected']), (4, 1, 3))
+        errors = {reject['row']: reject['errors'] for reject in result['rejects']}
+        self.assertTrue(errors[2][0].startswith('invalid JSON'))
+        self.assertEqual(errors[3], ['unknown product_id'])
+        self.assertEqual(errors[4], ['date must be YYYY-MM-DD'])
+        self.assertEqual(list(PaymentFlow.objects.values_list('actual_amount', flat=True)), [Decimal('90.50')])
+
+    def test_resent_batch_counts_duplicates(self):
+        batch = [self.record('evt-1'), self.record('evt-2', day='2024-01-11')]
+        self.assertEqual(self.ingest(*batch)['inserted'], 2)
+
+        result = self.ingest(*batch, self.record('evt-1'))
+
+        self.assertEqual((result['inserted'], result['duplicates'], result['rejected']), (0, 3, 0))
+        self.assertEqual(PaymentFlow.objects.count(), 2)
+
+    def test_rollup_matches_raw_rows(self):
+        self.ingest(
+            self.record('evt-1'),
+            self.record('evt-2', expected_amount='50.25', actual_amount=''),
+            self.record('evt-3', day='2024-02-01', payment_type='claim'),
+        )
+
+        self.assertEqual(DailyPaymentRollup.objects.count(), 2)
+        self.assertEqual(rollup.verify(), [])
+
+    def test_ingest_reopens_closed_month(self):
+        self.ingest(self.record('evt-1'))
+        periods.close_month(date(2024, 1, 1), SNAPSHOT_GENERATORS)
+        params = {'start_date': '2024-01-01', 'end_date': '2024-01-31'}
+        self.assertEqual(len(CashFlowReportGenerator(params).generate()), 1)
+
+        self.ingest(self.record('evt-2', day='2024-01-20'))
+
+        self.assertFalse(ClosedPeriod.objects.exists())
+        self.assertEqual(
+            [row['date'] for row in CashFlowReportGenerator(params).generate()],
+            [date(2024, 1, 10), date(2024, 1, 20)]
+        )
@@ -6,7 +6,14 @@ from rest_framework.authtoken.views import obtain_auth_token
 
 urlpatterns = [
     path('reports/', ReportAPI.as_view(), name='reports-api'),
+    path('reports/batch/', BatchReportAPI.as_view(), name='reports-batch'),
+    path('reports/cache/stats/', ReportCacheStatsAPI.as_view(), name='report-cache-stats'),
     path('reports/export/', ExportReportAPI.as_view(), name='export-report'),
+    path('reports/export/jobs/', ExportJobListAPI.as_view(), name='export-job-list'),
+    path('reports/export/jobs/<uuid:job_id>/', ExportJobDetailAPI.as_view(), name='export-job-detail'),
+    path('reports/export/jobs/<uuid:job_id>/download/', ExportJobDownloadAPI.as_view(), name='export-job-download'),
+    path('payments/ingest/', PaymentIngestAPI.as_view(), name='payment-ingest'),
+    path('metrics/', MetricsAPI.as_view(), name='metrics'),
     path('dashboard/', DashboardAPI.as_view(), name='dashboard-api'),
     path('auth/', obtain_auth_token, name='api_token_auth'),
     path('products/', ProductListAPI.as_view(), name='product-list'),
@@ -0,0 +1,173 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from reports.models import InsuranceClaim, PaymentFlow, Policy, ReserveCalculation
+from reports.utils import sql_inspection
+from reports.utils.report_generators import REPORT_GENERATORS
+from rest_framework.renderers import JSONRenderer
+
+# Метрики одного прогона генератора; queries сравнивается точно, остальные - с порогом
+METRICS = ('time_ms', 'queries', 'rows', 'peak_memory_kb')
+
+
+class QueryCounter:
+    """execute_wrapper: число запросов и строк, полученных SELECT-запросами"""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        rowcount = context['cursor'].rowcount
+        if rowcount > 0 and sql_inspection.is_select(sql):
+            self.rows += rowcount
+        return result
+
+
+def dataset_fingerprint():
+    """Объем данных, на которых сняты замеры; сравнивать имеет смысл только одинаковые"""
+    return {
+        'vendor': connection.vendor,
+        'use_rollup': getattr(settings, 'REPORTS_USE_ROLLUP', False),
+        'policies': Policy.objects.count(),
+        'payment_flows': PaymentFlow.objects.count(),
+        'claims': InsuranceClaim.objects.count(),
+        'reserve_calculations': ReserveCalculation.objects.count(),
+    }
+
+
+def generate(generator_class, params):
+    """Живой расчет отчета: снимки закрытых месяцев (reports.utils.periods) не читаются,
+    чтобы замеры не зависели от того, какие месяцы закрыты"""
+    generator = generator_class(params)
+    if generator.period_snapshot:
+        return generator.generate_live()
+    return generator.generate()
+
+
+def run_once(generator_class, params):
+    counter = QueryCounter()
+    # Обычный курсор, чтобы rowcount был известен и для запросов .iterator()
+    with sql_inspection.client_side_cursors(), connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        generate(generator_class, params)
+        elapsed = time.perf_counter() - started
+    return elapsed * 1000, counter
+
+
+def peak_memory(generator_class, params):
+    """Пиковая память Python за прогон, КиБ (отдельный прогон: tracemalloc замедляет код)"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        generate(generator_class, params)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(report_type, params, repeat=5, warmup=1):
+    """Медиана времени по repeat прогонам, число запросов и строк, пиковая память"""
+    generator_class = REPORT_GENERATORS[report_type]
+    for _ in range(warmup):
+        generate(generator_class, params)
+
+    timings = []
+    for _ in range(repeat):
+        elapsed, counter = run_once(generator_class, params)
+        timings.append(elapsed)
+
+    return {
+        'time_ms': statistics.median(timings),
+        'time_ms_min': min(timings),
+        'time_ms_max': max(timings),
+        'queries': counter.queries,
+        'rows': counter.rows,
+        'peak_memory_kb': peak_memory(generator_class, params),
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_time_ms=10.0):
+    """Регрессии относительно базовой линии
+
+    Рост числа запросов - всегда регрессия. Время, строки и память - если выросли
+    больше чем на threshold (для времени еще и не меньше чем на min_time_ms).
+    """
+    regressions = []
+    for report_type, metrics in current['results'].items():
+        base = baseline.get('results', {}).get(report_type)
+        if not base:
+            continue
+        for metric in METRICS:
+            old, new = base.get(metric), metrics[metric]
+            if old is None:
+                continue
+            if metric == 'queries':
+                regressed = new > old
+            else:
+                regressed = new > old * (1 + threshold)
+                if metric == 'time_ms':
+                    regressed = regressed and new - old >= min_time_ms
+            if regressed:
+                regressions.append({
+                    'report_type': report_type,
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': (new - old) / old if old else None,
+                })
+    return regressions
+
+
+def report_payload(rows, seed=0):
+    """Ответ ReportAPI из rows строк денежного потока: даты, Decimal, float и скаляры NumPy"""
+    rng = np.random.default_rng(seed)
+    expected = rng.uniform(100, 100000, rows).round(2)
+    actual = expected * rng.normal(1, 0.1, rows)
+    start = date(2023, 1, 1)
+    return {
+        'status': 'success',
+        'data': [
+            {
+                'date': start + timedelta(days=i // 5),
+                'product_id': i % 5 + 1,
+                'product_name': f'Product {i % 5 + 1}',
+                'expected_amount': Decimal(f'{expected[i]:.2f}'),
+                'actual_amount': Decimal(f'{actual[i]:.2f}'),
+                'difference': float(actual[i] - expected[i]),
+                'accuracy': actual[i] / expected[i] * 100,
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def run_renderer_benchmark(rows=100000, repeat=5):
+    """Время рендеринга одного ответа стандартным JSONRenderer и orjson, мс (медиана)"""
+    from reports.renderers import ReportJSONRenderer
+    payload = report_payload(rows)
+    renderers = {
+        'drf': lambda: JSONRenderer().render(payload),
+        'orjson': lambda: ReportJSONRenderer().render(payload, 'application/json; encoder=orjson'),
+    }
+    # Оба кодировщика должны давать одни и те же данные
+    if json.loads(renderers['drf']()) != json.loads(renderers['orjson']()):
+        raise AssertionError('Renderers produce different JSON')
+
+    results = {}
+    for name, render in renderers.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {'time_ms': statistics.median(timings), 'bytes': len(content)}
+    return results
@@ -0,0 +1,14 @@
+from celery import current_app
+
+# Публикация задач из HTTP-запросов: при недоступном брокере Celery по умолчанию
+# повторяет подключение (и к бэкенду результатов) десятки секунд, а запрос ждет.
+# Поэтому брокер проверяется одной попыткой, а задачи публикуются с retry=False.
+
+
+def ensure_available(timeout=1):
+    """Проверяет подключение к брокеру; kombu.exceptions.OperationalError, если он недоступен"""
+    if current_app.conf.task_always_eager:
+        # Задачи выполняются на месте, брокер не нужен
+        return
+    with current_app.connection_for_write() as connection:
+        connection.ensure_connection(max_retries=0, timeout=timeout)
@@ -0,0 +1,208 @@
+from datetime import date, datetime
+import numpy as np
+from django.conf import settings
+from django.db.models import ExpressionWrapper, IntegerField, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from reports.models import InsuranceClaim
+
+# Длина периода происшествия/развития в месяцах
+PERIOD_MONTHS = {
+    'month': 1,
+    'quarter': 3,
+    'year': 12,
+}
+CLAIM_STATUSES = ['open', 'processing', 'paid']
+# Суммы в выдаче округляются до копеек, коэффициенты развития - до CDF_DECIMALS знаков
+CDF_DECIMALS = 6
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def _month_number(field):
+    """Номер месяца от начала эры, считается в БД"""
+    return ExpressionWrapper(
+        ExtractYear(field) * 12 + ExtractMonth(field) - 1,
+        output_field=IntegerField()
+    )
+
+
+def _period_start(index, step):
+    month = int(index) * step
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def load_claims(valuation_date, start_date=None, product_id=None):
+    """Суммы убытков одним запросом: продукт × месяц события × месяц заявления × месяц выплаты"""
+    claims = InsuranceClaim.objects.filter(
+        event_date__lte=valuation_date,
+        report_date__lte=valuation_date,
+        status__in=CLAIM_STATUSES
+    )
+    if start_date:
+        claims = claims.filter(event_date__gte=start_date)
+    if product_id:
+        claims = claims.filter(policy__product_id=product_id)
+
+    return list(claims.annotate(
+        event_month=_month_number('event_date'),
+        report_month=_month_number('report_date'),
+        paid_month=_month_number('paid_date')
+    ).values(
+        'policy__product_id',
+        'policy__product__name',
+        'event_month',
+        'report_month',
+        'paid_month'
+    ).annotate(
+        incurred=Sum('estimated_amount'),
+        paid=Sum('paid_amount', filter=Q(paid_date__lte=valuation_date))
+    ).order_by().values_list(
+        'policy__product_id',
+        'policy__product__name',
+        'event_month',
+        'report_month',
+        'paid_month',
+        'incurred',
+        'paid'
+    ))
+
+
+def build_triangles(records, valuation_date, period='month', first_origin=None, max_dev=None):
+    """Приростные треугольники (продукт × период происшествия × период развития)
+
+    Заявленные убытки попадают в период развития по дате заявления,
+    оплаченные - по дате выплаты. Запаздывания длиннее max_dev
+    складываются в последний период (хвост).
+    """
+    step = PERIOD_MONTHS[period]
+    max_dev = max_dev or getattr(settings, 'REPORT_CHAIN_LADDER_MAX_DEV', 120)
+    valuation_period = (valuation_date.year * 12 + valuation_date.month - 1) // step
+
+    columns = list(zip(*records))
+    product_ids = np.array(columns[0], dtype=np.int64)
+    names = dict(zip(columns[0], columns[1]))
+    # NULL (нет выплаты) превращается в nan
+    data = np.column_stack([np.array(column, dtype=float) for column in columns[2:]])
+
+    products, product_idx = np.unique(product_ids, return_inverse=True)
+    origin = data[:, 0] // step
+    reported = data[:, 1] // step
+    paid_period = data[:, 2] // step
+
+    if first_origin is None:
+        first_origin = origin.min() if len(origin) else valuation_period
+    n_origins = max(int(valuation_period - first_origin) + 1, 1)
+    n_dev = max(min(max_dev, n_origins), 1)
+    origin_idx = (origin - first_origin).astype(np.int64)
+
+    shape = (len(products), n_origins, n_dev)
+    cells = (product_idx * n_origins + origin_idx) * n_dev
+
+    # bincount по плоскому номеру ячейки заметно быстрее np.add.at
+    lag = np.clip(reported - origin, 0, n_dev - 1).astype(np.int64)
+    incurred = np.bincount(
+        cells + lag, weights=np.nan_to_num(data[:, 3]), minlength=np.prod(shape)
+    ).reshape(shape)
+
+    has_paid = ~np.isnan(data[:, 4]) & ~np.isnan(paid_period)
+    paid_lag = np.clip(paid_period[has_paid] - origin[has_paid], 0, n_dev - 1).astype(np.int64)
+    paid = np.bincount(
+        cells[has_paid] + paid_lag, weights=data[has_paid, 4], minlength=np.prod(shape)
+    ).reshape(shape)
+
+    return {
+        'products': [(int(product_id), names[product_id]) for product_id in products],
+        'origins': [_period_start(first_origin + i, step) for i in range(n_origins)],
+        'incurred': incurred,
+        'paid': paid,
+    }
+
+
+def observed_mask(n_origins, n_dev):
+    """Известные на дату оценки ячейки: верхний левый треугольник"""
+    return np.arange(n_origins)[:, None] + np.arange(n_dev)[None, :] < n_origins
+
+
+def development_factors(cumulative, observed):
+    """Взвешенные по объему коэффициенты развития (age-to-age) по каждому продукту"""
+    pairs = observed[:, 1:]
+    numerator = np.where(pairs, cumulative[..., 1:], 0).sum(axis=1)
+    denominator = np.where(pairs, cumulative[..., :-1], 0).sum(axis=1)
+    return np.divide(numerator, denominator, out=np.ones(numerator.shape), where=denominator > 0)
+
+
+def cumulative_factors(factors):
+    """CDF до ультимативного убытка для каждого периода развития"""
+    cdf = np.ones((factors.shape[0], factors.shape[1] + 1))
+    cdf[:, :-1] = np.cumprod(factors[:, ::-1], axis=1)[:, ::-1]
+    return cdf
+
+
+def project(incremental, observed):
+    """Последняя диагональ, CDF и ультимативный убыток для каждого периода происшествия"""
+    n_origins, n_dev = observed.shape
+    cumulative = np.cumsum(incremental, axis=2)
+    factors = development_factors(cumulative, observed)
+    cdf = cumulative_factors(factors)
+
+    latest_dev = np.minimum(n_origins - 1 - np.arange(n_origins), n_dev - 1)
+    latest = cumulative[:, np.arange(n_origins), latest_dev]
+    latest_cdf = cdf[:, latest_dev]
+    return {
+        'factors': factors,
+        'cdf': cdf,
+        'latest_dev': latest_dev,
+        'latest': latest,
+        'latest_cdf': latest_cdf,
+        'ultimate': latest * latest_cdf,
+    }
+
+
+def estimate(valuation_date, start_date=None, product_id=None, period='month'):
+    """Chain ladder по оплаченным и заявленным убыткам; возвращает строки продукт × период происшествия"""
+    if period not in PERIOD_MONTHS:
+        raise ValueError(f"Invalid period: {period}. Supported periods: {', '.join(PERIOD_MONTHS)}")
+
+    valuation_date = _parse_date(valuation_date)
+    first_origin = None
+    if start_date:
+        start_date = _parse_date(start_date)
+        first_origin = (start_date.year * 12 + start_date.month - 1) // PERIOD_MONTHS[period]
+
+    records = load_claims(valuation_date, start_date, product_id)
+    if not records:
+        return []
+
+    triangles = build_triangles(records, valuation_date, period, first_origin)
+    observed = observed_mask(*triangles['incurred'].shape[1:])
+    paid = project(triangles['paid'], observed)
+    incurred = project(triangles['incurred'], observed)
+
+    ibnr = incurred['ultimate'] - incurred['latest']
+    unpaid = incurred['ultimate'] - paid['latest']
+
+    rows = []
+    product_idx, origin_idx = np.nonzero((incurred['latest'] > 0) | (paid['latest'] > 0))
+    for p, i in zip(product_idx.tolist(), origin_idx.tolist()):
+        product_id, product_name = triangles['products'][p]
+        rows.append({
+            'product_id': product_id,
+            'product_name': product_name,
+            'origin': triangles['origins'][i],
+            'development_periods': int(incurred['latest_dev'][i]) + 1,
+            'paid_to_date': round(float(paid['latest'][p, i]), 2),
+            'incurred_to_date': round(float(incurred['latest'][p, i]), 2),
+            'paid_cdf': round(float(paid['latest_cdf'][p, i]), CDF_DECIMALS),
+            'incurred_cdf': round(float(incurred['latest_cdf'][p, i]), CDF_DECIMALS),
+            'ultimate_paid': round(float(paid['ultimate'][p, i]), 2),
+            'ultimate_incurred': round(float(incurred['ultimate'][p, i]), 2),
+            'ibnr': round(float(ibnr[p, i]), 2),
+            'unpaid': round(float(unpaid[p, i]), 2),
+        })
+    return rows
@@ -0,0 +1,58 @@
+import numpy as np
+
+# Ответ отчета по колонкам (?layout=columns): вместо списка строк-словарей -
+# {'length': N, 'columns': {имя: [значения]}}. Колонки строк с повторами
+# (продукты, регионы) кодируются словарем: {'dictionary': [...], 'codes': [...]},
+# где codes - индексы в dictionary (None для пустых значений).
+
+LAYOUTS = ('rows', 'columns')
+
+
+def parse_layout(value):
+    layout = value or 'rows'
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of: {', '.join(LAYOUTS)}")
+    return layout
+
+
+def encode_column(values):
+    """Словарное кодирование строковой колонки, если в ней есть повторы"""
+    if values and all(value is None or isinstance(value, str) for value in values):
+        dictionary = {}
+        codes = [None if value is None else dictionary.setdefault(value, len(dictionary)) for value in values]
+        if len(dictionary) < len(values):
+            return {'dictionary': list(dictionary), 'codes': codes}
+    return values
+
+
+def table(columns, length):
+    return {
+        'length': length,
+        'columns': {name: encode_column(values) for name, values in columns.items()}
+    }
+
+
+def floats(values):
+    """Числа (Decimal из SQL) в массив float, None - в NaN; np.array(Decimal) заметно медленнее"""
+    return np.fromiter((np.nan if value is None else float(value) for value in values), dtype=float, count=len(values))
+
+
+def nullable(values, valid):
+    """Массив NumPy в список, где вместо невалидных значений None"""
+    result = values.astype(object)
+    result[~valid] = None
+    return result.tolist()
+
+
+def from_rows(rows):
+    names = dict.fromkeys(name for row in rows for name in row)
+    return table({name: [row.get(name) for row in rows] for name in names}, len(rows))
+
+
+def convert(data):
+    """Списки строк-словарей - в таблицы по колонкам; вложенные словари обходятся рекурсивно"""
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return from_rows(data)
+    if isinstance(data, dict):
+        return {key: convert(value) for key, value in data.items()}
+    return data
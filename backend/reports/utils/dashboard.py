@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+from reports.models import (
+    DailyPaymentRollup,
+    DashboardSnapshot,
+    InsuranceClaim,
+    PaymentFlow,
+    Policy,
+    ReserveCalculation
+)
+from reports.utils import single_flight
+
+OPEN_CLAIM_STATUSES = ['open', 'processing']
+TOP_PRODUCTS_LIMIT = 5
+
+
+def _payment_source():
+    if getattr(settings, 'REPORTS_USE_ROLLUP', False):
+        return DailyPaymentRollup.objects.all()
+    return PaymentFlow.objects.all()
+
+
+def compute_metrics():
+    """Метрики дашборда: один проход с условной агрегацией по каждой таблице"""
+    # Премии и выплаты по продуктам; итоги считаются из этих же строк
+    per_product = _payment_source().values('product__name').annotate(
+        premium=Sum('actual_amount', filter=Q(payment_type='premium')),
+        claims=Sum('actual_amount', filter=Q(payment_type='claim'))
+    ).order_by()
+
+    products = [
+        {
+            'product__name': item['product__name'],
+            'premium': float(item['premium'] or 0),
+            'claims': float(item['claims'] or 0)
+        }
+        for item in per_product
+    ]
+    total_premium = sum(item['premium'] for item in products)
+    total_claims = sum(item['claims'] for item in products)
+
+    # Условие в WHERE, а не в FILTER: так работает частичный индекс claim_open_policy_cov
+    open_claims = InsuranceClaim.objects.filter(
+        status__in=OPEN_CLAIM_STATUSES
+    ).aggregate(total=Sum('reserve'))['total'] or 0
+    open_claims = float(open_claims)
+
+    available = ReserveCalculation.objects.order_by('-calculation_date').values_list(
+        'available_reserves', flat=True
+    ).first()
+    available = float(available or 0)
+
+    return {
+        'total_premium': total_premium,
+        'total_claims': total_claims,
+        'open_claims': open_claims,
+        'policy_count': Policy.objects.count(),
+        'loss_ratio': (total_claims / total_premium * 100) if total_premium > 0 else 0,
+        'reserve_sufficiency': (available / open_claims * 100) if open_claims > 0 else 100,
+        'top_products': sorted(products, key=lambda item: -item['premium'])[:TOP_PRODUCTS_LIMIT]
+    }
+
+
+def refresh_snapshot():
+    """Считает метрики и сохраняет новый снимок, удаляя устаревшие"""
+    started = time.perf_counter()
+    metrics = compute_metrics()
+    snapshot = DashboardSnapshot.objects.create(
+        metrics=metrics,
+        compute_ms=(time.perf_counter() - started) * 1000
+    )
+
+    retention = getattr(settings, 'DASHBOARD_SNAPSHOT_RETENTION', timedelta(days=1))
+    DashboardSnapshot.objects.filter(as_of__lt=snapshot.as_of - retention).delete()
+    return snapshot
+
+
+def get_snapshot(fresh=False):
+    """Последний снимок; пересчитывается, если его нет, он устарел или запрошен fresh.
+
+    Одновременные пересчеты схлопываются: остальные запросы получают снимок,
+    посчитанный первым (см. reports.utils.single_flight).
+    """
+    if not fresh:
+        snapshot = DashboardSnapshot.objects.order_by('-as_of').first()
+        max_age = getattr(settings, 'DASHBOARD_SNAPSHOT_MAX_AGE', timedelta(minutes=15))
+        if snapshot is not None and timezone.now() - snapshot.as_of <= max_age:
+            return snapshot
+
+    requested_at = timezone.now()
+    snapshot, _ = single_flight.run(
+        'dashboard:snapshot',
+        refresh_snapshot,
+        lambda: DashboardSnapshot.objects.filter(as_of__gte=requested_at).order_by('-as_of').first()
+    )
+    return snapshot
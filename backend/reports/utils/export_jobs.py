@@ -0,0 +1,171 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.urls import reverse
+from django.utils import timezone
+from reports.models import ExportJob
+from reports.utils import exporters, report_cache
+from reports.utils.report_generators import EXPORT_GENERATORS
+
+JOB_FORMATS = list(exporters.FILE_EXTENSIONS)
+
+
+def storage_dir():
+    path = getattr(settings, 'EXPORT_STORAGE_DIR', os.path.join(settings.BASE_DIR, 'media', 'exports'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def artifact_filename(job):
+    return f"{job.report_type}_report.{exporters.FILE_EXTENSIONS[job.format]}"
+
+
+def validate_job(report_type, format, params):
+    if report_type not in EXPORT_GENERATORS or report_type not in exporters.EXPORT_COLUMNS:
+        raise ValueError(f"Export not supported for report type: {report_type}")
+    if format not in JOB_FORMATS:
+        raise ValueError(f"Invalid export format. Supported formats: {', '.join(JOB_FORMATS)}")
+    if format == 'pdf' and report_type == 'payment_flows':
+        raise ValueError("Raw payment extract is not available as PDF")
+    if not params.get('start_date') or not params.get('end_date'):
+        raise ValueError("Both start_date and end_date are required")
+
+
+def _track_progress(job, rows, total):
+    """Пропускает строки насквозь, периодически сохраняя прогресс задания"""
+    step = getattr(settings, 'EXPORT_JOB_PROGRESS_EVERY', 5000)
+    written = 0
+    for row in rows:
+        yield row
+        written += 1
+        if written % step == 0:
+            ExportJob.objects.filter(pk=job.pk).update(
+                rows_written=written,
+                progress=min(99.0, written / total * 100) if total else 0
+            )
+    job.rows_written = written
+
+
+def reuse_artifact(job):
+    """Завершает задание готовым файлом, если такой же уже сформирован на текущей версии данных
+
+    Письмо (notify) здесь не отправляется: функция вызывается в запросе, вложение
+    до EXPORT_EMAIL_MAX_BYTES отправляет задача send_export_email.
+    """
+    key = report_cache.export_key(job.report_type, job.format, job.params)
+    entry = report_cache.get_cache().get(key) if key else None
+    if entry is None:
+        return False
+
+    now = timezone.now()
+    source = ExportJob.objects.filter(pk=entry['job_id'], status='success').first()
+    if source is None or (source.expires_at and source.expires_at < now) or not os.path.exists(source.file_path):
+        return False
+
+    # Файл общий: срок хранения тот же, что у исходного задания, и purge_expired удалит его один раз
+    for field in ('file_path', 'file_size', 'total_rows', 'rows_written', 'expires_at'):
+        setattr(job, field, getattr(source, field))
+    job.status = 'success'
+    job.progress = 100
+    job.started_at = job.finished_at = now
+    job.save()
+    return True
+
+
+def run_job(job):
+    """Формирует файл выгрузки; ошибки сохраняются в задании"""
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    # Версия данных снимается до чтения: изменения во время выгрузки сделают ключ устаревшим
+    artifact_key = report_cache.export_key(job.report_type, job.format, job.params)
+
+    path = os.path.join(storage_dir(), f"{job.pk}.{exporters.FILE_EXTENSIONS[job.format]}")
+    partial_path = f"{path}.part"
+    try:
+        generator = EXPORT_GENERATORS[job.report_type](job.params)
+        job.total_rows = generator.count_rows()
+        ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+        rows = _track_progress(job, generator.iter_rows(), job.total_rows)
+        with open(partial_path, 'wb') as output:
+            exporters.write_export(
+                job.format,
+                rows,
+                exporters.EXPORT_COLUMNS[job.report_type],
+                job.report_type.capitalize(),
+                output
+            )
+        os.replace(partial_path, path)
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'success'
+        job.progress = 100
+        job.file_path = path
+        job.file_size = os.path.getsize(path)
+        job.expires_at = timezone.now() + getattr(settings, 'EXPORT_RETENTION', timedelta(hours=24))
+
+    job.finished_at = timezone.now()
+    job.save()
+
+    if job.status == 'success' and artifact_key:
+        retention = getattr(settings, 'EXPORT_RETENTION', timedelta(hours=24))
+        report_cache.get_cache().set(artifact_key, {'job_id': str(job.pk)}, timeout=retention.total_seconds())
+
+    if job.status == 'success' and job.notify_email:
+        notify(job)
+    return job
+
+
+def download_url(job):
+    """Абсолютная ссылка на файл задания: в письме относительный путь не открыть"""
+    base_url = getattr(settings, 'EXPORT_PUBLIC_BASE_URL', 'http://localhost:8000').rstrip('/')
+    return f"{base_url}{reverse('export-job-download', args=[job.pk])}"
+
+
+def notify(job):
+    """Отправляет файл письмом, а если он слишком большой - ссылку на скачивание"""
+    email = EmailMessage(
+        f"Your {job.report_type} report",
+        "Please find attached the requested report.",
+        settings.DEFAULT_FROM_EMAIL,
+        [job.notify_email]
+    )
+    if job.file_size <= getattr(settings, 'EXPORT_EMAIL_MAX_BYTES', 10 * 1024 * 1024):
+        with open(job.file_path, 'rb') as artifact:
+            email.attach(artifact_filename(job), artifact.read())
+    else:
+        email.body = (
+            "The report is too large to attach. Download it from "
+            f"{download_url(job)} before {job.expires_at:%Y-%m-%d %H:%M} UTC."
+        )
+    email.send()
+
+
+def purge_expired():
+    """Удаляет файлы и записи заданий, срок хранения которых истек"""
+    now = timezone.now()
+    purged = 0
+    stale = ExportJob.objects.filter(expires_at__lt=now)
+    for job in stale.iterator():
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        purged += 1
+    stale.delete()
+
+    # Упавшие и зависшие задания без срока хранения чистим по времени создания
+    retention = getattr(settings, 'EXPORT_RETENTION', timedelta(hours=24))
+    abandoned = ExportJob.objects.filter(expires_at__isnull=True, created_at__lt=now - retention)
+    for job in abandoned.iterator():
+        partial_path = os.path.join(storage_dir(), f"{job.pk}.{exporters.FILE_EXTENSIONS.get(job.format, '')}.part")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        purged += 1
+    abandoned.delete()
+    return purged
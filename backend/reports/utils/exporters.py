@@ -0,0 +1,464 @@
+import csv
+import itertools
+import tempfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import xlsxwriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+# Колонки выгрузки по типу отчета: (ключ в строке отчета, заголовок, тип значения)
+EXPORT_COLUMNS = {
+    'cashflow': [
+        ('date', 'Date', 'date'),
+        ('product_name', 'Product', 'text'),
+        ('expected_amount', 'Expected', 'money'),
+        ('actual_amount', 'Actual', 'money'),
+        ('difference', 'Difference', 'money'),
+        ('accuracy', 'Accuracy', 'percent'),
+    ],
+    'loss_ratio': [
+        ('product_name', 'Product', 'text'),
+        ('year', 'Year', 'int'),
+        ('month', 'Month', 'int'),
+        ('earned_premium', 'Earned Premium', 'money'),
+        ('incurred_losses', 'Incurred Losses', 'money'),
+        ('loss_ratio', 'Loss Ratio', 'percent'),
+    ],
+    'reserves': [
+        ('calculation_date', 'Calculation Date', 'date'),
+        ('product_name', 'Product', 'text'),
+        ('total_reserves', 'Total Reserves', 'money'),
+        ('required_reserves', 'Required Reserves', 'money'),
+        ('available_reserves', 'Available Reserves', 'money'),
+        ('sufficiency_ratio', 'Sufficiency Ratio', 'percent'),
+        ('stress_scenario', 'Stress Scenario', 'text'),
+    ],
+    'forecast': [
+        ('series', 'Series', 'text'),
+        ('date', 'Date', 'date'),
+        ('actual_amount', 'Actual', 'money'),
+        ('expected_amount', 'Expected', 'money'),
+        ('amount', 'Forecast', 'money'),
+    ],
+    'chain_ladder': [
+        ('product_name', 'Product', 'text'),
+        ('origin', 'Origin Period', 'date'),
+        ('development_periods', 'Development Periods', 'int'),
+        ('paid_to_date', 'Paid to Date', 'money'),
+        ('incurred_to_date', 'Incurred to Date', 'money'),
+        ('paid_cdf', 'Paid CDF', 'float'),
+        ('incurred_cdf', 'Incurred CDF', 'float'),
+        ('ultimate_paid', 'Ultimate (Paid)', 'money'),
+        ('ultimate_incurred', 'Ultimate (Incurred)', 'money'),
+        ('ibnr', 'IBNR', 'money'),
+        ('unpaid', 'Unpaid', 'money'),
+    ],
+    'payment_flows': [
+        ('id', 'ID', 'int'),
+        ('date', 'Date', 'date'),
+        ('product_name', 'Product', 'text'),
+        ('region_name', 'Region', 'text'),
+        ('policy_id', 'Policy ID', 'int'),
+        ('payment_type', 'Payment Type', 'text'),
+        ('expected_amount', 'Expected', 'money'),
+        ('actual_amount', 'Actual', 'money'),
+        ('is_recurring', 'Recurring', 'bool'),
+        ('forecast_accuracy', 'Forecast Accuracy', 'percent'),
+    ],
+}
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+GZIP_CONTENT_TYPE = 'application/gzip'
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+PDF_CONTENT_TYPE = 'application/pdf'
+MONEY_QUANT = Decimal('0.01')
+# Проценты - с той же точностью, что и формат '0.00' в xlsx и PDF
+PERCENT_QUANT = Decimal('0.01')
+QUANTS = {
+    'money': MONEY_QUANT,
+    'percent': PERCENT_QUANT,
+}
+
+
+def cell_value(value, kind):
+    """Приводит значение к типу колонки (сериализаторы отдают суммы и даты строками)
+
+    Суммы и проценты округляются, чтобы CSV, NDJSON и xlsx совпадали.
+    """
+    if value is None or value == '':
+        return None
+    if kind == 'date' and isinstance(value, datetime):
+        return value.date()
+    if kind == 'date' and isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return value
+    if kind in ('money', 'percent', 'float') and isinstance(value, str):
+        try:
+            value = Decimal(value)
+        except InvalidOperation:
+            return value
+    if kind in QUANTS and isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        number = Decimal(str(value))
+        # nan и бесконечность не округляются
+        return number.quantize(QUANTS[kind], rounding=ROUND_HALF_UP) if number.is_finite() else value
+    return value
+
+
+def export_row(row, columns):
+    """Строка для NDJSON: все поля отчета, числовые колонки - как в остальных форматах"""
+    row = dict(row)
+    for key, _, kind in columns:
+        if kind in QUANTS and key in row:
+            row[key] = cell_value(row[key], kind)
+    return row
+
+
+def write_excel(rows, columns, title, fileobj):
+    """Пишет строки в xlsx построчно (constant_memory), возвращает число строк"""
+    workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True})
+    worksheet = workbook.add_worksheet(title[:30])
+
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'border': 1,
+        'bg_color': '#4472C4',
+        'font_color': 'white'
+    })
+    formats = {
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+        'money': workbook.add_format({'num_format': '#,##0.00'}),
+        'percent': workbook.add_format({'num_format': '0.00'}),
+        'float': workbook.add_format({'num_format': '0.0000'}),
+        'int': None,
+        'bool': None,
+        'text': None,
+    }
+
+    for col_num, (_, label, _) in enumerate(columns):
+        worksheet.write(0, col_num, label, header_format)
+
+    row_num = 0
+    for row_num, row in enumerate(rows, 1):
+        for col_num, (key, _, kind) in enumerate(columns):
+            value = cell_value(row.get(key), kind)
+            if value is None:
+                worksheet.write_blank(row_num, col_num, None)
+            elif isinstance(value, (date, datetime)):
+                worksheet.write_datetime(row_num, col_num, value, formats['date'])
+            elif isinstance(value, bool):
+                worksheet.write_boolean(row_num, col_num, value)
+            elif isinstance(value, (int, float, Decimal)):
+                worksheet.write_number(row_num, col_num, float(value), formats[kind])
+            else:
+                worksheet.write_string(row_num, col_num, str(value))
+
+    worksheet.autofilter(0, 0, max(row_num, 1), len(columns) - 1)
+    worksheet.freeze_panes(1, 0)
+    workbook.close()
+    return row_num
+
+
+def file_response(write, filename, content_type):
+    """Пишет выгрузку во временный файл и отдает его потоком"""
+    output = tempfile.TemporaryFile()
+    try:
+        write(output)
+    except Exception:
+        output.close()
+        raise
+
+    output.seek(0)
+    # FileResponse читает файл блоками и закрывает (удаляет) его после отдачи
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=filename,
+        content_type=content_type
+    )
+
+
+def excel_response(rows, columns, title, filename):
+    return file_response(
+        lambda output: write_excel(rows, columns, title, output),
+        filename,
+        XLSX_CONTENT_TYPE
+    )
+
+
+# Разметка PDF: альбомный letter, строки фиксированной высоты, ширина колонки по типу значения
+PDF_PAGE_SIZE = landscape(letter)
+PDF_MARGIN = 36
+PDF_ROW_HEIGHT = 14
+PDF_FONT = 'Helvetica'
+PDF_FONT_SIZE = 8
+PDF_COLUMN_WEIGHTS = {'text': 3, 'date': 2, 'money': 2, 'percent': 1.5, 'float': 1.5, 'int': 1, 'bool': 1}
+PDF_HEADER_COLOR = colors.HexColor('#4472C4')
+PDF_STRIPE_COLOR = colors.HexColor('#EEF2FA')
+PDF_NUMERIC = ('money', 'percent', 'float', 'int')
+
+
+def pdf_text(value, kind):
+    """Значение ячейки PDF в виде строки, с теми же форматами чисел, что и в xlsx"""
+    value = cell_value(value, kind)
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        if kind == 'money':
+            return f'{value:,.2f}'
+        if kind == 'percent':
+            return f'{value:.2f}'
+        if kind == 'float':
+            return f'{value:.4f}'
+    return str(value)
+
+
+def _fit(text, width):
+    """Обрезает текст под ширину колонки; stringWidth считается, только если текст может не влезть"""
+    if len(text) * PDF_FONT_SIZE * 0.6 <= width:
+        return text
+    while text and stringWidth(text + '…', PDF_FONT, PDF_FONT_SIZE) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+def write_pdf(rows, columns, title, fileobj):
+    """Пишет строки в PDF постранично, без Table: каждая страница - блок строк
+    фиксированной высоты с повторяющимся заголовком, поэтому время линейно по числу строк,
+    а в памяти держится только текущий блок и уже сжатые страницы. Возвращает число строк."""
+    pdf = canvas.Canvas(fileobj, pagesize=PDF_PAGE_SIZE, pageCompression=1)
+    pdf.setTitle(title)
+    page_width, page_height = PDF_PAGE_SIZE
+
+    weights = [PDF_COLUMN_WEIGHTS.get(kind, 1) for _, _, kind in columns]
+    scale = (page_width - 2 * PDF_MARGIN) / sum(weights)
+    widths = [weight * scale for weight in weights]
+    lefts = list(itertools.accumulate([PDF_MARGIN] + widths[:-1]))
+    padding = 3
+    top = page_height - PDF_MARGIN
+    # Заголовок отчета, шапка таблицы и номер страницы занимают по строке
+    rows_per_page = int((top - PDF_MARGIN) // PDF_ROW_HEIGHT) - 3
+
+    def draw_cells(values, y, font):
+        pdf.setFont(font, PDF_FONT_SIZE)
+        for (_, _, kind), text, left, width in zip(columns, values, lefts, widths):
+            text = _fit(text, width - 2 * padding)
+            if kind in PDF_NUMERIC:
+                pdf.drawRightString(left + width - padding, y, text)
+            else:
+                pdf.drawString(left + padding, y, text)
+
+    def start_page(page):
+        pdf.setFont('Helvetica-Bold', PDF_FONT_SIZE + 4)
+        pdf.drawString(PDF_MARGIN, top - PDF_ROW_HEIGHT, title)
+        pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+        pdf.drawRightString(page_width - PDF_MARGIN, PDF_MARGIN - PDF_ROW_HEIGHT, f'Page {page}')
+        y = top - 2 * PDF_ROW_HEIGHT
+        pdf.setFillColor(PDF_HEADER_COLOR)
+        pdf.rect(PDF_MARGIN, y - 4, page_width - 2 * PDF_MARGIN, PDF_ROW_HEIGHT, stroke=0, fill=1)
+        pdf.setFillColor(colors.white)
+        draw_cells([label for _, label, _ in columns], y, 'Helvetica-Bold')
+        pdf.setFillColor(colors.black)
+        return y - PDF_ROW_HEIGHT
+
+    rows = iter(rows)
+    written = 0
+    page = 0
+    while True:
+        chunk = list(itertools.islice(rows, rows_per_page))
+        if not chunk and page:
+            break
+        page += 1
+        y = start_page(page)
+        for index, row in enumerate(chunk):
+            if index % 2:
+                pdf.setFillColor(PDF_STRIPE_COLOR)
+                pdf.rect(PDF_MARGIN, y - 4, page_width - 2 * PDF_MARGIN, PDF_ROW_HEIGHT, stroke=0, fill=1)
+                pdf.setFillColor(colors.black)
+            draw_cells([pdf_text(row.get(key), kind) for key, _, kind in columns], y, PDF_FONT)
+            y -= PDF_ROW_HEIGHT
+        written += len(chunk)
+        pdf.showPage()
+        if len(chunk) < rows_per_page:
+            break
+
+    pdf.save()
+    return written
+
+
+def pdf_response(rows, columns, title, filename):
+    return file_response(
+        lambda output: write_pdf(rows, columns, title, output),
+        filename,
+        PDF_CONTENT_TYPE
+    )
+
+
+def parquet_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        'date': pa.date32(),
+        'money': pa.decimal128(18, 2),
+        'percent': pa.float64(),
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        # Названия продуктов, регионов и т.п. повторяются - храним словарем
+        'text': pa.dictionary(pa.int32(), pa.string()),
+    }
+    return pa.schema([(key, types[kind]) for key, _, kind in columns])
+
+
+def _parquet_value(value, kind):
+    value = cell_value(value, kind)
+    if value is None:
+        return None
+    if kind == 'money':
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value))
+        return value.quantize(MONEY_QUANT)
+    if kind in ('percent', 'float'):
+        return float(value)
+    if kind == 'text':
+        return str(value)
+    return value
+
+
+def write_parquet(rows, columns, fileobj):
+    """Пишет строки в Parquet группами по REPORT_PARQUET_ROW_GROUP_SIZE, возвращает число строк"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(columns)
+    row_group_size = getattr(settings, 'REPORT_PARQUET_ROW_GROUP_SIZE', 50000)
+    total = 0
+
+    def flush(batch):
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(batch, schema)
+        ]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+
+    with pq.ParquetWriter(fileobj, schema, compression='zstd') as writer:
+        batch = [[] for _ in columns]
+        for row in rows:
+            for values, (key, _, kind) in zip(batch, columns):
+                values.append(_parquet_value(row.get(key), kind))
+            total += 1
+            if len(batch[0]) >= row_group_size:
+                flush(batch)
+                batch = [[] for _ in columns]
+
+        if batch[0] or not total:
+            flush(batch)
+
+    return total
+
+
+def parquet_response(rows, columns, filename):
+    return file_response(
+        lambda output: write_parquet(rows, columns, output),
+        filename,
+        PARQUET_CONTENT_TYPE
+    )
+
+
+def _chunk_rows(lines):
+    """Склеивает строки в блоки ~REPORT_STREAM_BLOCK_SIZE байт"""
+    block_size = getattr(settings, 'REPORT_STREAM_BLOCK_SIZE', 64 * 1024)
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def gzip_stream(chunks):
+    """Сжимает поток на лету; каждый блок сбрасывается, чтобы клиент сразу его получил"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, columns):
+    writer = csv.writer(_Echo())
+    # Заголовок отдается вместе с первой строкой, остальные строки идут потоком
+    yield writer.writerow([label for _, label, _ in columns])
+    yield from _chunk_rows(
+        writer.writerow([
+            '' if value is None else value
+            for value in (cell_value(row.get(key), kind) for key, _, kind in columns)
+        ])
+        for row in rows
+    )
+
+
+def iter_ndjson(rows, columns):
+    encoder = JSONEncoder(ensure_ascii=False)
+    yield from _chunk_rows(encoder.encode(export_row(row, columns)) + '\n' for row in rows)
+
+
+def _gzip_response(chunks, filename):
+    response = StreamingHttpResponse(gzip_stream(chunks), content_type=GZIP_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def csv_response(rows, columns, filename):
+    return _gzip_response(iter_csv(rows, columns), filename)
+
+
+def ndjson_response(rows, columns, filename):
+    return _gzip_response(iter_ndjson(rows, columns), filename)
+
+
+# Расширения файлов по формату выгрузки
+FILE_EXTENSIONS = {
+    'excel': 'xlsx',
+    'csv': 'csv.gz',
+    'ndjson': 'ndjson.gz',
+    'parquet': 'parquet',
+    'pdf': 'pdf',
+}
+
+
+def write_export(format, rows, columns, title, fileobj):
+    """Пишет выгрузку в открытый бинарный файл (для фоновых задач)"""
+    if format == 'excel':
+        write_excel(rows, columns, title, fileobj)
+    elif format == 'parquet':
+        write_parquet(rows, columns, fileobj)
+    elif format == 'pdf':
+        write_pdf(rows, columns, title, fileobj)
+    elif format in ('csv', 'ndjson'):
+        chunks = iter_csv(rows, columns) if format == 'csv' else iter_ndjson(rows, columns)
+        for chunk in gzip_stream(chunks):
+            fileobj.write(chunk)
+    else:
+        raise ValueError(f"Unsupported export format: {format}")
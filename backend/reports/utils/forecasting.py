@@ -0,0 +1,176 @@
+import itertools
+from datetime import date
+from dateutil.relativedelta import relativedelta
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from reports.models import DailyPaymentRollup, PaymentFlow, PaymentForecast
+from reports.utils import report_cache
+
+SEASON_LENGTH = 12
+SERIES_FIELDS = ('product_id', 'region_id', 'payment_type')
+# Сетка параметров сглаживания; лучший набор выбирается для каждого ряда
+ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.0, 0.1, 0.3)
+GAMMAS = (0.1, 0.3, 0.5)
+
+
+def _payment_source():
+    if getattr(settings, 'REPORTS_USE_ROLLUP', False):
+        return DailyPaymentRollup.objects.all()
+    return PaymentFlow.objects.all()
+
+
+def _month_number(value):
+    return value.year * 12 + value.month - 1
+
+
+def load_series(first_month, last_month, product_id=None, region_id=None, payment_type=None):
+    """Помесячные суммы всех рядов одним запросом: матрица (ряды × месяцы) и ключи рядов"""
+    queryset = _payment_source().filter(
+        date__gte=first_month,
+        date__lt=last_month + relativedelta(months=1)
+    )
+    if product_id:
+        queryset = queryset.filter(product_id=product_id)
+    if region_id:
+        queryset = queryset.filter(region_id=region_id)
+    if payment_type:
+        queryset = queryset.filter(payment_type=payment_type)
+
+    rows = queryset.annotate(month=TruncMonth('date')).values(
+        *SERIES_FIELDS, 'month'
+    ).annotate(amount=Sum('actual_amount')).order_by()
+
+    keys = {}
+    cells = []
+    base = _month_number(first_month)
+    for item in rows.iterator():
+        key = tuple(item[field] for field in SERIES_FIELDS)
+        series = keys.setdefault(key, len(keys))
+        cells.append((series, _month_number(item['month']) - base, float(item['amount'] or 0)))
+
+    n_months = _month_number(last_month) - base + 1
+    values = np.zeros((len(keys), n_months))
+    if cells:
+        series_idx, month_idx, amounts = (np.array(column) for column in zip(*cells))
+        values[series_idx.astype(np.int64), month_idx.astype(np.int64)] = amounts
+    return list(keys), values
+
+
+def fit_holt_winters(values, horizon):
+    """Аддитивный Хольт-Винтерс сразу для всех рядов и всех наборов параметров сетки
+
+    Возвращает прогноз (ряды × horizon) и выбранные alpha, beta, gamma.
+    Ряды короче двух сезонов сглаживаются без сезонной составляющей.
+    """
+    n_series, n_months = values.shape
+    m = SEASON_LENGTH
+    seasonal = n_months >= 2 * m
+
+    grid = np.array(list(itertools.product(ALPHAS, BETAS, GAMMAS if seasonal else (0.0,))))
+    alpha, beta, gamma = (grid[:, i][:, None] for i in range(3))
+
+    if seasonal:
+        # Начальное состояние - на момент перед первым месяцем: средние двух
+        # первых сезонов дают тренд, остатки первого сезона - сезонность
+        first = values[:, :m].mean(axis=1)
+        initial_trend = (values[:, m:2 * m].mean(axis=1) - first) / m
+        initial_level = first - initial_trend * (m + 1) / 2
+        initial_season = values[:, :m] - (initial_level[:, None] + initial_trend[:, None] * np.arange(1, m + 1))
+        level = np.broadcast_to(initial_level, (len(grid), n_series)).copy()
+        trend = np.broadcast_to(initial_trend, (len(grid), n_series)).copy()
+        season = np.broadcast_to(initial_season, (len(grid), n_series, m)).copy()
+    else:
+        level = np.broadcast_to(values[:, 0], (len(grid), n_series)).copy()
+        initial_trend = values[:, 1] - values[:, 0] if n_months > 1 else np.zeros(n_series)
+        trend = np.broadcast_to(initial_trend, (len(grid), n_series)).copy()
+        season = np.zeros((len(grid), n_series, m))
+
+    sse = np.zeros((len(grid), n_series))
+    for t in range(n_months):
+        observed = values[:, t]
+        s = t % m
+        error = observed - (level + trend + season[..., s])
+        sse += error ** 2
+
+        new_level = alpha * (observed - season[..., s]) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        season[..., s] = gamma * (observed - new_level) + (1 - gamma) * season[..., s]
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    series = np.arange(n_series)
+    steps = np.arange(1, horizon + 1)
+    season_idx = (n_months - 1 + steps) % m
+    forecast = (
+        level[best, series][:, None]
+        + steps[None, :] * trend[best, series][:, None]
+        + season[best[:, None], series[:, None], season_idx[None, :]]
+    )
+    # Отрицательных платежей не бывает
+    return np.clip(forecast, 0, None), grid[best]
+
+
+def build_forecasts(as_of=None, product_id=None, region_id=None, payment_type=None):
+    """Прогнозы на FORECAST_HORIZON месяцев для всех рядов (или только отфильтрованных)"""
+    as_of = as_of or timezone.localdate()
+    horizon = getattr(settings, 'FORECAST_HORIZON', 6)
+    history_months = getattr(settings, 'FORECAST_HISTORY_MONTHS', 36)
+
+    # Текущий месяц не закончен - история заканчивается предыдущим
+    last_month = date(as_of.year, as_of.month, 1) - relativedelta(months=1)
+    first_month = last_month - relativedelta(months=history_months - 1)
+    keys, values = load_series(first_month, last_month, product_id, region_id, payment_type)
+    if not keys:
+        return []
+
+    forecast, params = fit_holt_winters(values, horizon)
+    months = [last_month + relativedelta(months=step) for step in range(1, horizon + 1)]
+    return [
+        {
+            **dict(zip(SERIES_FIELDS, key)),
+            'month': month,
+            'amount': float(forecast[i, step]),
+            'alpha': float(params[i, 0]),
+            'beta': float(params[i, 1]),
+            'gamma': float(params[i, 2]),
+        }
+        for i, key in enumerate(keys)
+        for step, month in enumerate(months)
+    ]
+
+
+def refresh(as_of=None, batch_size=5000):
+    """Пересчитывает и сохраняет прогнозы всех рядов, возвращает число строк"""
+    rows = build_forecasts(as_of)
+    generated_at = timezone.now()
+    with transaction.atomic():
+        PaymentForecast.objects.all().delete()
+        PaymentForecast.objects.bulk_create(
+            [
+                PaymentForecast(
+                    product_id=row['product_id'],
+                    region_id=row['region_id'],
+                    payment_type=row['payment_type'],
+                    month=row['month'],
+                    amount=round(row['amount'], 2),
+                    alpha=row['alpha'],
+                    beta=row['beta'],
+                    gamma=row['gamma'],
+                    generated_at=generated_at
+                )
+                for row in rows
+            ],
+            batch_size=batch_size
+        )
+
+        def bump():
+            for product_id in {row['product_id'] for row in rows} | {None}:
+                report_cache.bump_versions('forecasts', product_id, [])
+
+        transaction.on_commit(bump)
+    return len(rows)
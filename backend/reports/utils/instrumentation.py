@@ -0,0 +1,223 @@
+import contextvars
+import ipaddress
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+# Замеры одного запроса: число и время SQL, время фаз (расчет отчета, кеш, рендеринг).
+# Отдаются заголовком Server-Timing и строкой журнала reports.requests,
+# агрегаты (гистограммы задержек) копятся в кеше отчетов и читаются /api/metrics/.
+
+logger = logging.getLogger('reports.requests')
+
+_current = contextvars.ContextVar('report_request_metrics', default=None)
+
+# Границы гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PHASES = ('compute', 'cache', 'wait', 'render')
+METRIC_PREFIX = 'reports:metrics'
+
+
+class RequestMetrics:
+    """Накопитель замеров запроса; он же execute_wrapper для всех соединений"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.phases = {}
+        self.started = time.perf_counter()
+        # Запросы шардов приходят из нескольких потоков (reports.utils.sharding)
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.sql_time += elapsed
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def track_request():
+    """Собирает замеры всего, что выполняется внутри блока"""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def track_connections():
+    """Учитывает SQL соединений текущего потока в замерах запроса.
+
+    Для рабочих потоков: контекст запроса передается через contextvars.copy_context(),
+    а execute_wrapper из track_request стоит только на соединениях потока запроса.
+    """
+    metrics = _current.get()
+    with ExitStack() as stack:
+        if metrics is not None:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+        yield
+
+
+@contextmanager
+def phase(name):
+    """Добавляет время блока к фазе текущего запроса; вне запроса ничего не делает"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(name, time.perf_counter() - started)
+
+
+def server_timing(metrics, total):
+    """Значение заголовка Server-Timing; SQL входит в compute, compute и render - в total"""
+    parts = [f'sql;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"']
+    parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in metrics.phases.items()]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def is_enabled():
+    return getattr(settings, 'REPORT_METRICS_ENABLED', True)
+
+
+def is_allowed_address(address):
+    """Метрики читаются только с адресов из REPORT_METRICS_ALLOWED_NETWORKS"""
+    networks = getattr(settings, 'REPORT_METRICS_ALLOWED_NETWORKS', ['127.0.0.1/32', '::1/128'])
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in networks)
+
+
+def _cache():
+    return caches[getattr(settings, 'REPORT_CACHE_ALIAS', 'default')]
+
+
+def _key(*parts):
+    return ':'.join((METRIC_PREFIX, *parts))
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def record(endpoint, report_type, status_code, total, metrics):
+    """Добавляет запрос в агрегаты: гистограмма задержек, ошибки, SQL и фазы"""
+    cache = _cache()
+    series = (endpoint, report_type or '')
+    bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if total <= bound), len(LATENCY_BUCKETS))
+    # Корзины хранятся без накопления, суммы - в микросекундах (incr работает с целыми)
+    _incr(cache, _key('bucket', *series, str(bucket)), 1)
+    _incr(cache, _key('count', *series), 1)
+    _incr(cache, _key('sum_us', *series), int(total * 1e6))
+    _incr(cache, _key('queries', *series), metrics.queries)
+    _incr(cache, _key('sql_us', *series), int(metrics.sql_time * 1e6))
+    for name, seconds in metrics.phases.items():
+        _incr(cache, _key('phase_us', *series, name), int(seconds * 1e6))
+    if status_code >= 500:
+        _incr(cache, _key('errors', *series), 1)
+
+
+def log_request(request, response, endpoint, report_type, total, metrics):
+    """Строка журнала в JSON: одна на запрос"""
+    user = getattr(request, 'user', None)
+    logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'report_type': report_type,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 1),
+        'queries': metrics.queries,
+        'sql_ms': round(metrics.sql_time * 1000, 1),
+        'phases_ms': {name: round(seconds * 1000, 1) for name, seconds in metrics.phases.items()},
+        'cache': response.get('X-Report-Cache'),
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+    }))
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text(endpoints, report_types):
+    """Агрегаты в текстовом формате Prometheus"""
+    series = [(endpoint, report_type) for endpoint in endpoints for report_type in ('', *report_types)]
+    keys = []
+    for endpoint, report_type in series:
+        keys += [_key('bucket', endpoint, report_type, str(i)) for i in range(len(LATENCY_BUCKETS) + 1)]
+        keys += [_key(name, endpoint, report_type) for name in ('count', 'sum_us', 'queries', 'sql_us', 'errors')]
+        keys += [_key('phase_us', endpoint, report_type, name) for name in PHASES]
+    values = _cache().get_many(keys)
+
+    metrics = {
+        'duration': ['# TYPE reports_request_duration_seconds histogram'],
+        'errors': ['# TYPE reports_request_errors_total counter'],
+        'queries': ['# TYPE reports_request_sql_queries_total counter'],
+        'sql': ['# TYPE reports_request_sql_seconds_total counter'],
+        'phases': ['# TYPE reports_request_phase_seconds_total counter'],
+    }
+    for endpoint, report_type in series:
+        count = values.get(_key('count', endpoint, report_type), 0)
+        if not count:
+            continue
+        labels = f'endpoint="{_label(endpoint)}",report_type="{_label(report_type)}"'
+
+        cumulative = 0
+        for i, bound in enumerate((*LATENCY_BUCKETS, '+Inf')):
+            cumulative += values.get(_key('bucket', endpoint, report_type, str(i)), 0)
+            metrics['duration'].append(f'reports_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        total = values.get(_key('sum_us', endpoint, report_type), 0) / 1e6
+        metrics['duration'].append(f'reports_request_duration_seconds_sum{{{labels}}} {total}')
+        metrics['duration'].append(f'reports_request_duration_seconds_count{{{labels}}} {count}')
+
+        metrics['errors'].append(
+            f'reports_request_errors_total{{{labels}}} {values.get(_key("errors", endpoint, report_type), 0)}'
+        )
+        metrics['queries'].append(
+            f'reports_request_sql_queries_total{{{labels}}} {values.get(_key("queries", endpoint, report_type), 0)}'
+        )
+        metrics['sql'].append(
+            f'reports_request_sql_seconds_total{{{labels}}} {values.get(_key("sql_us", endpoint, report_type), 0) / 1e6}'
+        )
+        for name in PHASES:
+            seconds = values.get(_key('phase_us', endpoint, report_type, name), 0) / 1e6
+            metrics['phases'].append(f'reports_request_phase_seconds_total{{{labels},phase="{name}"}} {seconds}')
+
+    return '\n'.join(line for lines in metrics.values() for line in lines) + '\n'
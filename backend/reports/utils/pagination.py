@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+from datetime import date
+from django.conf import settings
+
+# Keyset-пагинация отчетов: курсор хранит ключ сортировки последней отданной строки,
+# следующая страница начинается условием "ключ больше курсора", а не OFFSET,
+# поэтому каждая страница - просмотр диапазона индекса.
+
+
+def page_size_limits():
+    default = getattr(settings, 'REPORT_PAGE_SIZE', 100)
+    return default, getattr(settings, 'REPORT_MAX_PAGE_SIZE', 5000)
+
+
+def parse_page_size(value):
+    default, maximum = page_size_limits()
+    if value in (None, ''):
+        return default
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('page_size must be an integer')
+    if not 1 <= page_size <= maximum:
+        raise ValueError(f'page_size must be between 1 and {maximum}')
+    return page_size
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(report_type, key):
+    payload = json.dumps({'t': report_type, 'k': list(key)}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(report_type, cursor):
+    """Ключ сортировки из курсора; ValueError, если курсор поврежден или от другого отчета"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        key = payload['k']
+        if payload['t'] != report_type or not isinstance(key, list):
+            raise ValueError
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    return key
+
+
+def get_page(generator, report_type, cursor=None, page_size=None, with_total=False):
+    """Страница отчета: строки, курсор следующей страницы (None на последней) и, по запросу, всего строк"""
+    queryset = generator.get_queryset()
+    if cursor:
+        key = decode_cursor(report_type, cursor)
+        try:
+            if len(key) != len(generator.cursor_fields):
+                raise ValueError
+            queryset = generator.seek(queryset, key)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+
+    # Лишняя строка показывает, есть ли следующая страница, без отдельного COUNT
+    items = list(queryset[:page_size + 1])
+    page = {
+        'data': [generator.build_row(item) for item in items[:page_size]],
+        'next_cursor': (
+            encode_cursor(report_type, generator.cursor_key(items[page_size - 1]))
+            if len(items) > page_size else None
+        ),
+        'page_size': page_size,
+    }
+    if with_total:
+        page['total'] = generator.count_rows()
+    return page
@@ -0,0 +1,175 @@
+import re
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from reports.models import PaymentFlow
+from reports.utils.sql_inspection import plan_nodes
+
+# PaymentFlow в PostgreSQL секционирована по месяцам (RANGE по date),
+# см. миграцию 0007_partition_payment_flows. На других СУБД функции ничего не делают.
+PARENT_TABLE = PaymentFlow._meta.db_table
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def is_supported(db_connection=None):
+    return (db_connection or connection).vendor == 'postgresql'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_y{month.year}m{month.month:02d}'
+
+
+def partition_month(name):
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(cursor, table=PARENT_TABLE):
+    cursor.execute(
+        """
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+        """,
+        [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor):
+    """Секции PaymentFlow: имя, границы и оценка числа строк по статистике"""
+    cursor.execute(
+        """
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)
+        ORDER BY child.relname
+        """,
+        [PARENT_TABLE]
+    )
+    return [
+        {'name': name, 'bound': bound, 'month': partition_month(name), 'rows': max(int(rows), 0)}
+        for name, bound, rows in cursor.fetchall()
+    ]
+
+
+def create_default_partition(cursor):
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT')
+
+
+def create_partition(cursor, month):
+    """Создает секцию за месяц; строки этого месяца, попавшие в DEFAULT, переносит в нее"""
+    month = month_start(month)
+    name = partition_name(month)
+    cursor.execute('SELECT to_regclass(%s)', [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    start = month.isoformat()
+    end = (month + relativedelta(months=1)).isoformat()
+    cursor.execute(f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)')
+    cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+    if cursor.fetchone()[0] is not None:
+        # Иначе ATTACH не пройдет проверку DEFAULT-секции
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            [start, end]
+        )
+    cursor.execute(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    return True
+
+
+def ensure_partitions(months_ahead=None, start=None):
+    """Заводит секции с start (по умолчанию - текущий месяц) на months_ahead месяцев вперед"""
+    if not is_supported():
+        return []
+    months_ahead = months_ahead if months_ahead is not None else getattr(settings, 'PAYMENT_PARTITIONS_AHEAD', 3)
+    month = month_start(start or timezone.localdate())
+    last = month_start(timezone.localdate()) + relativedelta(months=months_ahead)
+
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        while month <= last:
+            if create_partition(cursor, month):
+                created.append(partition_name(month))
+            month += relativedelta(months=1)
+    return created
+
+
+def detach_partitions(before, drop=False):
+    """Отсоединяет (и при drop удаляет) секции за месяцы раньше before
+
+    DETACH работает с метаданными и не трогает строки, в отличие от DELETE.
+    Отсоединенная секция остается обычной таблицей - ее можно выгрузить в архив.
+    Дневной rollup не меняется, поэтому агрегированные отчеты за эти месяцы сохраняются:
+    rollup.rebuild() и rollup.verify() не трогают месяцы раньше retained_since().
+    """
+    if not is_supported():
+        return []
+    before = month_start(before)
+
+    detached = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        for partition in list_partitions(cursor):
+            if partition['month'] is None or partition['month'] >= before:
+                continue
+            cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition['name']}")
+            if drop:
+                cursor.execute(f"DROP TABLE {partition['name']}")
+            detached.append(partition['name'])
+    return detached
+
+
+def retained_since():
+    """Первый месяц, сырые строки которого еще в PaymentFlow; None - ограничения нет
+
+    Отсоединяются только самые старые секции, поэтому граница - первая
+    присоединенная секция месяца или более ранние строки DEFAULT-секции.
+    """
+    if not is_supported():
+        return None
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return None
+        attached = list_partitions(cursor)
+        months = [partition['month'] for partition in attached if partition['month'] is not None]
+        if not months:
+            return None
+        since = min(months)
+        if any(partition['name'] == DEFAULT_PARTITION for partition in attached):
+            cursor.execute(f'SELECT min(date) FROM {DEFAULT_PARTITION}')
+            oldest = cursor.fetchone()[0]
+            if oldest is not None and oldest < since:
+                since = month_start(oldest)
+    return since
+
+
+def scanned_partitions(plan):
+    """Секции PaymentFlow, которые читает план запроса (EXPLAIN FORMAT JSON)"""
+    return sorted({
+        node['Relation Name']
+        for node in plan_nodes(plan)
+        if node.get('Relation Name', '').startswith(f'{PARENT_TABLE}_')
+    })
@@ -0,0 +1,197 @@
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from reports.models import ClosedPeriod, InsuranceProduct, PaymentFlow, PeriodSnapshot
+from reports.utils import report_cache
+
+# Закрытые периоды: месяцы старше окна закрытия не меняются, поэтому строки отчетов
+# за них хранятся готовыми (PeriodSnapshot), а живым запросом считаются только
+# открытые месяцы и неполные месяцы на краях периода. Снимок зависит только от фильтров
+# SNAPSHOT_FILTERS; строки в нем - уже в виде JSON (суммы числами, даты строками).
+# Любая запись PaymentFlow в закрытый месяц (сигналы, пакетная загрузка) переоткрывает
+# его через reopen_months, так что снимки не расходятся с живыми строками.
+SNAPSHOT_FILTERS = ('product_id', 'region_id', 'payment_type')
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def month_start(value):
+    return _parse_date(value).replace(day=1)
+
+
+def month_end(month):
+    return month + relativedelta(months=1) - timedelta(days=1)
+
+
+def latest_closable(today=None):
+    """Последний месяц, который можно закрыть: после его конца прошло REPORT_CLOSE_WINDOW_MONTHS месяцев"""
+    today = today or timezone.localdate()
+    return today.replace(day=1) - relativedelta(months=getattr(settings, 'REPORT_CLOSE_WINDOW_MONTHS', 1) + 1)
+
+
+def split(start_date, end_date):
+    """Делит период на отрезки (начало, конец, закрыт): закрытые месяцы, покрытые целиком,
+    идут отдельными отрезками, все остальное склеивается в непрерывные живые отрезки"""
+    start, end = _parse_date(start_date), _parse_date(end_date)
+    closed = set(ClosedPeriod.objects.filter(
+        month__gte=start.replace(day=1), month__lte=end
+    ).values_list('month', flat=True))
+
+    segments = []
+    current = start
+    while current <= end:
+        month = current.replace(day=1)
+        last = min(month_end(month), end)
+        is_closed = month in closed and current == month and last == month_end(month)
+        if segments and not is_closed and not segments[-1][2]:
+            segments[-1] = (segments[-1][0], last, False)
+        else:
+            segments.append((current, last, is_closed))
+        current = last + timedelta(days=1)
+    return segments
+
+
+def covers_closed(start_date, end_date):
+    """Есть ли в периоде закрытый месяц, покрытый целиком"""
+    return any(closed for _, _, closed in split(start_date, end_date))
+
+
+def snapshot_filters(params):
+    return {key: str(params[key]) for key in SNAPSHOT_FILTERS if params.get(key) not in (None, '')}
+
+
+def params_key(filters):
+    return hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+
+
+def compute_month(generator_class, filters, month):
+    """Живой расчет отчета за целый месяц в JSON-представлении снимка"""
+    rows = generator_class({
+        **filters,
+        'start_date': month.isoformat(),
+        'end_date': month_end(month).isoformat()
+    }).generate_live()
+    return json.loads(JSONEncoder().encode(rows))
+
+
+def snapshot_rows(generator_class, params, months):
+    """Строки снимков по месяцам; недостающие снимки закрытых месяцев считаются и сохраняются"""
+    report_type = generator_class.period_snapshot
+    filters = snapshot_filters(params)
+    key = params_key(filters)
+    stored = dict(PeriodSnapshot.objects.filter(
+        report_type=report_type, params_key=key, month__in=months
+    ).values_list('month', 'data'))
+
+    missing = [month for month in months if month not in stored]
+    if missing:
+        snapshots = [
+            PeriodSnapshot(
+                report_type=report_type,
+                month=month,
+                params_key=key,
+                params=filters,
+                data=compute_month(generator_class, filters, month)
+            )
+            for month in missing
+        ]
+        # Снимки не меняются: при гонке двух запросов остается первый
+        PeriodSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+        stored.update((snapshot.month, snapshot.data) for snapshot in snapshots)
+    return stored
+
+
+def generate(generator):
+    """Отчет из снимков закрытых месяцев и живого расчета остальных дат"""
+    segments = split(generator.start_date, generator.end_date)
+    if not any(closed for _, _, closed in segments):
+        return generator.generate_live()
+
+    generator_class = type(generator)
+    snapshots = snapshot_rows(generator_class, generator.params, [start for start, _, closed in segments if closed])
+    rows = []
+    for start, end, closed in segments:
+        if closed:
+            rows.extend(snapshots[start])
+        else:
+            rows.extend(generator_class({
+                **generator.params,
+                'start_date': start.isoformat(),
+                'end_date': end.isoformat()
+            }).generate_live())
+    if generator.sort_key is not None:
+        rows.sort(key=generator.sort_key)
+    return rows
+
+
+def close_month(month, generator_classes):
+    """Закрывает месяц и сразу сохраняет снимки без фильтров и по каждому типу платежа"""
+    month = month_start(month)
+    if month > latest_closable():
+        raise ValueError(f"{month:%Y-%m} is still inside the close window")
+
+    with transaction.atomic():
+        _, created = ClosedPeriod.objects.get_or_create(month=month)
+        if not created:
+            return False
+        # Снимки, оставшиеся от прежнего закрытия, могли устареть
+        PeriodSnapshot.objects.filter(month=month).delete()
+        for generator_class in generator_classes:
+            for payment_type in (None, *dict(PaymentFlow.PAYMENT_TYPES)):
+                snapshot_rows(generator_class, {'payment_type': payment_type}, [month])
+    return True
+
+
+def close_through(generator_classes, through=None):
+    """Закрывает все еще открытые месяцы с данными по through (по умолчанию - последний закрываемый)"""
+    through = month_start(through) if through else latest_closable()
+    first = PaymentFlow.objects.aggregate(first=Min('date'))['first']
+    if first is None:
+        return []
+
+    closed = []
+    month = first.replace(day=1)
+    already = set(ClosedPeriod.objects.values_list('month', flat=True))
+    while month <= through:
+        if month not in already and close_month(month, generator_classes):
+            closed.append(month)
+        month += relativedelta(months=1)
+    return closed
+
+
+def reopen_months(months):
+    """Переоткрывает закрытые месяцы из months (даты любых дней): удаляет их снимки сразу,
+    а кеш отчетов за них сбрасывает после коммита. Возвращает переоткрытые месяцы"""
+    months = {month_start(month) for month in months}
+    reopened = list(ClosedPeriod.objects.filter(month__in=months).values_list('month', flat=True))
+    if not reopened:
+        return []
+
+    with transaction.atomic():
+        ClosedPeriod.objects.filter(month__in=reopened).delete()
+        PeriodSnapshot.objects.filter(month__in=reopened).delete()
+
+    def bump():
+        # Результаты в кеше могли быть собраны из снимков, которые уже не совпадают с данными
+        for product_id in [None, *InsuranceProduct.objects.values_list('id', flat=True)]:
+            report_cache.bump_versions('payments', product_id, reopened)
+
+    transaction.on_commit(bump)
+    return reopened
+
+
+def reopen(month):
+    """Переоткрывает месяц для поздних корректировок; False, если он не был закрыт"""
+    return bool(reopen_months([month]))
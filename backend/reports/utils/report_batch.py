@@ -0,0 +1,173 @@
+import time
+from datetime import datetime
+from django.db.models import Sum
+from reports.utils import columnar, instrumentation, report_cache
+from reports.utils.report_generators import BaseReportGenerator, REPORT_GENERATORS
+
+# Несколько отчетов с общими параметрами за один проход по данным. Денежный поток,
+# убыточность и история прогноза строятся из одной выборки PaymentFlow (или rollup),
+# сгруппированной по дню, продукту и типу платежа, - самой мелкой нужной им гранулярности.
+# Остальные отчеты считаются своими генераторами.
+SHARED_SCAN = ('cashflow', 'loss_ratio', 'forecast')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError as e:
+        raise ValueError(f"Invalid date format: {str(e)}")
+
+
+def _add(total, value):
+    """Сложение с семантикой SQL SUM: None пропускается, сумма одних None - None"""
+    if value is None:
+        return total
+    return value if total is None else total + value
+
+
+def scan(params, start, end):
+    """Общая выборка: суммы по (день, продукт, тип платежа) с фильтрами продукта, региона и типа"""
+    base = BaseReportGenerator({**params, 'start_date': start.isoformat(), 'end_date': end.isoformat()})
+    return list(
+        base.get_aggregate_queryset().values(
+            'date', 'product_id', 'product__name', 'payment_type'
+        ).annotate(
+            actual_rows=base.actual_rows_aggregate(),
+            expected_amount=Sum('expected_amount'),
+            actual_amount=Sum('actual_amount')
+        ).order_by()
+    )
+
+
+def derive_cashflow(generator, rows, start, end):
+    groups = {}
+    for row in rows:
+        if not start <= row['date'] <= end:
+            continue
+        key = (row['date'], row['product_id'])
+        item = groups.get(key)
+        if item is None:
+            groups[key] = dict(row)
+        else:
+            item['actual_rows'] = _add(item['actual_rows'], row['actual_rows'])
+            item['expected_amount'] = _add(item['expected_amount'], row['expected_amount'])
+            item['actual_amount'] = _add(item['actual_amount'], row['actual_amount'])
+    # Порядок как у CashFlowReportGenerator: дата, продукт
+    return [generator.build_row(groups[key]) for key in sorted(groups)]
+
+
+def derive_loss_ratio(generator, rows, start, end):
+    groups = {}
+    for row in rows:
+        if not start <= row['date'] <= end:
+            continue
+        key = (row['product_id'], row['date'].year, row['date'].month)
+        item = groups.setdefault(key, {
+            'product_id': row['product_id'],
+            'product__name': row['product__name'],
+            'year': key[1],
+            'month': key[2],
+            'earned_premium': 0,
+            'incurred_losses': 0
+        })
+        if row['actual_amount'] is None:
+            continue
+        if row['payment_type'] == 'premium':
+            item['earned_premium'] += row['actual_amount']
+        elif row['payment_type'] == 'claim':
+            item['incurred_losses'] += row['actual_amount']
+    # В SQL суммы считаются с output_field=FloatField - приводим так же, чтобы совпало деление
+    for item in groups.values():
+        item['earned_premium'] = float(item['earned_premium'])
+        item['incurred_losses'] = float(item['incurred_losses'])
+    return [generator.build_row(groups[key]) for key in sorted(groups)]
+
+
+def derive_forecast(generator, rows, start, end):
+    generator.validate_params()
+    history_start, history_end = generator.history_range()
+    months = {}
+    for row in rows:
+        if not history_start <= row['date'] <= history_end:
+            continue
+        item = months.setdefault(row['date'].replace(day=1), {'actual_amount': None, 'expected_amount': None})
+        item['actual_amount'] = _add(item['actual_amount'], row['actual_amount'])
+        item['expected_amount'] = _add(item['expected_amount'], row['expected_amount'])
+    historical = [
+        {
+            'date': month,
+            'actual_amount': float(item['actual_amount'] or 0),
+            'expected_amount': float(item['expected_amount'] or 0)
+        }
+        for month, item in sorted(months.items())
+    ]
+    return generator.build_report(historical)
+
+
+DERIVE = {
+    'cashflow': derive_cashflow,
+    'loss_ratio': derive_loss_ratio,
+    'forecast': derive_forecast,
+}
+
+
+def _timed(compute):
+    started = time.perf_counter()
+    data = compute()
+    return data, (time.perf_counter() - started) * 1000
+
+
+def run(report_types, params, layout='rows'):
+    """Результаты отчетов по типам и время общей выборки.
+
+    Каждый отчет сначала ищется в кеше отчетов (по тем же ключам, что и ReportAPI);
+    промахи считаются через report_cache.compute_once, поэтому одновременные такие же
+    запросы (и пакетные, и ReportAPI) ждут один расчет. Выборка выполняется при первом
+    расчете отчета из SHARED_SCAN. Ошибка одного отчета не мешает остальным.
+    """
+    start, end = _parse_date(params['start_date']), _parse_date(params['end_date'])
+    results = {}
+    pending = {}
+    for report_type in report_types:
+        key, data = report_cache.lookup(report_type, params)
+        if data is not None:
+            results[report_type] = {'status': 'success', 'data': data, 'cache': 'hit', 'compute_ms': 0.0}
+        else:
+            pending[report_type] = key
+
+    shared = [report_type for report_type in pending if report_type in SHARED_SCAN]
+    scan_start = start
+    if 'forecast' in shared:
+        scan_start = min(start, REPORT_GENERATORS['forecast'](params).history_range()[0])
+    scanned = {}
+
+    def shared_rows():
+        if 'rows' not in scanned:
+            scanned['rows'], scanned['ms'] = _timed(lambda: scan(params, scan_start, end))
+        return scanned['rows']
+
+    def compute(report_type, generator):
+        with instrumentation.phase('compute'):
+            if report_type in DERIVE:
+                data = DERIVE[report_type](generator, shared_rows(), start, end)
+                return columnar.convert(data) if layout == 'columns' else data
+            if layout == 'columns':
+                return generator.generate_columns()
+            return generator.generate()
+
+    for report_type, key in pending.items():
+        generator = REPORT_GENERATORS[report_type](params)
+        started = time.perf_counter()
+        try:
+            data, source = report_cache.compute_once(report_type, key, lambda: compute(report_type, generator))
+        except ValueError as e:
+            results[report_type] = {'status': 'error', 'error': str(e)}
+            continue
+        compute_ms = (time.perf_counter() - started) * 1000
+        results[report_type] = {'status': 'success', 'data': data, 'cache': source, 'compute_ms': round(compute_ms, 1)}
+
+    return {
+        'scan_ms': round(scanned['ms'], 1) if 'ms' in scanned else None,
+        'scan_rows': len(scanned['rows']) if 'rows' in scanned else None,
+        'reports': {report_type: results[report_type] for report_type in report_types},
+    }
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import time
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import caches
+from reports.utils import instrumentation, single_flight
+
+# Какие данные использует каждый тип отчета. Для доменов из MONTHLY_DOMAINS
+# версия берется по месяцам периода отчета, для остальных - за всю историю.
+REPORT_DEPENDENCIES = {
+    'cashflow': ('payments',),
+    'loss_ratio': ('payments',),
+    'forecast': ('payments', 'forecasts'),
+    'reserves': ('reserves', 'claims'),
+    'chain_ladder': ('claims',),
+    'stress': ('claims', 'payments'),
+}
+MONTHLY_DOMAINS = ('payments', 'reserves')
+ALL = '*'
+
+
+def get_cache():
+    return caches[getattr(settings, 'REPORT_CACHE_ALIAS', 'default')]
+
+
+def is_enabled():
+    return getattr(settings, 'REPORT_CACHE_ENABLED', True)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def normalize_params(report_type, params):
+    """Каноничный набор параметров: пустые значения отброшены, все приведено к строкам"""
+    normalized = {'type': report_type}
+    for key, value in params.items():
+        if value in (None, ''):
+            continue
+        if key in ('start_date', 'end_date'):
+            value = _parse_date(value).isoformat()
+        normalized[key] = str(value).strip()
+    return normalized
+
+
+def month_key(value):
+    return _parse_date(value).strftime('%Y-%m')
+
+
+def months_between(start_date, end_date):
+    current = _parse_date(start_date).replace(day=1)
+    end = _parse_date(end_date)
+    months = []
+    while current <= end:
+        months.append(current.strftime('%Y-%m'))
+        current += relativedelta(months=1)
+    return months
+
+
+def version_key(domain, product_id=None, month=None):
+    return f"reports:version:{domain}:{product_id or ALL}:{month or ALL}"
+
+
+def dependency_keys(report_type, params):
+    """Счетчики версий данных, от которых зависит отчет"""
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    product_id = params.get('product_id')
+
+    if report_type == 'forecast' and start_date:
+        # Прогноз смотрит на два года истории до начала периода
+        start_date = _parse_date(start_date) - relativedelta(years=2)
+
+    keys = []
+    for domain in REPORT_DEPENDENCIES.get(report_type, ()):
+        if domain in MONTHLY_DOMAINS and start_date and end_date:
+            keys.extend(
+                version_key(domain, product_id, month)
+                for month in months_between(start_date, end_date)
+            )
+        else:
+            keys.append(version_key(domain, product_id))
+    return keys
+
+
+def _new_version():
+    # Счетчик, вытесненный из кеша, заводится заново с уникальным значением,
+    # поэтому ранее сохраненные результаты с ним уже не совпадут
+    return time.time_ns()
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def bump_versions(domain, product_id, dates):
+    """Инвалидирует результаты, зависящие от данных домена за указанные даты"""
+    cache = get_cache()
+    keys = {version_key(domain, product_id), version_key(domain)}
+    for value in dates:
+        if value is None:
+            continue
+        month = month_key(value)
+        keys.add(version_key(domain, product_id, month))
+        keys.add(version_key(domain, None, month))
+
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def result_key(report_type, params, kind='result'):
+    normalized = normalize_params(report_type, params)
+    versions = get_versions(dependency_keys(report_type, normalized))
+    payload = json.dumps([normalized, sorted(versions.items())], sort_keys=True)
+    return f"reports:{kind}:{report_type}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def export_key(report_type, format, params):
+    """Ключ готового файла выгрузки на текущей версии данных; None, если версии отчет не отслеживает"""
+    if not is_enabled() or report_type not in REPORT_DEPENDENCIES:
+        return None
+    return result_key(report_type, {**params, 'format': format}, kind='export')
+
+
+def record_stat(outcome, report_type):
+    cache = get_cache()
+    for key in (f"reports:stats:{outcome}", f"reports:stats:{outcome}:{report_type}"):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    """Счетчики попаданий и промахов по типам отчетов; warm_hits - попадания в прогретые результаты,
+    coalesced - запросы, дождавшиеся такого же одновременного расчета"""
+    cache = get_cache()
+    report_types = sorted(REPORT_DEPENDENCIES)
+    outcomes = ('hit', 'miss', 'warm', 'coalesced')
+    keys = [f"reports:stats:{outcome}" for outcome in outcomes]
+    keys += [
+        f"reports:stats:{outcome}:{report_type}"
+        for report_type in report_types
+        for outcome in outcomes
+    ]
+    values = cache.get_many(keys)
+
+    def summary(suffix=''):
+        hits = values.get(f"reports:stats:hit{suffix}", 0)
+        misses = values.get(f"reports:stats:miss{suffix}", 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': (hits / total) if total else 0,
+            'warm_hits': values.get(f"reports:stats:warm{suffix}", 0),
+            'coalesced': values.get(f"reports:stats:coalesced{suffix}", 0)
+        }
+
+    stats = summary()
+    stats['by_type'] = {
+        report_type: summary(f":{report_type}") for report_type in report_types
+    }
+    return stats
+
+
+def lookup(report_type, params):
+    """(ключ, данные) из кеша; данные None при промахе или выключенном кеше"""
+    if not is_enabled():
+        return None, None
+    with instrumentation.phase('cache'):
+        key = result_key(report_type, params)
+        entry = get_cache().get(key)
+        record_stat('hit' if entry is not None else 'miss', report_type)
+        # Попадание в результат, заранее посчитанный прогревом (см. reports.utils.warming)
+        if entry is not None and entry.get('warmed'):
+            record_stat('warm', report_type)
+    return key, entry['data'] if entry is not None else None
+
+
+def store(key, data, warmed=False):
+    if key is None:
+        return
+    entry = {'data': data, 'warmed': True} if warmed else {'data': data}
+    with instrumentation.phase('cache'):
+        get_cache().set(key, entry, timeout=getattr(settings, 'REPORT_CACHE_TIMEOUT', 6 * 60 * 60))
+
+
+def peek(key):
+    """Данные по ключу без учета в статистике; None, если их нет"""
+    entry = get_cache().get(key)
+    return entry['data'] if entry is not None else None
+
+
+def get_or_compute(report_type, params, compute):
+    """Возвращает (данные, источник): 'hit' - из кеша, 'miss' - посчитаны этим запросом,
+    'coalesced' - посчитаны одновременным таким же запросом (см. reports.utils.single_flight)"""
+    key, data = lookup(report_type, params)
+    if data is not None:
+        return data, 'hit'
+    return compute_once(report_type, key, compute)
+
+
+def compute_once(report_type, key, compute):
+    """Расчет после промаха lookup(): (данные, 'miss' или 'coalesced'), одновременные
+    одинаковые расчеты схлопываются в один"""
+    if key is None:
+        return compute(), 'miss'
+
+    def compute_and_store():
+        result = compute()
+        store(key, result)
+        return result
+
+    data, leader = single_flight.run(key, compute_and_store, lambda: peek(key))
+    if not leader:
+        record_stat('coalesced', report_type)
+    return data, 'miss' if leader else 'coalesced'
@@ -1,15 +1,30 @@
-import pandas as pd
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from django.db.models import Q, Sum, Avg, F, ExpressionWrapper, FloatField
-from django.db.models.functions import ExtractMonth, ExtractYear
+from django.conf import settings
+from django.db.models import Q, Sum, Avg, Count, F, ExpressionWrapper, FloatField
+from django.db.models.functions import ExtractMonth, ExtractYear, TruncMonth
+from django.utils import timezone
 from reports.models import *
+from reports.utils import chain_ladder, columnar, forecasting, instrumentation, pagination, periods, stress_simulation
+import logging
 import numpy as np
 from reports.serializers import *
 from django.db.models import Case, When, FloatField
 # from scipy import stats
 
+logger = logging.getLogger(__name__)
+
+def _parse_date(value):
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
 class BaseReportGenerator:
+    # Поля сортировки для keyset-пагинации; None - отчет отдается только целиком
+    cursor_fields = None
+    # Имя отчета в снимках закрытых месяцев (reports.utils.periods); None - отчет всегда считается живым
+    period_snapshot = None
+    # Порядок строк при склейке снимков с живым расчетом; None - отрезки уже идут по порядку
+    sort_key = None
+
     def __init__(self, params):
         self.params = params
         self.start_date = params.get('start_date')
@@ -17,10 +32,11 @@ class BaseReportGenerator:
         self.product_id = params.get('product_id')
         self.region_id = params.get('region_id')
         self.payment_type = params.get('payment_type')
+        self.use_rollup = getattr(settings, 'REPORTS_USE_ROLLUP', False)
         self.base_queryset = self.get_base_queryset()
 
-    def get_base_queryset(self):
-        queryset = PaymentFlow.objects.filter(
+    def apply_filters(self, queryset):
+        queryset = queryset.filter(
             date__gte=self.start_date,
             date__lte=self.end_date
         )
@@ -34,167 +50,312 @@ class BaseReportGenerator:
         if self.payment_type:
             queryset = queryset.filter(payment_type=self.payment_type)
             
-        return queryset.select_related('product', 'region')
+        return queryset
+
+    def get_base_queryset(self):
+        return self.apply_filters(PaymentFlow.objects.all()).select_related('product', 'region')
+
+    def get_aggregate_queryset(self):
+        """Источник для агрегатов по суммам: дневной rollup или сырые PaymentFlow"""
+        if self.use_rollup:
+            return self.apply_filters(DailyPaymentRollup.objects.all())
+        return self.base_queryset
+
+    def actual_rows_aggregate(self):
+        """Число строк с фактической суммой (None в Sum означает, что их не было)"""
+        if self.use_rollup:
+            return Sum('actual_count')
+        return Count('actual_amount')
 
     def generate(self):
         raise NotImplementedError
 
+    def generate_columns(self):
+        """Отчет по колонкам (см. reports.utils.columnar); по умолчанию собирается из строк generate()"""
+        return columnar.convert(self.generate())
+
+    def run(self, layout='rows'):
+        """generate() с замером времени расчета (фаза compute в Server-Timing)"""
+        with instrumentation.phase('compute'):
+            if layout == 'columns':
+                return self.generate_columns()
+            return self.generate()
+
+    def run_page(self, report_type, cursor=None, page_size=None, with_total=False, layout='rows'):
+        """Одна страница отчета (см. reports.utils.pagination)"""
+        if self.cursor_fields is None:
+            raise ValueError(f'Pagination is not supported for {report_type} report')
+        with instrumentation.phase('compute'):
+            page = pagination.get_page(self, report_type, cursor, page_size, with_total)
+            if layout == 'columns':
+                page['data'] = columnar.from_rows(page['data'])
+            return page
+
+    def cursor_key(self, item):
+        return [item[field] for field in self.cursor_fields]
+
+    def seek(self, queryset, key):
+        """Строки, идущие в порядке сортировки после ключа key"""
+        raise NotImplementedError
+
+    def iter_rows(self):
+        """Строки отчета по одной; генераторы с большим объемом читают их курсором"""
+        yield from self.generate()
+
+    def get_queryset(self):
+        return None
+
+    def count_rows(self):
+        """Число строк отчета для оценки прогресса выгрузки, None - если неизвестно"""
+        queryset = self.get_queryset()
+        return queryset.count() if queryset is not None else None
+
+    @property
+    def chunk_size(self):
+        return getattr(settings, 'REPORT_EXPORT_CHUNK_SIZE', 2000)
+
 class CashFlowReportGenerator(BaseReportGenerator):
-    def generate(self):
-        queryset = self.base_queryset.values(
+    cursor_fields = ('date', 'product_id')
+    period_snapshot = 'cashflow'
+
+    def get_queryset(self):
+        return self.get_aggregate_queryset().values(
             'date',
+            'product_id',
             'product__name'
         ).annotate(
+            actual_rows=self.actual_rows_aggregate(),
             expected_amount=Sum('expected_amount'),
             actual_amount=Sum('actual_amount')
-        ).order_by('date')
-        
+        ).order_by('date', 'product_id')
+
+    def seek(self, queryset, key):
+        last_date, product_id = _parse_date(key[0]), int(key[1])
+        # date__gte дублирует условие, чтобы план начинался с диапазона индекса по дате
+        return queryset.filter(
+            Q(date__gt=last_date) | Q(date=last_date, product_id__gt=product_id),
+            date__gte=last_date
+        )
+
+    def build_row(self, item):
         # Вручную преобразуем данные, так как это не ModelSerializer
-        result = []
-        for item in queryset:
-            result.append({
-                'date': item['date'],
-                'product_name': item['product__name'],
-                'expected_amount': item['expected_amount'],
-                'actual_amount': item['actual_amount'],
-                'difference': (item['actual_amount'] - item['expected_amount']) if item['actual_amount'] else None,
-                'accuracy': (item['actual_amount'] / item['expected_amount'] * 100) if item['expected_amount'] else None
-            })
-        return result
+        if not item['actual_rows']:
+            item['actual_amount'] = None
+        return {
+            'date': item['date'],
+            'product_name': item['product__name'],
+            'expected_amount': item['expected_amount'],
+            'actual_amount': item['actual_amount'],
+            'difference': (item['actual_amount'] - item['expected_amount']) if item['actual_amount'] else None,
+            'accuracy': (item['actual_amount'] / item['expected_amount'] * 100) if item['expected_amount'] and item['actual_amount'] is not None else None
+        }
+
+    def generate(self):
+        return periods.generate(self)
+
+    def generate_live(self):
+        return [self.build_row(item) for item in self.get_queryset()]
+
+    def generate_columns(self):
+        if periods.covers_closed(self.start_date, self.end_date):
+            return columnar.convert(self.generate())
+        # Колонки собираются из результата запроса целиком, без словаря на строку
+        rows = list(self.get_queryset().values_list(
+            'date', 'product__name', 'actual_rows', 'expected_amount', 'actual_amount'
+        ))
+        dates, names, actual_rows, expected, actual = zip(*rows) if rows else ((),) * 5
+        expected = columnar.floats(expected)
+        actual = columnar.floats(actual)
+        has_actual = columnar.floats(actual_rows) > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            accuracy = actual / expected * 100
+        # Те же правила пустых значений, что и в build_row
+        return columnar.table({
+            'date': list(dates),
+            'product_name': list(names),
+            'expected_amount': expected.tolist(),
+            'actual_amount': columnar.nullable(actual, has_actual),
+            'difference': columnar.nullable((actual - expected).round(2), has_actual & (actual != 0)),
+            'accuracy': columnar.nullable(accuracy, has_actual & (expected != 0)),
+        }, len(dates))
+
+    def iter_rows(self):
+        for item in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield self.build_row(item)
 
 class ReserveReportGenerator(BaseReportGenerator):
+    cursor_fields = ('calculation_date', 'id')
+
     def generate(self):
-        # Расчет резервов по методу Chain Ladder
-        claims = InsuranceClaim.objects.filter(
-            event_date__lte=self.end_date,
-            status__in=['open', 'processing', 'paid']
-        )
-        
-        if self.product_id:
-            claims = claims.filter(policy__product_id=self.product_id)
-            
-        development_data = claims.annotate(
-            development_year=ExtractYear('event_date'),
-            development_month=ExtractMonth('event_date')
-        ).values(
-            'development_year',
-            'development_month'
-        ).annotate(
-            total_reserve=Sum('reserve'),
-            total_paid=Sum('paid_amount')
-        ).order_by('development_year', 'development_month')
-        
+        # Оценка резервов по треугольникам развития - отчет chain_ladder
+        return ReserveReportSerializer(self.get_queryset(), many=True).data
+
+    def get_queryset(self):
         # Расчет достаточности резервов
         reserve_calculations = ReserveCalculation.objects.filter(
             calculation_date__range=(self.start_date, self.end_date)
-        )
+        ).select_related('product')
         
         if self.product_id:
             reserve_calculations = reserve_calculations.filter(product_id=self.product_id)
             
-        return ReserveReportSerializer(reserve_calculations, many=True).data
+        return reserve_calculations.order_by('calculation_date', 'id')
+
+    def build_row(self, calculation):
+        return ReserveReportSerializer(calculation).data
+
+    def cursor_key(self, calculation):
+        return [calculation.calculation_date, calculation.id]
+
+    def seek(self, queryset, key):
+        last_date, calculation_id = _parse_date(key[0]), int(key[1])
+        return queryset.filter(
+            Q(calculation_date__gt=last_date) | Q(calculation_date=last_date, id__gt=calculation_id),
+            calculation_date__gte=last_date
+        )
+
+    def iter_rows(self):
+        for calculation in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield self.build_row(calculation)
+
+class ChainLadderReportGenerator(BaseReportGenerator):
+    """Резервы по методу Chain Ladder: ультимативные убытки и IBNR по периодам происшествия"""
+    def generate(self):
+        return chain_ladder.estimate(
+            self.end_date,
+            start_date=self.start_date,
+            product_id=self.product_id,
+            period=self.params.get('period') or 'month'
+        )
 
 class LossRatioReportGenerator(BaseReportGenerator):
+    cursor_fields = ('product_id', 'year', 'month')
+    period_snapshot = 'loss_ratio'
+
+    @staticmethod
+    def sort_key(row):
+        return row['product_id'], row['year'], row['month']
+
+    def get_queryset(self):
+        # Получаем данные по премиям и убыткам
+        return self.get_aggregate_queryset().annotate(
+            year=ExtractYear('date'),
+            month=ExtractMonth('date')
+        ).values(
+            'product_id',
+            'product__name',
+            'year',
+            'month'
+        ).annotate(
+            earned_premium=Sum(
+                Case(
+                    When(payment_type='premium', then='actual_amount'),
+                    default=0,
+                    output_field=FloatField()
+                )
+            ),
+            incurred_losses=Sum(
+                Case(
+                    When(payment_type='claim', then='actual_amount'),
+                    default=0,
+                    output_field=FloatField()
+                )
+            )
+        ).order_by('product_id', 'year', 'month')
+
+    def seek(self, queryset, key):
+        product_id, year, month = (int(value) for value in key)
+        # (год, месяц) больше ключа - то же самое, что дата не раньше следующего месяца
+        next_month = datetime(year, month, 1).date() + relativedelta(months=1)
+        return queryset.filter(
+            Q(product_id__gt=product_id) | Q(product_id=product_id, date__gte=next_month),
+            product_id__gte=product_id
+        )
+
+    def build_row(self, item):
+        # Добавляем расчет убыточности
+        earned = item['earned_premium'] or 0
+        losses = item['incurred_losses'] or 0
+        loss_ratio = (losses / earned * 100) if earned > 0 else 0
+        
+        return {
+            'product_id': item['product_id'],
+            'product_name': item['product__name'],
+            'year': item['year'],
+            'month': item['month'],
+            'earned_premium': float(earned),
+            'incurred_losses': float(losses),
+            'loss_ratio': float(loss_ratio)
+        }
+
     def generate(self):
+        return periods.generate(self)
+
+    def generate_live(self):
         try:
-            # Получаем данные по премиям и убыткам
-            monthly_data = self.base_queryset.annotate(
-                year=ExtractYear('date'),
-                month=ExtractMonth('date')
-            ).values(
-                'product_id',
-                'product__name',
-                'year',
-                'month'
-            ).annotate(
-                earned_premium=Sum(
-                    Case(
-                        When(payment_type='premium', then='actual_amount'),
-                        default=0,
-                        output_field=FloatField()
-                    )
-                ),
-                incurred_losses=Sum(
-                    Case(
-                        When(payment_type='claim', then='actual_amount'),
-                        default=0,
-                        output_field=FloatField()
-                    )
-                )
-            ).order_by('product_id', 'year', 'month')
-
-            # Добавляем расчет убыточности
-            result = []
-            for item in monthly_data:
-                earned = item['earned_premium'] or 0
-                losses = item['incurred_losses'] or 0
-                loss_ratio = (losses / earned * 100) if earned > 0 else 0
-                
-                result.append({
-                    'product_id': item['product_id'],
-                    'product_name': item['product__name'],
-                    'year': item['year'],
-                    'month': item['month'],
-                    'earned_premium': float(earned),
-                    'incurred_losses': float(losses),
-                    'loss_ratio': float(loss_ratio)
-                })
-            
-            return result
+            return [self.build_row(item) for item in self.get_queryset()]
 
         except Exception as e:
-            print(f"Error generating loss ratio report: {str(e)}")
+            logger.exception("Error generating loss ratio report")
             raise ValueError("Failed to generate loss ratio report")
 
+    def generate_columns(self):
+        if periods.covers_closed(self.start_date, self.end_date):
+            return columnar.convert(self.generate())
+        rows = list(self.get_queryset().values_list(
+            'product_id', 'product__name', 'year', 'month', 'earned_premium', 'incurred_losses'
+        ))
+        product_ids, names, years, months, earned, losses = zip(*rows) if rows else ((),) * 6
+        earned = np.nan_to_num(columnar.floats(earned))
+        losses = np.nan_to_num(columnar.floats(losses))
+        loss_ratio = np.divide(losses, earned, out=np.zeros_like(earned), where=earned > 0) * 100
+        return columnar.table({
+            'product_id': list(product_ids),
+            'product_name': list(names),
+            'year': list(years),
+            'month': list(months),
+            'earned_premium': earned.tolist(),
+            'incurred_losses': losses.tolist(),
+            'loss_ratio': loss_ratio.tolist(),
+        }, len(product_ids))
+
+    def iter_rows(self):
+        for item in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield self.build_row(item)
+
 class PaymentForecastGenerator(BaseReportGenerator):
     def generate(self):
-        try:
-            # Получаем исторические данные
-            history = self.get_historical_data()
-            
-            if not history:
-                return {
-                    'historical': [],
-                    'forecast': [],
-                    'message': 'No historical data available'
-                }
-            
-            # Группируем по месяцам
-            df = pd.DataFrame(list(history.values(
-                'date', 'actual_amount', 'expected_amount'
-            )))
-            
-            df['date'] = pd.to_datetime(df['date'])
-            df.set_index('date', inplace=True)
-            monthly = df.resample('M').sum()
-            
-            # Простой прогноз (скользящее среднее)
-            forecast_values = monthly['actual_amount'].rolling(3).mean().iloc[-1]
-            
-            # Формируем прогноз на 6 месяцев вперед
-            last_date = monthly.index[-1]
-            forecast_dates = pd.date_range(
-                start=last_date + pd.offsets.MonthBegin(1),
-                periods=6,
-                freq='M'
-            )
-            
-            return {
-                'historical': monthly.reset_index().to_dict('records'),
-                'forecast': [{
-                    'date': date.strftime('%Y-%m-%d'),
-                    'amount': float(forecast_values)
-                } for date in forecast_dates]
-            }
-            
-        except Exception as e:
-            print(f"Forecast error: {str(e)}")
+        self.validate_params()
+        return self.build_report(self.get_historical_data())
+
+    def build_report(self, historical):
+        # История - помесячные суммы, прогноз - готовые строки PaymentForecast, если они
+        # построены на ту же дату; для другого end_date ряды считаются заново
+        as_of = self.forecast_as_of()
+        forecast = self.get_stored_forecast()
+        if not forecast or forecast[0]['date'] != periods.month_start(as_of):
+            forecast = self.fit_forecast(as_of)
+
+        if not historical and not forecast:
             return {
-                'error': str(e),
                 'historical': [],
-                'forecast': []
+                'forecast': [],
+                'message': 'No historical data available'
             }
 
+        return {
+            'historical': historical,
+            'forecast': forecast
+        }
+
+    def iter_rows(self):
+        """Плоские строки для выгрузки: история и прогноз с признаком series"""
+        data = self.generate()
+        for item in data.get('historical', []):
+            yield {'series': 'historical', **item}
+        for item in data.get('forecast', []):
+            yield {'series': 'forecast', **item}
+
     def validate_params(self):
         """Проверка обязательных параметров"""
         if not hasattr(self, 'start_date') or not self.start_date:
@@ -204,130 +365,136 @@ class PaymentForecastGenerator(BaseReportGenerator):
         if not hasattr(self, 'payment_type') or not self.payment_type:
             raise ValueError("Payment type is required")
 
-    def get_historical_data(self):
-        """Получение исторических данных с проверкой"""
+    def history_range(self):
+        """История прогноза: два года до начала периода и сам период"""
         try:
             history_start = datetime.strptime(self.start_date, '%Y-%m-%d') - relativedelta(years=2)
             end_date = datetime.strptime(self.end_date, '%Y-%m-%d')
-            
-            queryset = PaymentFlow.objects.filter(
-                date__gte=history_start,
-                date__lte=end_date,
-                payment_type=self.payment_type
-            )
-            
-            if self.product_id:
-                queryset = queryset.filter(product_id=self.product_id)
-            if self.region_id:
-                queryset = queryset.filter(region_id=self.region_id)
-                
-            return queryset
-            
         except ValueError as e:
             raise ValueError(f"Invalid date format: {str(e)}")
+        return history_start.date(), end_date.date()
 
-    def calculate_forecast(self, queryset):
-        """Основная логика прогнозирования с обработкой ошибок"""
-        try:
-            # Конвертация в DataFrame
-            df = pd.DataFrame(list(queryset.values(
-                'date', 'expected_amount', 'actual_amount'
-            )))
-            
-            if df.empty:
-                return {
-                    'historical': [],
-                    'forecast': [],
-                    'message': 'No data available after filtering'
-                }
-            
-            # Работа с датами
-            df['date'] = pd.to_datetime(df['date'])
-            df.set_index('date', inplace=True)
-            
-            # Определение частоты группировки
-            date_range = (datetime.strptime(self.end_date, '%Y-%m-%d') - 
-                         datetime.strptime(self.start_date, '%Y-%m-%d')).days
-            freq = 'M' if date_range > 90 else 'W'
-            
-            # Группировка и расчет скользящего среднего
-            grouped = df.resample(freq).agg({
-                'actual_amount': 'sum',
-                'expected_amount': 'sum'
-            }).dropna()
-            
-            if grouped.empty:
-                return {
-                    'historical': [],
-                    'forecast': [],
-                    'message': 'Not enough data for forecasting'
-                }
-            
-            window_size = min(3, len(grouped))  # Адаптивный размер окна
-            grouped['forecast'] = grouped['actual_amount'].rolling(window=window_size).mean()
-            
-            # Прогнозирование
-            last_date = grouped.index[-1]
-            forecast_dates = pd.date_range(
-                start=last_date + pd.Timedelta(days=1),
-                periods=6,
-                freq=freq
-            )
-            
-            forecast_value = grouped['forecast'].iloc[-1] if not grouped['forecast'].isna().all() else 0
-            forecast_values = [forecast_value] * len(forecast_dates)
-            
-            return {
-                'historical': grouped.reset_index().to_dict('records'),
-                'forecast': [
-                    {'date': d.strftime('%Y-%m-%d'), 'amount': float(a)} 
-                    for d, a in zip(forecast_dates, forecast_values)
-                ]
+    def get_historical_data(self):
+        """Помесячные суммы за два года до начала периода и сам период"""
+        history_start, end_date = self.history_range()
+
+        source = DailyPaymentRollup.objects.all() if self.use_rollup else PaymentFlow.objects.all()
+        queryset = source.filter(
+            date__gte=history_start,
+            date__lte=end_date,
+            payment_type=self.payment_type
+        )
+
+        if self.product_id:
+            queryset = queryset.filter(product_id=self.product_id)
+        if self.region_id:
+            queryset = queryset.filter(region_id=self.region_id)
+
+        monthly = queryset.annotate(month=TruncMonth('date')).values('month').annotate(
+            actual_amount=Sum('actual_amount'),
+            expected_amount=Sum('expected_amount')
+        ).order_by('month')
+
+        return [
+            {
+                'date': item['month'],
+                'actual_amount': float(item['actual_amount'] or 0),
+                'expected_amount': float(item['expected_amount'] or 0)
             }
-            
-        except Exception as e:
-            raise ValueError(f"Forecast calculation failed: {str(e)}")
-
-class StressTestingGenerator:
-    def __init__(self, product_id=None, scenario='medium'):
-        self.product_id = product_id
-        self.scenario = scenario
-        self.scenarios = {
-            'low': 1.2,
-            'medium': 1.5,
-            'high': 2.0,
-            'extreme': 3.0
-        }
-    
-    def generate(self):
-        # Базовые данные о премиях и убытках
-        claims = InsuranceClaim.objects.all()
-        payments = PaymentFlow.objects.filter(payment_type='claim')
-        
+            for item in monthly
+        ]
+
+    def forecast_as_of(self):
+        """Дата прогноза: история заканчивается последним полным месяцем не позже end_date"""
+        _, end_date = self.history_range()
+        return min(end_date + timedelta(days=1), timezone.localdate())
+
+    def get_stored_forecast(self):
+        """Прогноз из PaymentForecast, просуммированный по подходящим рядам"""
+        forecasts = PaymentForecast.objects.filter(payment_type=self.payment_type)
+
         if self.product_id:
-            claims = claims.filter(policy__product_id=self.product_id)
-            payments = payments.filter(product_id=self.product_id)
-            
-        # Основные метрики
-        total_premium = PaymentFlow.objects.filter(
-            payment_type='premium'
-        ).aggregate(total=Sum('actual_amount'))['total'] or 0
-        
-        total_claims = claims.aggregate(
-            total_paid=Sum('paid_amount'),
-            total_reserve=Sum('reserve')
+            forecasts = forecasts.filter(product_id=self.product_id)
+        if self.region_id:
+            forecasts = forecasts.filter(region_id=self.region_id)
+
+        return [
+            {'date': item['month'], 'amount': float(item['amount'])}
+            for item in forecasts.values('month').annotate(amount=Sum('amount')).order_by('month')
+        ]
+
+    def fit_forecast(self, as_of=None):
+        """Запасной путь, пока ночная задача не заполнила таблицу или end_date раньше
+        ее даты прогноза: считаем только нужные ряды"""
+        totals = {}
+        for row in forecasting.build_forecasts(
+            as_of,
+            product_id=self.product_id,
+            region_id=self.region_id,
+            payment_type=self.payment_type
+        ):
+            totals[row['month']] = totals.get(row['month'], 0) + row['amount']
+        return [{'date': month, 'amount': amount} for month, amount in sorted(totals.items())]
+
+class StressTestingGenerator(BaseReportGenerator):
+    """Стресс-тест Монте-Карло по частоте и тяжести убытков продуктов"""
+    def generate(self):
+        return stress_simulation.run(
+            self.start_date,
+            self.end_date,
+            product_id=self.product_id,
+            scenario=self.params.get('scenario') or 'base',
+            simulations=self.params.get('simulations'),
+            seed=self.params.get('seed')
         )
-        
-        # Применяем стресс-фактор
-        stress_factor = self.scenarios.get(self.scenario, 1.5)
-        stressed_claims = total_claims['total_paid'] * stress_factor
-        
-        return {
-            'scenario': self.scenario,
-            'stress_factor': stress_factor,
-            'total_premium': total_premium,
-            'normal_claims': total_claims['total_paid'],
-            'stressed_claims': stressed_claims,
-            'reserves': total_claims['total_reserve'],
-            'impact': (stressed_claims - total_claims['total_paid']) / total_premium * 100
-        }
\ No newline at end of file
+
+class PaymentFlowExtractGenerator(BaseReportGenerator):
+    """Сырые строки PaymentFlow за период для выгрузки без агрегации"""
+    def get_queryset(self):
+        return self.base_queryset.values(
+            'id',
+            'date',
+            'product__name',
+            'region__name',
+            'policy_id',
+            'payment_type',
+            'expected_amount',
+            'actual_amount',
+            'is_recurring',
+            'forecast_accuracy'
+        ).order_by('date', 'id')
+
+    def build_row(self, item):
+        item['product_name'] = item.pop('product__name')
+        item['region_name'] = item.pop('region__name')
+        return item
+
+    def generate(self):
+        return list(self.iter_rows())
+
+    def iter_rows(self):
+        for item in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield self.build_row(item)
+
+
+# Генераторы отчетов, доступные через API, по значению параметра type
+REPORT_GENERATORS = {
+    'cashflow': CashFlowReportGenerator,
+    'reserves': ReserveReportGenerator,
+    'loss_ratio': LossRatioReportGenerator,
+    'forecast': PaymentForecastGenerator,
+    'chain_ladder': ChainLadderReportGenerator,
+    'stress': StressTestingGenerator
+}
+
+def get_generator_class(report_type):
+    return REPORT_GENERATORS.get(report_type)
+
+# Выгрузка дополнительно умеет отдавать сырые платежи
+EXPORT_GENERATORS = {
+    **REPORT_GENERATORS,
+    'payment_flows': PaymentFlowExtractGenerator
+}
+
+# Отчеты, которые за закрытые месяцы читаются из снимков (см. reports.utils.periods)
+SNAPSHOT_GENERATORS = [generator for generator in REPORT_GENERATORS.values() if generator.period_snapshot]
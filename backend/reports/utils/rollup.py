@@ -0,0 +1,176 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from reports.models import DailyPaymentRollup, PaymentFlow
+from reports.utils import partitions
+
+KEY_FIELDS = ('date', 'product_id', 'region_id', 'payment_type')
+ZERO = Decimal('0')
+
+
+def _to_python(field_name, value):
+    field = PaymentFlow._meta.get_field(field_name)
+    value = field.to_python(value)
+    if isinstance(value, Decimal):
+        # БД округляет суммы до decimal_places, rollup должен получать те же значения
+        value = quantize(value, field.decimal_places)
+    return value
+
+
+def quantize(value, decimal_places=2):
+    return value.quantize(Decimal(1).scaleb(-decimal_places), rounding=ROUND_HALF_UP)
+
+
+def flow_state(flow):
+    """Снимок полей PaymentFlow, влияющих на rollup"""
+    return {
+        'date': _to_python('date', flow.date),
+        'product_id': flow.product_id,
+        'region_id': flow.region_id,
+        'payment_type': flow.payment_type,
+        'expected_amount': _to_python('expected_amount', flow.expected_amount) or ZERO,
+        'actual_amount': _to_python('actual_amount', flow.actual_amount),
+    }
+
+
+def apply_flow(state, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) одну строку PaymentFlow из rollup"""
+    actual = state['actual_amount']
+    apply_delta(
+        {field: state[field] for field in KEY_FIELDS},
+        expected_amount=sign * state['expected_amount'],
+        actual_amount=sign * (actual or ZERO),
+        actual_count=sign * (actual is not None),
+        row_count=sign
+    )
+
+
+def apply_delta(key, expected_amount=ZERO, actual_amount=ZERO, actual_count=0, row_count=0):
+    """Атомарно применяет приращения к одной группе rollup"""
+    updates = {
+        'expected_amount': F('expected_amount') + expected_amount,
+        'actual_amount': F('actual_amount') + actual_amount,
+        'actual_count': F('actual_count') + actual_count,
+        'row_count': F('row_count') + row_count,
+    }
+
+    with transaction.atomic():
+        bucket = DailyPaymentRollup.objects.filter(**key)
+        if not bucket.update(**updates):
+            try:
+                with transaction.atomic():
+                    DailyPaymentRollup.objects.create(
+                        expected_amount=expected_amount,
+                        actual_amount=actual_amount,
+                        actual_count=actual_count,
+                        row_count=row_count,
+                        **key
+                    )
+            except IntegrityError:
+                # Группу успел создать параллельный запрос
+                bucket.update(**updates)
+
+        bucket.filter(row_count__lte=0).delete()
+
+
+def raw_aggregates(start_date=None, end_date=None):
+    """Группировка сырых PaymentFlow по ключу rollup"""
+    queryset = PaymentFlow.objects.all()
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+
+    return queryset.values(*KEY_FIELDS).annotate(
+        expected_sum=Sum('expected_amount'),
+        actual_sum=Sum('actual_amount'),
+        actual_rows=Count('actual_amount'),
+        rows=Count('id')
+    ).order_by()
+
+
+def rollup_queryset(start_date=None, end_date=None):
+    queryset = DailyPaymentRollup.objects.all()
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset
+
+
+def attached_start(start_date=None):
+    """Начало периода без месяцев, секции которых отсоединены (partitions.detach_partitions):
+    их сырых строк больше нет, и rollup за них пересчитать или сверить нельзя"""
+    since = partitions.retained_since()
+    if since is None:
+        return start_date
+    if start_date is None or date.fromisoformat(str(start_date)) < since:
+        return since
+    return start_date
+
+
+def rebuild(start_date=None, end_date=None, batch_size=5000):
+    """Пересчитывает rollup за период из сырых данных, возвращает число групп"""
+    start_date = attached_start(start_date)
+    created = 0
+    with transaction.atomic():
+        rollup_queryset(start_date, end_date).delete()
+
+        batch = []
+        for item in raw_aggregates(start_date, end_date).iterator(chunk_size=batch_size):
+            batch.append(DailyPaymentRollup(
+                date=item['date'],
+                product_id=item['product_id'],
+                region_id=item['region_id'],
+                payment_type=item['payment_type'],
+                expected_amount=item['expected_sum'] or ZERO,
+                actual_amount=item['actual_sum'] or ZERO,
+                actual_count=item['actual_rows'],
+                row_count=item['rows']
+            ))
+            if len(batch) >= batch_size:
+                DailyPaymentRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+
+        if batch:
+            DailyPaymentRollup.objects.bulk_create(batch)
+            created += len(batch)
+
+    return created
+
+
+def verify(start_date=None, end_date=None):
+    """Сравнивает rollup с сырыми данными, возвращает список расхождений"""
+    start_date = attached_start(start_date)
+    expected = {}
+    for item in raw_aggregates(start_date, end_date).iterator():
+        expected[tuple(item[field] for field in KEY_FIELDS)] = (
+            quantize(item['expected_sum'] or ZERO),
+            quantize(item['actual_sum'] or ZERO),
+            item['actual_rows'],
+            item['rows']
+        )
+
+    actual = {}
+    rollup_rows = rollup_queryset(start_date, end_date).values(
+        *KEY_FIELDS, 'expected_amount', 'actual_amount', 'actual_count', 'row_count'
+    )
+    for item in rollup_rows.iterator():
+        actual[tuple(item[field] for field in KEY_FIELDS)] = (
+            quantize(item['expected_amount']),
+            quantize(item['actual_amount']),
+            item['actual_count'],
+            item['row_count']
+        )
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        if expected.get(key) != actual.get(key):
+            mismatches.append({
+                'key': dict(zip(KEY_FIELDS, key)),
+                'raw': expected.get(key),
+                'rollup': actual.get(key)
+            })
+    return mismatches
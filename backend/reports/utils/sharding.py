@@ -0,0 +1,193 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from celery import current_task, group, signature
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from dateutil.relativedelta import relativedelta
+from kombu.exceptions import OperationalError
+from django.conf import settings
+from django.db import connections
+from rest_framework.utils.encoders import JSONEncoder
+from reports.utils import broker, columnar, instrumentation
+from reports.utils.report_cache import months_between
+from reports.utils.report_generators import REPORT_GENERATORS
+
+# Шардированный расчет длинных периодов: диапазон дат режется по границам месяцев
+# на REPORT_SHARDS отрезков, каждый считается своим запросом на своем соединении -
+# задачами Celery (group) или потоками общего на процесс пула (REPORT_SHARD_THREADS).
+# Отрезки не пересекаются ни по дням, ни по месяцам, поэтому частичные результаты
+# склеиваются без досуммирования: денежный поток - подряд по порядку шардов,
+# убыточность - с сортировкой по sort_key генератора.
+SHARDED_REPORTS = ('cashflow', 'loss_ratio')
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _parse_date(value):
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def parse_shards(value):
+    """Число шардов из ?shards=; None - по настройкам, 1 - без шардирования"""
+    if value in (None, ''):
+        return None
+    try:
+        shards = int(value)
+    except ValueError:
+        raise ValueError('shards must be an integer')
+    max_shards = getattr(settings, 'REPORT_MAX_SHARDS', 16)
+    if not 1 <= shards <= max_shards:
+        raise ValueError(f'shards must be between 1 and {max_shards}')
+    return shards
+
+
+def plan(report_type, params, shards=None):
+    """Отрезки (начало, конец) для шардов или [] - отчет считается одним запросом.
+
+    Без явного числа шардов режутся только периоды от REPORT_SHARD_MIN_MONTHS месяцев.
+    """
+    if report_type not in SHARDED_REPORTS:
+        return []
+    months = months_between(params['start_date'], params['end_date'])
+    if shards is None:
+        if len(months) < getattr(settings, 'REPORT_SHARD_MIN_MONTHS', 24):
+            return []
+        shards = getattr(settings, 'REPORT_SHARDS', 4)
+    shards = min(shards, len(months))
+    if shards < 2:
+        return []
+
+    start, end = _parse_date(params['start_date']), _parse_date(params['end_date'])
+    size, extra = divmod(len(months), shards)
+    bounds = []
+    month = start.replace(day=1)
+    for index in range(shards):
+        count = size + (1 if index < extra else 0)
+        last = month + relativedelta(months=count) - relativedelta(days=1)
+        bounds.append((max(month, start), min(last, end)))
+        month += relativedelta(months=count)
+    return bounds
+
+
+def get_executor():
+    executor = getattr(settings, 'REPORT_SHARD_EXECUTOR', 'threads')
+    # Внутри задачи Celery (прогрев, выгрузки) ждать другие задачи нельзя, а при
+    # CELERY_TASK_ALWAYS_EAGER задачи выполнились бы по очереди - в обоих случаях потоки
+    if executor == 'celery' and (current_task or getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False)):
+        return 'threads'
+    return executor
+
+
+def compute_shard(report_type, params):
+    """Строки отчета за один отрезок и время его расчета"""
+    started = time.perf_counter()
+    rows = REPORT_GENERATORS[report_type](params).generate()
+    return {
+        'start_date': params['start_date'],
+        'end_date': params['end_date'],
+        'rows': rows,
+        'compute_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _compute_in_thread(report_type, params):
+    try:
+        with instrumentation.track_connections():
+            return compute_shard(report_type, params)
+    finally:
+        # У каждого потока свое соединение с БД - закрываем, чтобы не копились
+        connections.close_all()
+
+
+def _thread_pool():
+    """Пул потоков шардов, общий для всех запросов процесса (не больше REPORT_SHARD_THREADS)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'REPORT_SHARD_THREADS', 4),
+                thread_name_prefix='report-shard'
+            )
+        return _pool
+
+
+def _run_threads(report_type, shard_params):
+    # Каждый шард - в своей копии контекста запроса, чтобы его SQL попал в замеры запроса
+    futures = [
+        _thread_pool().submit(contextvars.copy_context().run, _compute_in_thread, report_type, item)
+        for item in shard_params
+    ]
+    return [future.result() for future in futures]
+
+
+def serialize_shard(shard):
+    """Шард для бэкенда результатов Celery (JSON): суммы числами, даты строками"""
+    return {**shard, 'rows': json.loads(JSONEncoder().encode(shard['rows']))}
+
+
+def _run_celery(report_type, shard_params):
+    """Шарды задачами Celery; None, если брокер недоступен или воркеры не успели за REPORT_SHARD_TIMEOUT"""
+    try:
+        broker.ensure_available()
+        result = group(
+            signature('reports.tasks.run_report_shard', args=(report_type, item)) for item in shard_params
+        ).apply_async(retry=False)
+    except OperationalError:
+        logger.warning("Celery broker is unavailable, computing %s shards in threads", report_type)
+        return None
+    try:
+        return result.get(timeout=getattr(settings, 'REPORT_SHARD_TIMEOUT', 30))
+    except CeleryTimeoutError:
+        # Воркеры заняты (например, выгрузками) - не держим запрос, считаем сами
+        result.revoke()
+        logger.warning("Celery shards of %s timed out, computing them in threads", report_type)
+        return None
+
+
+def run(report_type, params, bounds, layout='rows'):
+    """Отчет по шардам: (данные, сводка по шардам для ответа)"""
+    shard_params = [
+        {**params, 'start_date': start.isoformat(), 'end_date': end.isoformat()}
+        for start, end in bounds
+    ]
+    executor = get_executor()
+    started = time.perf_counter()
+    with instrumentation.phase('compute'):
+        shards = None
+        if executor == 'celery':
+            shards = _run_celery(report_type, shard_params)
+            if shards is None:
+                executor = 'threads'
+        if shards is None:
+            shards = _run_threads(report_type, shard_params)
+
+        # Порядок шардов - порядок дат, независимо от того, какой досчитался первым
+        generator_class = REPORT_GENERATORS[report_type]
+        data = [row for shard in shards for row in shard['rows']]
+        if generator_class.sort_key is not None:
+            data.sort(key=generator_class.sort_key)
+        if layout == 'columns':
+            data = columnar.convert(data)
+
+    summary = {
+        'executor': executor,
+        'count': len(shards),
+        'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+        'shards': [
+            {
+                'start_date': shard['start_date'],
+                'end_date': shard['end_date'],
+                'rows': len(shard['rows']),
+                'compute_ms': shard['compute_ms'],
+            }
+            for shard in shards
+        ],
+    }
+    return data, summary
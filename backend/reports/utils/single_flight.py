@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django_redis.cache import RedisCache
+from reports.utils import instrumentation
+
+# Схлопывание одновременных одинаковых расчетов (single flight): по ключу считает
+# только первый запрос, остальные ждут и получают его результат.
+#  - В процессе: потоки ждут threading.Event ведущего потока.
+#  - Между процессами (gunicorn, Celery): блокировка в Redis кеша отчетов (SET NX PX,
+#    продление и снятие - скриптами Lua со сравнением владельца). С LocMemCache - замена
+#    в памяти для тестов и разработки - то же через cache.add() под блокировкой потоков.
+#    Ожидающие опрашивают read(), пока ведущий не сохранит результат.
+# Ошибка ведущего передается ожидающим: ValueError - с тем же текстом (ответ 400),
+# остальное - как FlightError. Пока ведущий считает, он продлевает блокировку каждую
+# треть REPORT_COALESCE_LOCK_TTL, поэтому долгий расчет ее не теряет, а блокировка
+# упавшего процесса истекает за LOCK_TTL - и ее берет один из ожидающих. Дольше
+# REPORT_COALESCE_TIMEOUT (с запасом больше самых долгих отчетов) никто не ждет.
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = 'reports:flight'
+
+# Снять или продлить блокировку, только если она все еще наша
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class FlightError(Exception):
+    """Расчет ведущего запроса завершился ошибкой"""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+# Атомарность сравнения и снятия для кешей в памяти процесса (LocMemCache)
+_local_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'REPORT_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'REPORT_COALESCE_TIMEOUT', 300)
+
+
+def _lock_ttl():
+    return getattr(settings, 'REPORT_COALESCE_LOCK_TTL', 30)
+
+
+def _redis(cache):
+    """Клиент Redis кеша отчетов; None для других бэкендов"""
+    if isinstance(cache, RedisCache):
+        return cache.client.get_client(write=True)
+    return None
+
+
+def _acquire(cache, lock_key, token):
+    client = _redis(cache)
+    if client is not None:
+        return bool(client.set(cache.make_key(lock_key), token, nx=True, px=int(_lock_ttl() * 1000)))
+    return cache.add(lock_key, token, timeout=_lock_ttl())
+
+
+def _owner(cache, lock_key):
+    client = _redis(cache)
+    if client is not None:
+        owner = client.get(cache.make_key(lock_key))
+        return owner.decode() if owner is not None else None
+    return cache.get(lock_key)
+
+
+def _extend(cache, lock_key, token):
+    client = _redis(cache)
+    if client is not None:
+        return bool(client.eval(EXTEND_SCRIPT, 1, cache.make_key(lock_key), token, int(_lock_ttl() * 1000)))
+    with _local_lock:
+        return cache.get(lock_key) == token and cache.touch(lock_key, _lock_ttl())
+
+
+def _release(cache, lock_key, token):
+    # Чужую блокировку (наша истекла и ее взял другой) не трогаем
+    client = _redis(cache)
+    if client is not None:
+        client.eval(RELEASE_SCRIPT, 1, cache.make_key(lock_key), token)
+        return
+    with _local_lock:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _heartbeat(cache, lock_key, token, stop):
+    """Продлевает блокировку, пока ведущий считает; прекращает, если она уже не наша"""
+    while not stop.wait(_lock_ttl() / 3):
+        if not _extend(cache, lock_key, token):
+            logger.warning("Lost coalescing lock %s", lock_key)
+            return
+
+
+def run(key, compute, read):
+    """(результат, ведущий ли это запрос).
+
+    compute() выполняется одним запросом на ключ и сам сохраняет результат туда,
+    откуда его прочитает read(); read() возвращает None, пока результата нет.
+    """
+    if not getattr(settings, 'REPORT_COALESCE_ENABLED', True):
+        return compute(), True
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        with instrumentation.phase('wait'):
+            finished = flight.done.wait(_timeout())
+        if not finished:
+            logger.warning("Timed out waiting for %s, computing it again", key)
+            return compute(), True
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, False
+
+    try:
+        flight.result, leader = _run_shared(key, compute, read)
+        return flight.result, leader
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _lead(cache, lock_key, error_key, token, compute):
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(cache, lock_key, token, stop), daemon=True)
+    heartbeat.start()
+    try:
+        return compute()
+    except Exception as e:
+        cache.set(error_key, {
+            'token': token,
+            'type': 'ValueError' if isinstance(e, ValueError) else type(e).__name__,
+            'message': str(e)
+        }, timeout=getattr(settings, 'REPORT_COALESCE_ERROR_TTL', 10))
+        raise
+    finally:
+        stop.set()
+        heartbeat.join()
+        _release(cache, lock_key, token)
+
+
+def _run_shared(key, compute, read):
+    """Тот же протокол между процессами через блокировку в кеше"""
+    cache = _cache()
+    lock_key, error_key = f"{LOCK_PREFIX}:lock:{key}", f"{LOCK_PREFIX}:error:{key}"
+
+    token = uuid.uuid4().hex
+    if _acquire(cache, lock_key, token):
+        return _lead(cache, lock_key, error_key, token, compute), True
+
+    deadline = time.monotonic() + _timeout()
+    interval = 0.05
+    acquired = False
+    with instrumentation.phase('wait'):
+        # Ошибку принимаем только от того ведущего, которого застали
+        leader_token = _owner(cache, lock_key)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(interval)
+            interval = min(interval * 1.5, 0.5)
+
+            result = read()
+            if result is not None:
+                return result, False
+
+            error = cache.get(error_key)
+            if error is not None and error['token'] == leader_token:
+                if error['type'] == 'ValueError':
+                    raise ValueError(error['message'])
+                raise FlightError(f"{error['type']}: {error['message']}")
+
+            # Ведущий завершился без результата или его блокировка истекла - ведем сами
+            acquired = _owner(cache, lock_key) is None and _acquire(cache, lock_key, token)
+
+    if not acquired:
+        logger.warning("Timed out waiting for %s, computing it again", key)
+        return compute(), True
+
+    # Результат могли сохранить между последней проверкой и захватом блокировки
+    result = read()
+    if result is not None:
+        _release(cache, lock_key, token)
+        return result, False
+    return _lead(cache, lock_key, error_key, token, compute), True
@@ -0,0 +1,59 @@
+import json
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def client_side_cursors():
+    """Читает запросы .iterator() обычным курсором
+
+    Запросы через серверный курсор не попадают в журнал и не сообщают rowcount.
+    """
+    disabled = connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False)
+    connection.settings_dict['DISABLE_SERVER_SIDE_CURSORS'] = True
+    try:
+        yield
+    finally:
+        connection.settings_dict['DISABLE_SERVER_SIDE_CURSORS'] = disabled
+
+
+def capture_queries(func, *args, **kwargs):
+    """Выполняет func и возвращает (результат, SQL всех выполненных запросов)"""
+    with client_side_cursors(), CaptureQueriesContext(connection) as context:
+        result = func(*args, **kwargs)
+    return result, [query['sql'] for query in context.captured_queries]
+
+
+def is_select(sql):
+    return sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+def explain(sql, analyze=False):
+    """План запроса PostgreSQL в виде словаря (EXPLAIN FORMAT JSON)"""
+    if connection.vendor != 'postgresql':
+        raise ValueError('EXPLAIN inspection requires PostgreSQL')
+
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN ({options}) {sql}')
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def plan_nodes(plan):
+    """Все узлы плана, включая вложенные"""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def seq_scans(plan):
+    """Таблицы, которые план читает последовательным сканированием"""
+    return sorted({
+        node['Relation Name']
+        for node in plan_nodes(plan)
+        if node['Node Type'] == 'Seq Scan'
+    })
@@ -0,0 +1,251 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+import django
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from reports.models import InsuranceClaim, InsuranceProduct, PaymentFlow
+
+# Шоковые множители частоты убытков по сценариям
+SCENARIOS = {
+    'base': 1.0,
+    'low': 1.2,
+    'medium': 1.5,
+    'high': 2.0,
+    'extreme': 3.0,
+}
+QUANTILES = (0.9, 0.95, 0.99, 0.995)
+CLAIM_STATUSES = ['open', 'processing', 'paid']
+HISTOGRAM_BINS = 50
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def fit_parameters(start_date, end_date, product_id=None):
+    """Годовая частота (Пуассон) и логнормальная тяжесть убытков по продуктам"""
+    start_date = _parse_date(start_date)
+    end_date = _parse_date(end_date)
+    years = max((end_date - start_date).days + 1, 1) / 365.25
+
+    claims = InsuranceClaim.objects.filter(
+        event_date__range=(start_date, end_date),
+        status__in=CLAIM_STATUSES
+    )
+    if product_id:
+        claims = claims.filter(policy__product_id=product_id)
+
+    rows = list(claims.values_list(
+        'policy__product_id',
+        Coalesce('paid_amount', 'estimated_amount')
+    ))
+    if not rows:
+        return None
+
+    product_ids, amounts = zip(*rows)
+    amounts = np.array(amounts, dtype=float)
+    products, product_idx = np.unique(np.array(product_ids, dtype=np.int64), return_inverse=True)
+    positive = amounts > 0
+    log_amounts = np.log(amounts[positive])
+    positive_idx = product_idx[positive]
+
+    counts = np.bincount(product_idx, minlength=len(products))
+    log_counts = np.bincount(positive_idx, minlength=len(products))
+    log_sum = np.bincount(positive_idx, weights=log_amounts, minlength=len(products))
+    log_sq_sum = np.bincount(positive_idx, weights=log_amounts ** 2, minlength=len(products))
+
+    mu = np.divide(log_sum, log_counts, out=np.zeros(len(products)), where=log_counts > 0)
+    variance = np.divide(log_sq_sum, log_counts, out=np.zeros(len(products)), where=log_counts > 0) - mu ** 2
+
+    names = dict(InsuranceProduct.objects.filter(id__in=products.tolist()).values_list('id', 'name'))
+    return {
+        'product_ids': products,
+        'product_names': [names.get(int(product_id), '') for product_id in products],
+        'frequency': counts / years,
+        'mu': mu,
+        'sigma': np.sqrt(np.clip(variance, 0, None)),
+        'claim_count': counts,
+        'years': years,
+    }
+
+
+def simulate_chunk(seed, size, frequency, mu, sigma):
+    """Годовые убытки для size сценариев: (итог по сценариям, сумма по продуктам)"""
+    rng = np.random.default_rng(seed)
+    n_products = len(frequency)
+
+    counts = rng.poisson(frequency, size=(size, n_products)).ravel()
+    cells = np.repeat(np.arange(size * n_products), counts)
+    product_idx = cells % n_products
+    severities = np.exp(mu[product_idx] + sigma[product_idx] * rng.standard_normal(len(cells)))
+
+    losses = np.bincount(cells, weights=severities, minlength=size * n_products).reshape(size, n_products)
+    return losses.sum(axis=1), losses.sum(axis=0)
+
+
+def _chunk_size(frequency):
+    # Ограничиваем число случайных величин тяжести в одной пачке
+    chunk_size = getattr(settings, 'STRESS_CHUNK_SIZE', 10000)
+    max_draws = getattr(settings, 'STRESS_MAX_DRAWS_PER_CHUNK', 5000000)
+    expected_claims = max(float(frequency.sum()), 1.0)
+    return max(1, min(chunk_size, int(max_draws / expected_claims)))
+
+
+def _workers():
+    workers = getattr(settings, 'STRESS_WORKERS', 1) or 1
+    # Демонические процессы (воркеры Celery) не могут порождать дочерние
+    if multiprocessing.current_process().daemon:
+        return 1
+    return workers
+
+
+def _process_pool(workers):
+    """Пул процессов, общий для всех расчетов процесса: создается один раз, а не на запрос.
+
+    Процессы запускаются через spawn, а не fork: процесс gunicorn многопоточный
+    (потоки шардов, продление блокировок single_flight), копировать его нельзя.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+        return _pool
+
+
+def _map_chunks(workers, args):
+    global _pool
+    try:
+        return list(_process_pool(workers).map(simulate_chunk, *zip(*args)))
+    except BrokenProcessPool:
+        # Процесс пула упал (например, по памяти) - пул пересоздастся при следующем расчете
+        logger.warning("Stress simulation pool is broken, simulating in-process")
+        with _pool_lock:
+            _pool = None
+        return [simulate_chunk(*chunk_args) for chunk_args in args]
+
+
+def simulate(frequency, mu, sigma, simulations, seed):
+    """Запускает simulations сценариев пачками; результат не зависит от числа процессов"""
+    chunk_size = _chunk_size(frequency)
+    sizes = [chunk_size] * (simulations // chunk_size)
+    if simulations % chunk_size:
+        sizes.append(simulations % chunk_size)
+    # У каждой пачки свой поток случайных чисел, производный от seed
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    workers = min(_workers(), len(sizes))
+    args = [(chunk_seed, size, frequency, mu, sigma) for chunk_seed, size in zip(seeds, sizes)]
+    if workers > 1:
+        results = _map_chunks(workers, args)
+    else:
+        results = [simulate_chunk(*chunk_args) for chunk_args in args]
+
+    totals = np.concatenate([result[0] for result in results])
+    by_product = np.sum([result[1] for result in results], axis=0) / simulations
+    return totals, by_product
+
+
+def risk_measures(losses):
+    """VaR (квантиль) и TVaR (среднее хвоста за квантилем)"""
+    ordered = np.sort(losses)
+    measures = []
+    for level in QUANTILES:
+        var = float(np.quantile(ordered, level))
+        tail = ordered[np.searchsorted(ordered, var):]
+        measures.append({
+            'level': level,
+            'var': var,
+            'tvar': float(tail.mean()) if len(tail) else var,
+        })
+    return measures
+
+
+def histogram(losses, bins=HISTOGRAM_BINS):
+    counts, edges = np.histogram(losses, bins=bins)
+    return [
+        {'from': float(edges[i]), 'to': float(edges[i + 1]), 'count': int(counts[i])}
+        for i in range(len(counts))
+    ]
+
+
+def annual_premium(start_date, end_date, years, product_id=None):
+    premiums = PaymentFlow.objects.filter(
+        payment_type='premium',
+        date__range=(start_date, end_date)
+    )
+    if product_id:
+        premiums = premiums.filter(product_id=product_id)
+    total = premiums.aggregate(total=Sum('actual_amount'))['total'] or 0
+    return float(total) / years
+
+
+def run(start_date, end_date, product_id=None, scenario='base', simulations=None, seed=None):
+    """Стресс-тест Монте-Карло: распределение годовых убытков по истории убытков за период"""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Invalid scenario: {scenario}. Supported scenarios: {', '.join(SCENARIOS)}")
+
+    max_simulations = getattr(settings, 'STRESS_MAX_SIMULATIONS', 1000000)
+    simulations = int(simulations or getattr(settings, 'STRESS_SIMULATIONS', 100000))
+    if not 0 < simulations <= max_simulations:
+        raise ValueError(f"simulations must be between 1 and {max_simulations}")
+    seed = int(seed if seed is not None else getattr(settings, 'STRESS_DEFAULT_SEED', 0))
+
+    parameters = fit_parameters(start_date, end_date, product_id)
+    if parameters is None:
+        return {
+            'scenario': scenario,
+            'simulations': 0,
+            'message': 'No claims history available'
+        }
+
+    frequency = parameters['frequency'] * SCENARIOS[scenario]
+    losses, by_product = simulate(frequency, parameters['mu'], parameters['sigma'], simulations, seed)
+    measures = risk_measures(losses)
+    premium = annual_premium(start_date, end_date, parameters['years'], product_id)
+    expected = float(losses.mean())
+
+    return {
+        'scenario': scenario,
+        'frequency_shock': SCENARIOS[scenario],
+        'simulations': simulations,
+        'seed': seed,
+        'annual_premium': premium,
+        'expected_loss': expected,
+        'std_loss': float(losses.std()),
+        'max_loss': float(losses.max()),
+        'risk_measures': measures,
+        # Капитал под экстремальный год сверх ожидаемого убытка (VaR 99.5%)
+        'capital_requirement': measures[-1]['var'] - expected,
+        'distribution': histogram(losses),
+        'products': [
+            {
+                'product_id': int(parameters['product_ids'][i]),
+                'product_name': parameters['product_names'][i],
+                'claim_count': int(parameters['claim_count'][i]),
+                'annual_frequency': float(frequency[i]),
+                'severity_mu': float(parameters['mu'][i]),
+                'severity_sigma': float(parameters['sigma'][i]),
+                'expected_loss': float(by_product[i]),
+            }
+            for i in range(len(frequency))
+        ],
+    }
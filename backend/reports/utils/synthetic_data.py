@@ -0,0 +1,357 @@
+import io
+import json
+from contextlib import contextmanager
+from datetime import datetime, time
+from dateutil.relativedelta import relativedelta
+import numpy as np
+import pandas as pd
+from django.db import connection, models
+from django.utils import timezone
+from reports.models import (
+    ClosedPeriod,
+    DailyPaymentRollup,
+    InsuranceClaim,
+    InsuranceProduct,
+    PaymentFlow,
+    PaymentForecast,
+    PaymentIngestKey,
+    PeriodSnapshot,
+    Policy,
+    Region,
+    ReserveCalculation
+)
+
+# Синтетические данные для разработки и бенчмарков.
+# Генерация векторная (NumPy), загрузка - COPY в PostgreSQL или bulk_create на других СУБД.
+
+PRODUCT_TYPES = [
+    ('Auto Insurance', 500, 1.2),
+    ('Home Insurance', 800, 0.9),
+    ('Health Insurance', 1200, 1.5),
+    ('Life Insurance', 2000, 0.7),
+    ('Travel Insurance', 300, 1.1)
+]
+REGION_COUNT = 5
+CLAIM_STATUSES = np.array(['open', 'processing', 'paid', 'rejected'])
+CLAIM_STATUS_WEIGHTS = [0.2, 0.3, 0.4, 0.1]
+STRESS_SCENARIOS = np.array(['low', 'medium', 'high', 'extreme'])
+# Средний убыток при risk_factor = 1
+CLAIM_SEVERITY = 1500
+MAX_AMOUNT = 9999999999.99
+
+# Полисы обрабатываются пачками фиксированного размера. У каждой пачки свой поток
+# случайных чисел (SeedSequence от seed, стадии и номера пачки), поэтому данные
+# зависят только от seed и параметров генерации
+POLICY_CHUNK = 20000
+STAGE_REFERENCE, STAGE_POLICIES, STAGE_FLOWS, STAGE_RESERVES = range(4)
+RESET_MODELS = [
+    ClosedPeriod, PeriodSnapshot, PaymentIngestKey, PaymentForecast, DailyPaymentRollup, ReserveCalculation, InsuranceClaim,
+    PaymentFlow, Policy, InsuranceProduct, Region
+]
+
+
+def _rng(seed, *key):
+    return np.random.default_rng([seed, *key])
+
+
+def _money(values):
+    return np.round(np.clip(values, 0, MAX_AMOUNT), 2)
+
+
+def _days(values):
+    return np.asarray(values, dtype='datetime64[D]')
+
+
+def check_constraints_immediately():
+    # Иначе проверки внешних ключей копятся в очереди до COMMIT
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def clean():
+    """Удаляет данные отчетов без построчных сигналов; в PostgreSQL - TRUNCATE со сбросом id"""
+    if connection.vendor == 'postgresql':
+        tables = ', '.join(model._meta.db_table for model in RESET_MODELS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {tables} RESTART IDENTITY CASCADE')
+    else:
+        for model in RESET_MODELS:
+            model.objects.all()._raw_delete(connection.alias)
+
+
+@contextmanager
+def deferred_indexes(*index_models):
+    """Снимает индексы из Meta.indexes на время загрузки и строит их заново после
+
+    Построение индекса по готовой таблице быстрее, чем его обновление на каждую строку.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.schema_editor() as editor:
+        for model in index_models:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+    yield
+    with connection.schema_editor() as editor:
+        for model in index_models:
+            for index in model._meta.indexes:
+                editor.add_index(model, index)
+
+
+def load(model, frame):
+    """Загружает DataFrame (колонки - имена полей модели), JSON-поля передаются строками"""
+    if frame.empty:
+        return 0
+    if connection.vendor == 'postgresql':
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        columns = ', '.join(model._meta.get_field(name).column for name in frame.columns)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {model._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+    else:
+        frame = frame.astype(object).where(frame.notna(), None)
+        for name in frame.columns:
+            if isinstance(model._meta.get_field(name), models.JSONField):
+                frame[name] = frame[name].map(json.loads)
+        model.objects.bulk_create(
+            [model(**row) for row in frame.to_dict('records')],
+            batch_size=5000
+        )
+    return len(frame)
+
+
+def create_reference_data(seed):
+    """Регионы и продукты; возвращает массивы id и коэффициентов для векторной генерации"""
+    rng = _rng(seed, STAGE_REFERENCE)
+    regions = Region.objects.bulk_create([
+        Region(
+            name=f"Region {i}",
+            code=f"REG{i:03d}",
+            economic_factor=round(float(factor), 2)
+        )
+        for i, factor in enumerate(rng.uniform(0.8, 1.2, REGION_COUNT), 1)
+    ])
+    products = InsuranceProduct.objects.bulk_create([
+        InsuranceProduct(
+            name=name,
+            description=f"Comprehensive {name} coverage",
+            base_premium=base_premium,
+            risk_factor=risk_factor
+        )
+        for name, base_premium, risk_factor in PRODUCT_TYPES
+    ])
+    # bulk_create возвращает id не на всех СУБД
+    region_ids = dict(Region.objects.values_list('code', 'id'))
+    product_ids = dict(InsuranceProduct.objects.values_list('name', 'id'))
+    return {
+        'region_ids': np.array([region_ids[region.code] for region in regions]),
+        'economic_factors': np.array([region.economic_factor for region in regions]),
+        'product_ids': np.array([product_ids[product.name] for product in products]),
+        'base_premiums': np.array([float(product.base_premium) for product in products]),
+        'risk_factors': np.array([product.risk_factor for product in products]),
+    }
+
+
+def generate_policies(rng, first_number, size, window_start, as_of, reference):
+    """Полисы пачки: продукт, регион, дата начала в окне истории, премия"""
+    product_idx = rng.integers(0, len(reference['product_ids']), size)
+    region_idx = rng.integers(0, len(reference['region_ids']), size)
+    window = int((_days(as_of) - _days(window_start)).astype(np.int64)) + 1
+    start = _days(window_start) + rng.integers(0, window, size)
+    end = start + 365
+    premium = _money(
+        reference['base_premiums'][product_idx]
+        * reference['economic_factors'][region_idx]
+        * rng.uniform(0.9, 1.1, size)
+    )
+    numbers = np.arange(first_number, first_number + size)
+    ages = rng.integers(18, 71, size)
+
+    frame = pd.DataFrame({
+        'product_id': reference['product_ids'][product_idx],
+        'region_id': reference['region_ids'][region_idx],
+        'policy_number': [f"POL-{number:09d}" for number in numbers],
+        'start_date': start,
+        'end_date': end,
+        'premium': premium,
+        'status': np.where(end > _days(as_of), 'active', 'expired'),
+        'client_data': [
+            f'{{"name": "Client {number}", "email": "client{number}@example.com", "age": {age}}}'
+            for number, age in zip(numbers, ages)
+        ],
+    })
+    return frame
+
+
+def _monthly_dates(start, months):
+    """Даты start + months месяцев; день месяца ограничен 28-м"""
+    start_month = start.astype('datetime64[M]')
+    day = np.minimum((start - start_month.astype('datetime64[D]')).astype(np.int64), 27)
+    return (start_month + months).astype('datetime64[D]') + day
+
+
+def generate_flows(rng, policies, as_of, claims_rate, reference, first_claim):
+    """Премии, комиссии, убытки и выплаты по ним для пачки полисов"""
+    as_of = _days(as_of)
+    size = len(policies)
+    start = policies['start_date'].to_numpy().astype('datetime64[D]')
+    premium = policies['premium'].to_numpy()
+    policy_ids = policies['id'].to_numpy()
+    product_ids = policies['product_id'].to_numpy()
+    region_ids = policies['region_id'].to_numpy()
+
+    # Ежемесячные премии от начала полиса до даты as_of (с пролонгацией)
+    elapsed = (as_of.astype('datetime64[M]') - start.astype('datetime64[M]')).astype(np.int64)
+    counts = elapsed + (_monthly_dates(start, elapsed) <= as_of)
+    owner = np.repeat(np.arange(size), counts)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    expected = _money(premium[owner] / 12)
+    premiums = pd.DataFrame({
+        'policy_idx': owner,
+        'payment_type': 'premium',
+        'date': _monthly_dates(start[owner], offsets),
+        'expected_amount': expected,
+        'actual_amount': _money(expected * rng.uniform(0.95, 1.05, len(owner))),
+        'is_recurring': True,
+        'forecast_accuracy': rng.uniform(80, 120, len(owner)),
+    })
+
+    # Разовые комиссии примерно у трети полисов
+    owner = np.flatnonzero(rng.random(size) > 0.7)
+    commission_date = start[owner] + rng.integers(30, 181, len(owner))
+    owner, commission_date = owner[commission_date <= as_of], commission_date[commission_date <= as_of]
+    expected = _money(premium[owner] * 0.1)
+    commissions = pd.DataFrame({
+        'policy_idx': owner,
+        'payment_type': 'commission',
+        'date': commission_date,
+        'expected_amount': expected,
+        'actual_amount': _money(expected * rng.uniform(0.9, 1.1, len(owner))),
+        'is_recurring': False,
+        'forecast_accuracy': np.nan,
+    })
+
+    # Убытки: пуассоновское число на полис пропорционально сроку страхования
+    claim_counts = rng.poisson(claims_rate * counts / 12)
+    owner = np.repeat(np.arange(size), claim_counts)
+    n_claims = len(owner)
+    exposure_days = (as_of - start[owner]).astype(np.int64)
+    event_date = start[owner] + (rng.random(n_claims) * exposure_days).astype(np.int64)
+    report_date = np.minimum(event_date + rng.integers(1, 31, n_claims), as_of)
+    status = CLAIM_STATUSES[rng.choice(len(CLAIM_STATUSES), n_claims, p=CLAIM_STATUS_WEIGHTS)]
+    is_paid = status == 'paid'
+    is_open = np.isin(status, ['open', 'processing'])
+
+    risk = pd.Series(reference['risk_factors'], index=reference['product_ids']).reindex(product_ids[owner]).to_numpy()
+    estimated = _money(rng.lognormal(np.log(CLAIM_SEVERITY * risk + 1), 0.9, n_claims) + 100)
+    paid_amount = np.where(is_paid, _money(estimated * rng.uniform(0.7, 1.3, n_claims)), np.nan)
+    reserve = np.where(is_open, _money(estimated * rng.uniform(0.8, 1.5, n_claims)), 0.0)
+    paid_date = np.minimum(report_date + rng.integers(1, 31, n_claims), as_of)
+    numbers = np.arange(first_claim, first_claim + n_claims)
+
+    claims = pd.DataFrame({
+        'policy_id': policy_ids[owner],
+        'claim_number': [f"CL-{number:010d}" for number in numbers],
+        'event_date': event_date,
+        'report_date': report_date,
+        'status': status,
+        'estimated_amount': estimated,
+        'paid_amount': paid_amount,
+        'paid_date': np.where(is_paid, paid_date, np.datetime64('NaT')),
+        'description': [f"Claim {number}" for number in numbers],
+        'reserve': reserve,
+        'is_catastrophic': rng.random(n_claims) > 0.95,
+        'metadata': '{}',
+    })
+
+    claim_payments = pd.DataFrame({
+        'policy_idx': owner[is_paid],
+        'payment_type': 'claim',
+        'date': paid_date[is_paid],
+        'expected_amount': estimated[is_paid],
+        'actual_amount': paid_amount[is_paid],
+        'is_recurring': False,
+        'forecast_accuracy': rng.uniform(70, 130, int(is_paid.sum())),
+    })
+
+    # Порядок по дате: строки одного месяца лежат рядом, что полезно BRIN-индексу
+    flows = pd.concat([premiums, commissions, claim_payments], ignore_index=True)
+    flows = flows.sort_values('date', kind='stable', ignore_index=True)
+    owner = flows.pop('policy_idx').to_numpy()
+    flows.insert(0, 'policy_id', policy_ids[owner])
+    flows.insert(1, 'product_id', product_ids[owner])
+    flows.insert(2, 'region_id', region_ids[owner])
+    flows['metadata'] = '{}'
+    return flows, claims
+
+
+def generate_reserves(seed, as_of, years, reference):
+    """Ежеквартальные расчеты резервов по каждому продукту"""
+    rng = _rng(seed, STAGE_RESERVES)
+    quarters = years * 4
+    size = quarters * len(reference['product_ids'])
+    total = rng.integers(10000, 100001, size).astype(float)
+    return pd.DataFrame({
+        'product_id': np.repeat(reference['product_ids'], quarters),
+        'calculation_date': [
+            as_of - relativedelta(months=3 * quarter)
+            for _ in reference['product_ids']
+            for quarter in range(quarters)
+        ],
+        'total_reserves': total,
+        'required_reserves': _money(total * rng.uniform(0.7, 1.3, size)),
+        'available_reserves': _money(total * rng.uniform(0.8, 1.5, size)),
+        'stress_scenario': STRESS_SCENARIOS[rng.integers(0, len(STRESS_SCENARIOS), size)],
+        'metadata': '{}',
+    })
+
+
+def _created_at(as_of):
+    # Фиксированная метка времени: повторный запуск дает те же строки
+    return timezone.make_aware(datetime.combine(as_of, time())).isoformat()
+
+
+def generate(policies, years, claims_rate, seed, as_of, progress=None):
+    """Создает полный набор данных; возвращает число созданных строк по моделям"""
+    window_start = as_of - relativedelta(years=years)
+    created_at = _created_at(as_of)
+    reference = create_reference_data(seed)
+    counts = {'policies': 0, 'claims': 0, 'payment_flows': 0, 'reserves': 0}
+
+    for chunk, first in enumerate(range(0, policies, POLICY_CHUNK)):
+        size = min(POLICY_CHUNK, policies - first)
+        frame = generate_policies(_rng(seed, STAGE_POLICIES, chunk), first + 1, size, window_start, as_of, reference)
+        counts['policies'] += load(Policy, frame.assign(created_at=created_at))
+
+        numbers = frame['policy_number']
+        frame['id'] = list(Policy.objects.filter(
+            policy_number__gte=numbers.iloc[0],
+            policy_number__lte=numbers.iloc[-1]
+        ).order_by('policy_number').values_list('id', flat=True))
+
+        flows, claims = generate_flows(
+            _rng(seed, STAGE_FLOWS, chunk), frame, as_of, claims_rate, reference, counts['claims'] + 1
+        )
+        counts['claims'] += load(InsuranceClaim, claims.assign(created_at=created_at))
+        counts['payment_flows'] += load(PaymentFlow, flows.assign(created_at=created_at))
+        if progress:
+            progress(counts)
+
+    reserves = generate_reserves(seed, as_of, years, reference)
+    counts['reserves'] = load(ReserveCalculation, reserves.assign(created_at=created_at))
+    return counts
+
+
+def analyze():
+    """Обновляет статистику планировщика после массовой загрузки"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for model in RESET_MODELS:
+            cursor.execute(f'ANALYZE {model._meta.db_table}')
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField
+from django.utils import timezone
+from reports.models import ReportRequestStat
+from reports.utils import report_cache
+from reports.utils.report_generators import get_generator_class
+
+# Прогрев кеша отчетов: ReportAPI учитывает каждый запрос отчета целиком (частота и время
+# расчета при промахе) счетчиками в кеше отчетов, задача flush_report_requests переносит
+# их в ReportRequestStat. Задача warm_report_cache после ночных загрузок заранее считает
+# самые ценные наборы параметров - частота × средняя стоимость расчета - в пределах
+# бюджета времени и CPU. Попадания в прогретые результаты считает report_cache (warm_hits).
+
+logger = logging.getLogger(__name__)
+
+LAST_RUN_KEY = 'reports:warming:last_run'
+PENDING_PREFIX = 'reports:warming:pending'
+
+
+def is_enabled():
+    return getattr(settings, 'REPORT_WARMING_ENABLED', True)
+
+
+def stat_params(report_type, params):
+    """Параметры в том виде, в каком по ним строится ключ кеша (без типа отчета)"""
+    normalized = report_cache.normalize_params(report_type, params)
+    normalized.pop('type')
+    return normalized
+
+
+def _params_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def _upsert(report_type, params, requests, computes, compute_ms, **fields):
+    stats = ReportRequestStat.objects.filter(report_type=report_type, params_key=_params_key(params))
+    updates = {
+        'requests': F('requests') + requests,
+        'computes': F('computes') + computes,
+        'compute_ms': F('compute_ms') + compute_ms,
+        **fields
+    }
+    if stats.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            ReportRequestStat.objects.create(
+                report_type=report_type,
+                params_key=_params_key(params),
+                params=params,
+                requests=requests,
+                computes=computes,
+                compute_ms=compute_ms,
+                **fields
+            )
+    except IntegrityError:
+        # Ту же строку только что создал параллельный запрос
+        stats.update(**updates)
+
+
+def _pending_key(*parts):
+    return ':'.join((PENDING_PREFIX, *map(str, parts)))
+
+
+def _add(cache, key, delta):
+    # add() перед incr(): первый запрос набора не теряется в гонке за создание счетчика
+    cache.add(key, 0, timeout=None)
+    cache.incr(key, delta)
+
+
+def record_request(report_type, params, cached, compute_ms):
+    """Учитывает запрос отчета счетчиками в кеше, без записи в БД на каждый запрос;
+    в ReportRequestStat их переносит flush_requests(). Ошибка учета не мешает ответу"""
+    if not is_enabled():
+        return
+    params = stat_params(report_type, params)
+    entry = f'{report_type}:{_params_key(params)}'
+    cache = report_cache.get_cache()
+    try:
+        # Новый набор получает номер: flush_requests() читает наборы по номерам
+        if cache.add(_pending_key('entry', entry), {'report_type': report_type, 'params': params}, timeout=None):
+            cache.add(_pending_key('seq'), 0, timeout=None)
+            cache.set(_pending_key('index', cache.incr(_pending_key('seq'))), entry, timeout=None)
+        _add(cache, _pending_key('requests', entry), 1)
+        if not cached:
+            _add(cache, _pending_key('computes', entry), 1)
+            _add(cache, _pending_key('compute_ms', entry), int(round(compute_ms)))
+    except Exception:
+        logger.exception("Failed to record %s report request", report_type)
+
+
+def flush_requests():
+    """Переносит накопленные счетчики запросов в ReportRequestStat, возвращает число наборов"""
+    cache = report_cache.get_cache()
+    flushed = cache.get(_pending_key('flushed'), 0)
+    seq = cache.get(_pending_key('seq'), 0)
+    if seq <= flushed:
+        return 0
+
+    index_keys = [_pending_key('index', number) for number in range(flushed + 1, seq + 1)]
+    entries = list(dict.fromkeys(cache.get_many(index_keys).values()))
+    meta = cache.get_many([_pending_key('entry', entry) for entry in entries])
+    # Набор снимается с учета до чтения счетчиков: следующий запрос заведет его заново
+    cache.delete_many(list(meta))
+
+    names = ('requests', 'computes', 'compute_ms')
+    counters = cache.get_many([_pending_key(name, entry) for entry in entries for name in names])
+    now = timezone.now()
+    saved = 0
+    for entry in entries:
+        info = meta.get(_pending_key('entry', entry))
+        values = {name: counters.get(_pending_key(name, entry), 0) for name in names}
+        if info is None or not values['requests']:
+            continue
+        try:
+            _upsert(info['report_type'], info['params'], last_requested_at=now, **values)
+        except DatabaseError:
+            logger.exception("Failed to save %s report requests", info['report_type'])
+            continue
+        # Вычитаем перенесенное: запросы, пришедшие во время переноса, останутся в счетчиках
+        for name, value in values.items():
+            if value:
+                cache.decr(_pending_key(name, entry), value)
+        saved += 1
+
+    cache.delete_many(index_keys)
+    cache.set(_pending_key('flushed'), seq, timeout=None)
+    return saved
+
+
+def candidates(limit=None):
+    """Наборы параметров за REPORT_WARMING_LOOKBACK, упорядоченные по частоте × средней стоимости"""
+    since = timezone.now() - getattr(settings, 'REPORT_WARMING_LOOKBACK', timedelta(days=7))
+    return list(ReportRequestStat.objects.filter(
+        last_requested_at__gte=since,
+        computes__gt=0
+    ).annotate(
+        score=ExpressionWrapper(F('requests') * F('compute_ms') / F('computes'), output_field=FloatField())
+    ).order_by('-score')[:limit or getattr(settings, 'REPORT_WARMING_TOP_N', 20)])
+
+
+def warm(limit=None, time_budget=None, cpu_budget=None):
+    """Считает отчеты из candidates() и кладет их в кеш с пометкой прогрева.
+
+    Бюджеты проверяются перед каждым отчетом, начатый расчет не прерывается.
+    CPU - время процесса воркера, работа самой БД в него не входит.
+    """
+    time_budget = time_budget or getattr(settings, 'REPORT_WARMING_TIME_BUDGET', 600)
+    cpu_budget = cpu_budget or getattr(settings, 'REPORT_WARMING_CPU_BUDGET', 300)
+    started, cpu_started = time.monotonic(), time.process_time()
+    summary = {
+        'started_at': timezone.now().isoformat(),
+        'candidates': 0,
+        'warmed': 0,
+        'fresh': 0,
+        'failed': 0,
+        'skipped': 0,
+        'budget_exhausted': None,
+    }
+    if not is_enabled() or not report_cache.is_enabled():
+        return summary
+
+    stats = candidates(limit)
+    summary['candidates'] = len(stats)
+    for index, stat in enumerate(stats):
+        if time.monotonic() - started >= time_budget:
+            summary['budget_exhausted'] = 'time'
+        elif time.process_time() - cpu_started >= cpu_budget:
+            summary['budget_exhausted'] = 'cpu'
+        if summary['budget_exhausted']:
+            summary['skipped'] = len(stats) - index
+            break
+
+        # Ключ - на текущих версиях данных: после ночной загрузки старые результаты уже не найдутся
+        key = report_cache.result_key(stat.report_type, stat.params)
+        if report_cache.get_cache().get(key) is not None:
+            summary['fresh'] += 1
+            continue
+
+        generator_class = get_generator_class(stat.report_type)
+        compute_started = time.perf_counter()
+        try:
+            data = generator_class(stat.params).run(stat.params.get('layout') or 'rows')
+        except Exception:
+            logger.exception("Failed to warm %s report %s", stat.report_type, stat.params)
+            summary['failed'] += 1
+            continue
+        compute_ms = (time.perf_counter() - compute_started) * 1000
+
+        report_cache.store(key, data, warmed=True)
+        _upsert(stat.report_type, stat.params, requests=0, computes=1, compute_ms=compute_ms, last_warmed_at=timezone.now())
+        summary['warmed'] += 1
+
+    summary['elapsed_s'] = round(time.monotonic() - started, 1)
+    summary['cpu_s'] = round(time.process_time() - cpu_started, 1)
+    report_cache.get_cache().set(LAST_RUN_KEY, summary, timeout=None)
+    return summary
+
+
+def decay():
+    """Делит счетчики запросов пополам и удаляет наборы, которые давно не запрашивали:
+    частота учитывается с затуханием, и новые популярные отчеты вытесняют старые"""
+    since = timezone.now() - getattr(settings, 'REPORT_WARMING_LOOKBACK', timedelta(days=7))
+    deleted, _ = ReportRequestStat.objects.filter(last_requested_at__lt=since).delete()
+    ReportRequestStat.objects.update(requests=F('requests') / 2)
+    return deleted
+
+
+def last_run():
+    return report_cache.get_cache().get(LAST_RUN_KEY)
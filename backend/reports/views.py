@@ -1,43 +1,48 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse, JsonResponse
+from rest_framework.permissions import BasePermission, DjangoModelPermissions, IsAuthenticated
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse
 from reports.models import *
 from reports.serializers import *
 from reports.utils.report_generators import *
+from reports.utils import broker, columnar, dashboard, export_jobs, exporters, instrumentation, pagination, payment_ingest, report_batch, report_cache, sharding, warming
+from reports.tasks import run_export_job, send_export_email
+from reports.middleware import REPORT_TYPES
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+import os
+import itertools
+import time
 import json
-from django.db.models import Case, When, FloatField, Sum
+import logging
 from io import BytesIO
-import pandas as pd
-# import xlsxwriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
 from rest_framework.generics import ListAPIView
 from .models import InsuranceProduct
 from .serializers import InsuranceProductSerializer
 
+logger = logging.getLogger(__name__)
+
 
 class ProductListAPI(ListAPIView):
     queryset = InsuranceProduct.objects.all().order_by('id')
     serializer_class = InsuranceProductSerializer
     permission_classes = [IsAuthenticated]
 
+# Параметры отчетов из строки запроса; одинаковый набор дает одинаковые ключи кеша
+REPORT_PARAMS = (
+    'start_date', 'end_date', 'product_id', 'region_id', 'payment_type',
+    'period', 'scenario', 'simulations', 'seed'
+)
+
 class ReportAPI(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         try:
             report_type = request.GET.get('type', 'cashflow')
-            params = {
-                'start_date': request.GET.get('start_date'),
-                'end_date': request.GET.get('end_date'),
-                'product_id': request.GET.get('product_id'),
-                'region_id': request.GET.get('region_id'),
-                'payment_type': request.GET.get('payment_type')
-            }
+            params = {key: request.GET.get(key) for key in REPORT_PARAMS}
             
             # Валидация дат
             if not params['start_date'] or not params['end_date']:
@@ -54,13 +59,46 @@ class ReportAPI(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+            # Формат ответа входит в ключ кеша; для строк ключ прежний
+            layout = columnar.parse_layout(request.GET.get('layout'))
+            params['layout'] = layout if layout != 'rows' else None
+
             generator = generator_class(params)
-            data = generator.generate()
-            
-            return Response({
-                'status': 'success',
-                'data': data
-            })
+            if self.is_paginated(request):
+                # Постраничный режим: курсор, размер страницы и total входят в ключ кеша
+                cursor = request.GET.get('cursor')
+                page_size = pagination.parse_page_size(request.GET.get('page_size'))
+                with_total = self.include_total(request)
+                page, source = report_cache.get_or_compute(
+                    report_type,
+                    {**params, 'cursor': cursor, 'page_size': page_size, 'include_total': with_total or None},
+                    lambda: generator.run_page(report_type, cursor, page_size, with_total, layout)
+                )
+                response = Response({'status': 'success', 'layout': layout, **page})
+            else:
+                # Длинный период считается шардами; сводка по ним отдается, только если отчет считался сейчас
+                bounds = sharding.plan(report_type, params, sharding.parse_shards(request.GET.get('shards')))
+                sharded = {}
+
+                def compute():
+                    if not bounds:
+                        return generator.run(layout)
+                    data, sharded['summary'] = sharding.run(report_type, params, bounds, layout)
+                    return data
+
+                started = time.perf_counter()
+                data, source = report_cache.get_or_compute(report_type, params, compute)
+                warming.record_request(report_type, params, source != 'miss', (time.perf_counter() - started) * 1000)
+                payload = {
+                    'status': 'success',
+                    'layout': layout,
+                    'data': data
+                }
+                if sharded:
+                    payload['shards'] = sharded['summary']
+                response = Response(payload)
+            response['X-Report-Cache'] = source
+            return response
             
         except ValueError as e:
             return Response(
@@ -68,31 +106,25 @@ class ReportAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         except Exception as e:
-            print(f"API Error: {str(e)}")
+            logger.exception("Report %s failed", report_type)
             return Response(
                 {'error': 'Internal server error'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
     def get_generator_class(self, report_type):
-        generators = {
-            'cashflow': CashFlowReportGenerator,
-            'reserves': ReserveReportGenerator,
-            'loss_ratio': LossRatioReportGenerator,
-            'forecast': PaymentForecastGenerator
-        }
-        return generators.get(report_type)
+        return get_generator_class(report_type)
+
+    def is_paginated(self, request):
+        """Постраничный ответ - только по явному запросу, без параметров отчет отдается целиком"""
+        return 'cursor' in request.GET or 'page_size' in request.GET
+
+    def include_total(self, request):
+        return request.GET.get('include_total', '').lower() in ('1', 'true', 'yes')
     
     def get_report_generator(self, report_type, params):
         """Возвращает соответствующий генератор отчета"""
-        generators = {
-            'cashflow': CashFlowReportGenerator,
-            'reserves': ReserveReportGenerator,
-            'loss_ratio': LossRatioReportGenerator,
-            'forecast': PaymentForecastGenerator
-        }
-        
-        generator_class = generators.get(report_type)
+        generator_class = get_generator_class(report_type)
         if generator_class:
             return generator_class(params)
         return None
@@ -199,21 +231,73 @@ class ReportAPI(APIView):
         
         return normalized
 
+class ReportCacheStatsAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        stats = report_cache.get_stats()
+        stats['warming'] = warming.last_run()
+        return Response(stats)
+
+class BatchReportAPI(APIView):
+    """Несколько отчетов (?types=cashflow,loss_ratio,forecast) с общими параметрами за один проход по данным"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            report_types = list(dict.fromkeys(
+                report_type.strip() for report_type in request.GET.get('types', '').split(',') if report_type.strip()
+            ))
+            if not report_types:
+                raise ValueError("Specify report types in the types parameter")
+            unknown = [report_type for report_type in report_types if not get_generator_class(report_type)]
+            if unknown:
+                raise ValueError(f"Invalid report types: {', '.join(unknown)}")
+            
+            params = {key: request.GET.get(key) for key in REPORT_PARAMS}
+            if not params['start_date'] or not params['end_date']:
+                raise ValueError("Both start_date and end_date are required")
+            layout = columnar.parse_layout(request.GET.get('layout'))
+            params['layout'] = layout if layout != 'rows' else None
+            
+            result = report_batch.run(report_types, params, layout)
+            return Response({'status': 'success', 'layout': layout, **result})
+        
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.exception("Batch report %s failed", request.GET.get('types'))
+            return Response(
+                {'error': 'Internal server error'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class ExportReportAPI(APIView):
     permission_classes = [IsAuthenticated]
+    FORMATS = ['excel', 'pdf', 'csv', 'ndjson', 'parquet']
+    
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= здесь выбирает формат файла, а не рендерер DRF
+        return super().perform_content_negotiation(request, force=True)
     
     def get(self, request):
         try:
             report_type = request.GET.get('type', '').lower()
             format = request.GET.get('format', 'excel').lower()
             
-            if format not in ['excel', 'pdf']:
-                raise ValueError("Invalid export format. Supported formats: excel, pdf")
+            if format not in self.FORMATS:
+                raise ValueError(f"Invalid export format. Supported formats: {', '.join(self.FORMATS)}")
                 
             params = {
                 'start_date': request.GET.get('start_date'),
                 'end_date': request.GET.get('end_date'),
-                'product_id': request.GET.get('product_id')
+                'product_id': request.GET.get('product_id'),
+                'region_id': request.GET.get('region_id'),
+                'payment_type': request.GET.get('payment_type'),
+                'period': request.GET.get('period')
             }
             
             # Валидация параметров
@@ -221,25 +305,35 @@ class ExportReportAPI(APIView):
                 raise ValueError("Both start_date and end_date are required")
                 
             # Генерация данных
-            generators = {
-                'cashflow': CashFlowReportGenerator,
-                'loss_ratio': LossRatioReportGenerator
-            }
-            
-            if report_type not in generators:
+            generator_class = EXPORT_GENERATORS.get(report_type)
+            if generator_class is None or report_type not in exporters.EXPORT_COLUMNS:
                 raise ValueError(f"Export not supported for report type: {report_type}")
                 
-            generator = generators[report_type](params)
-            data = generator.generate()
+            generator = generator_class(params)
+            columns = exporters.EXPORT_COLUMNS[report_type]
             
-            if not data:
-                raise ValueError("No data available for the selected parameters")
-                
             # Экспорт
-            if format == 'excel':
-                return self.export_to_excel(data, report_type)
+            if format == 'csv':
+                rows = self.peek_rows(generator.iter_rows())
+                return exporters.csv_response(rows, columns, f"{report_type}_report.csv.gz")
+            elif format == 'ndjson':
+                rows = self.peek_rows(generator.iter_rows())
+                return exporters.ndjson_response(rows, columns, f"{report_type}_report.ndjson.gz")
+            elif format == 'parquet':
+                return exporters.parquet_response(generator.iter_rows(), columns, f"{report_type}_report.parquet")
+            elif format == 'excel':
+                rows = self.require_rows(generator.iter_rows())
+                with instrumentation.phase('render'):
+                    return exporters.excel_response(
+                        rows,
+                        columns,
+                        report_type.capitalize(),
+                        f"{report_type}_report.xlsx"
+                    )
             else:
-                return self.export_to_pdf(data, report_type)
+                if report_type == 'payment_flows':
+                    raise ValueError("Raw payment extract is not available as PDF")
+                return self.export_pdf(request, report_type, generator, columns, params)
                 
         except ValueError as e:
             return Response(
@@ -247,185 +341,199 @@ class ExportReportAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         except Exception as e:
+            logger.exception("Export of %s failed", report_type)
             return Response(
                 {'status': 'error', 'message': f"Export failed: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    def export_to_excel(self, data, report_type):
-        # Создаем DataFrame
-        df = pd.DataFrame(data)
-        
-        # Определяем колонки в зависимости от типа отчета
-        if report_type == 'cashflow':
-            columns = ['Date', 'Product', 'Expected', 'Actual', 'Difference', 'Accuracy']
-            df.columns = columns[:len(df.columns)]
-        elif report_type == 'loss_ratio':
-            columns = ['Product', 'Year', 'Month', 'Earned Premium', 'Incurred Losses', 'Loss Ratio']
-            df.columns = columns[:len(df.columns)]
-        
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name=report_type.capitalize(), index=False)
-            
-            # Форматирование
-            workbook = writer.book
-            worksheet = writer.sheets[report_type.capitalize()]
-            
-            header_format = workbook.add_format({
-                'bold': True,
-                'text_wrap': True,
-                'border': 1,
-                'bg_color': '#4472C4',
-                'font_color': 'white'
-            })
-            
-            for col_num, value in enumerate(columns):
-                worksheet.write(0, col_num, value, header_format)
-            
-            worksheet.autofilter(0, 0, 0, len(columns)-1)
-            worksheet.freeze_panes(1, 0)
-        
-        output.seek(0)
-        response = HttpResponse(
-            output,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{report_type}_report.xlsx"'
-        return response
+    def require_rows(self, rows):
+        """Проверяет, что в отчете есть строки, не вычитывая весь курсор"""
+        first = next(rows, None)
+        if first is None:
+            raise ValueError("No data available for the selected parameters")
+        return itertools.chain([first], rows)
     
-    def export_to_excel(self, data, title, columns):
-        output = BytesIO()
-        
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df = pd.DataFrame(data)
-            df.to_excel(writer, sheet_name=title[:30], index=False)
-            
-            workbook = writer.book
-            worksheet = writer.sheets[title[:30]]
-            
-            # Форматирование
-            header_format = workbook.add_format({
-                'bold': True,
-                'text_wrap': True,
-                'border': 1,
-                'bg_color': '#4472C4',
-                'font_color': 'white'
-            })
-            
-            for col_num, value in enumerate(columns):
-                worksheet.write(0, col_num, value, header_format)
-            
-            worksheet.autofilter(0, 0, 0, len(columns)-1)
-            worksheet.freeze_panes(1, 0)
-            
-        output.seek(0)
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{title}.xlsx"'
-        return response
+    def peek_rows(self, rows):
+        """Первая строка потоковой выгрузки читается до ответа: ошибка в параметрах
+        дает 400, а не оборванный файл после 200. Пустой отчет - файл с заголовком"""
+        first = next(rows, None)
+        if first is None:
+            return iter(())
+        return itertools.chain([first], rows)
     
-    def export_to_pdf(self, data, title, columns):
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        
-        # Преобразование данных для таблицы
-        table_data = [columns]
-        for item in data:
-            row = []
-            for col in columns:
-                col_key = col.lower().replace(' ', '_')
-                row.append(str(item.get(col_key, '')))
-            table_data.append(row)
-        
-        # Создание таблицы
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        
-        doc.build([table])
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer.read(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{title}.pdf"'
+    def export_pdf(self, request, report_type, generator, columns, params):
+        """PDF до EXPORT_PDF_SYNC_MAX_ROWS строк формируется в запросе и кешируется
+        по версии данных, больший - фоновым заданием (ответ 202 с заданием)"""
+        total = generator.count_rows()
+        if total is not None and total > getattr(settings, 'EXPORT_PDF_SYNC_MAX_ROWS', 2000):
+            job = start_export_job(
+                request.user,
+                report_type,
+                'pdf',
+                {key: value for key, value in params.items() if value not in (None, '')}
+            )
+            return export_job_response(job)
+
+        def render():
+            rows = self.require_rows(generator.iter_rows())
+            with instrumentation.phase('render'):
+                output = BytesIO()
+                exporters.write_pdf(rows, columns, report_type.capitalize(), output)
+                return output.getvalue()
+
+        content, source = report_cache.get_or_compute(report_type, {**params, 'format': 'pdf'}, render)
+        response = HttpResponse(content, content_type=exporters.PDF_CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{report_type}_report.pdf"'
+        response['X-Report-Cache'] = source
         return response
 
-class DashboardAPI(APIView):
+
+def start_export_job(user, report_type, format, params, notify_email=''):
+    """Создает фоновую выгрузку; файл, уже сформированный на тех же данных, отдается без задачи"""
+    job = ExportJob.objects.create(
+        user=user,
+        report_type=report_type,
+        format=format,
+        params=params,
+        notify_email=notify_email
+    )
+    if export_jobs.reuse_artifact(job):
+        if job.notify_email:
+            # Письмо с вложением отправляет воркер, а не запрос
+            try:
+                broker.ensure_available()
+                send_export_email.apply_async(args=[str(job.pk)], retry=False)
+            except OperationalError:
+                logger.warning("Celery broker is unavailable, export job %s email not sent", job.pk)
+        return job
+    try:
+        broker.ensure_available()
+        run_export_job.apply_async(args=[str(job.pk)], retry=False)
+    except OperationalError:
+        # Задание не останется висеть в pending до purge_expired
+        logger.warning("Celery broker is unavailable, export job %s not queued", job.pk)
+        job.status = 'failed'
+        job.error = 'Export queue is unavailable, try again later'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+    job.refresh_from_db()
+    return job
+
+
+def export_job_response(job):
+    """202 для принятого задания, 503 - если его не удалось поставить в очередь"""
+    if job.status == 'failed':
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class ExportJobListAPI(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        # Основные метрики для дашборда
-        metrics = {
-            'total_premium': PaymentFlow.objects.filter(
-                payment_type='premium'
-            ).aggregate(total=Sum('actual_amount'))['total'] or 0,
-            
-            'total_claims': PaymentFlow.objects.filter(
-                payment_type='claim'
-            ).aggregate(total=Sum('actual_amount'))['total'] or 0,
-            
-            'open_claims': InsuranceClaim.objects.filter(
-                status__in=['open', 'processing']
-            ).aggregate(total=Sum('reserve'))['total'] or 0,
-            
-            'policy_count': Policy.objects.count(),
-            
-            'loss_ratio': self.calculate_loss_ratio(),
-            
-            'reserve_sufficiency': self.calculate_reserve_sufficiency(),
-            
-            'top_products': list(
-                PaymentFlow.objects.values('product__name').annotate(
-                    premium=Sum(
-                        Case(
-                            When(payment_type='premium', then='actual_amount'),
-                            default=0,
-                            output_field=FloatField()
-                        )
-                    ),
-                    claims=Sum(
-                        Case(
-                            When(payment_type='claim', then='actual_amount'),
-                            default=0,
-                            output_field=FloatField()
-                        )
-                    )
-                ).order_by('-premium')[:5]
-            )
+        jobs = ExportJob.objects.filter(user=request.user)[:50]
+        return Response(ExportJobSerializer(jobs, many=True).data)
+    
+    def post(self, request):
+        report_type = str(request.data.get('type', '')).lower()
+        format = str(request.data.get('format', 'excel')).lower()
+        params = {
+            key: request.data.get(key)
+            for key in ('start_date', 'end_date', 'product_id', 'region_id', 'payment_type', 'period')
+            if request.data.get(key) not in (None, '')
         }
         
-        return Response(metrics)
+        try:
+            export_jobs.validate_job(report_type, format, params)
+        except ValueError as e:
+            return Response(
+                {'status': 'error', 'message': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        job = start_export_job(request.user, report_type, format, params, request.data.get('email') or '')
+        return export_job_response(job)
+
+class ExportJobDetailAPI(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, job_id):
+        job = ExportJob.objects.filter(pk=job_id, user=request.user).first()
+        if job is None:
+            return Response({'status': 'error', 'message': 'Export job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ExportJobSerializer(job).data)
+
+class ExportJobDownloadAPI(APIView):
+    permission_classes = [IsAuthenticated]
     
-    def calculate_loss_ratio(self):
-        premium = PaymentFlow.objects.filter(
-            payment_type='premium'
-        ).aggregate(total=Sum('actual_amount'))['total'] or 0
+    def get(self, request, job_id):
+        job = ExportJob.objects.filter(pk=job_id, user=request.user).first()
+        if job is None:
+            return Response({'status': 'error', 'message': 'Export job not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        claims = PaymentFlow.objects.filter(
-            payment_type='claim'
-        ).aggregate(total=Sum('actual_amount'))['total'] or 0
+        if job.status != 'success':
+            return Response(
+                {'status': 'error', 'message': f"Export job is {job.status}"},
+                status=status.HTTP_409_CONFLICT
+            )
         
-        if premium > 0:
-            return (claims / premium) * 100
-        return 0
-    
-    def calculate_reserve_sufficiency(self):
-        required = InsuranceClaim.objects.filter(
-            status__in=['open', 'processing']
-        ).aggregate(total=Sum('reserve'))['total'] or 0
+        if (job.expires_at and job.expires_at < timezone.now()) or not os.path.exists(job.file_path):
+            return Response({'status': 'error', 'message': 'Export file has expired'}, status=status.HTTP_410_GONE)
         
-        available = ReserveCalculation.objects.latest('calculation_date').available_reserves
+        return FileResponse(
+            open(job.file_path, 'rb'),
+            as_attachment=True,
+            filename=export_jobs.artifact_filename(job)
+        )
+
+class PaymentIngestAPI(APIView):
+    """Пакетная загрузка платежей: NDJSON или CSV, идемпотентно по event_id"""
+    # Право reports.add_paymentflow выдается сервисной учетной записи биллинга
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    queryset = PaymentFlow.objects.none()
+    
+    def post(self, request):
+        # Тело читается потоком, минуя парсеры DRF и лимит DATA_UPLOAD_MAX_MEMORY_SIZE
+        stream = request.stream or BytesIO()
+        try:
+            result = payment_ingest.ingest(
+                stream,
+                request.content_type.split(';')[0].strip().lower(),
+                request.META.get('HTTP_CONTENT_ENCODING', '')
+            )
+        except payment_ingest.IngestError as e:
+            return Response(
+                {'status': 'error', 'message': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'status': 'success', **result})
+
+class IsLocalNetwork(BasePermission):
+    def has_permission(self, request, view):
+        return instrumentation.is_allowed_address(request.META.get('REMOTE_ADDR', ''))
+
+class MetricsAPI(APIView):
+    """Агрегированные замеры запросов в формате Prometheus, только с локальных адресов"""
+    authentication_classes = []
+    permission_classes = [IsLocalNetwork]
+    
+    def get(self, request):
+        from reports import urls
+        endpoints = [pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None)]
+        return HttpResponse(
+            instrumentation.prometheus_text(endpoints, REPORT_TYPES),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+class DashboardAPI(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        # Метрики берутся из последнего снимка; ?fresh=1 пересчитывает их сразу
+        fresh = request.GET.get('fresh', '').lower() in ('1', 'true', 'yes')
+        snapshot = dashboard.get_snapshot(fresh=fresh)
         
-        if required > 0:
-            return (available / required) * 100
-        return 100
\ No newline at end of file
+        metrics = dict(snapshot.metrics)
+        metrics['as_of'] = snapshot.as_of
+        return Response(metrics)